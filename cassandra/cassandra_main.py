@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 """Cassandra model coupling framework
 
-  usage:  cassandra_main.py <configfile>
+  usage:  cassandra_main.py [--ensemble <sweepfile>] [--trace <tracefile>] [--profile] <configfile>
 
   This program will run the cassandra model coupling system using the
   configuration details from the configuration file supplied on the
   command line.  The configuration file format and contents are
-  described in the Cassandra Users' Guide.
+  described in the Cassandra Users' Guide.  If a sweep file is supplied,
+  the configuration is run as an ensemble; see cassandra/ensemble.py for
+  the sweep file format.
 
 """
 
@@ -18,19 +20,15 @@ import logging
 import os
 
 
-def bootstrap_sp(args):
+def configure_logging_sp(args):
     """
-    Bootstrap the multithreaded (single processing) version of the calculation.
+    Configure logging for a single processing calculation.
 
     :param args: Dictionary of command line arguments parsed by argparse.
-    :return: (component-list, capability-table)
     """
 
-    from configobj import ConfigObj
     from cassandra import __version__
-    from cassandra.compfactory import create_component
 
-    # Configure logger
     if args['logdir'] is None:
         logging.basicConfig(stream=sys.stdout, level=args['loglvl'])
         logging.info(f'This is Cassandra version {__version__}.')
@@ -41,6 +39,22 @@ def bootstrap_sp(args):
         # Write to screen the location of the logging output
         print(f"This is Cassandra version {__version__}.  Output will be logged to {args['logdir']}/cassandra.log")
 
+
+def bootstrap_sp(args):
+    """
+    Bootstrap the multithreaded (single processing) version of the calculation.
+
+    :param args: Dictionary of command line arguments parsed by argparse.
+    :return: (component-list, capability-table)
+    """
+
+    from configobj import ConfigObj
+    from cassandra.compfactory import create_component
+    from cassandra import tracing
+
+    # Configure logger
+    configure_logging_sp(args)
+
     cfgfile_name = args['ctlfile']
 
     # initialize the structures that will receive the data we are
@@ -49,24 +63,179 @@ def bootstrap_sp(args):
     component_list = []
 
     # cfgfile_name is a filename
-    config = ConfigObj(cfgfile_name)
+    with tracing.span('parse config', 'bootstrap'):
+        config = ConfigObj(cfgfile_name)
 
     try:
         global_config = config["Global"]
     except KeyError:
         raise RuntimeError("Config file must have a '[Global]' section")
 
-    for section in config.keys():
-        component = create_component(section, capability_table)
-        component.params.update(config[section])
-        component.finalize_parsing()
-        component_list.append(component)
+    # Create the Global component first, since it configures the others (see
+    # GlobalParamsComponent).
+    sections = ['Global'] + [section for section in config.keys() if section != 'Global']
+    with tracing.span('create components', 'bootstrap'):
+        for section in sections:
+            component = create_component(section, capability_table)
+            component.params.update(config[section])
+            component.finalize_parsing()
+            component_list.append(component)
 
     return (component_list, capability_table)
 
 # end of bootstrap_sp
 
 
+def bootstrap_ensemble_sp(args):
+    """
+    Bootstrap an ensemble calculation in single processing mode.
+
+    :param args: Dictionary of command line arguments parsed by argparse.
+    :return: (component-list, capability-table).  The capability table
+             returned is the one holding the shared capabilities; each
+             ensemble member has its own table, which extends this one.
+    """
+
+    from configobj import ConfigObj
+    from cassandra.ensemble import read_sweep, expand_sweep, create_members
+
+    configure_logging_sp(args)
+
+    config = ConfigObj(args['ctlfile'])
+    sweepinfo = read_sweep(args['ensemble'])
+    shared, members = expand_sweep(config, sweepinfo)
+
+    capability_table = {}
+    component_list = create_members(shared, members, capability_table,
+                                    sweepinfo['max_concurrent'])
+
+    return (component_list, capability_table)
+
+# end of bootstrap_ensemble_sp
+
+
+def write_report(args, component_list, reg_comps):
+    """
+    Log the end-of-run resource report and write it to the log directory.
+
+    :param args: Dictionary of command line arguments parsed by argparse.
+    :param component_list: List of components (with the RAB first in MP mode)
+    :param reg_comps: List of components, not including the RAB
+
+    The report (see components.resource_report() and capability_report()) is
+    written as JSON to resources.json in the log directory (resources-<rank>.json
+    in MP mode).  In SP mode with no log directory, it is only logged.
+    """
+
+    import json
+    from cassandra.components import resource_report, capability_report
+
+    resources = resource_report(reg_comps)
+    capabilities = capability_report(reg_comps)
+
+    def mb(nbytes):
+        return 'n/a' if nbytes is None else f'{nbytes / 2**20:.1f} MiB'
+
+    for entry in resources:
+        logging.info(f"component {entry['component']}: wall {entry['wall_time']:.2f} s, "
+                     f"cpu {entry['cpu_time']:.2f} s, blocked {entry['blocked_time']:.2f} s, "
+                     f"peak RSS +{mb(entry['peak_rss_delta'])}, produced {mb(entry['bytes_produced'])}, "
+                     f"fetched {mb(entry['bytes_fetched_local'])} local / "
+                     f"{mb(entry['bytes_fetched_remote'])} remote")
+    for entry in capabilities:
+        logging.info(f"capability {entry['capability']} ({entry['provider']}): "
+                     f"peak {entry['peak_bytes']} bytes, {entry['fetches']} fetches"
+                     f"{', released' if entry['released'] else ''}")
+
+    if args['mp']:
+        rank = component_list[0].rank
+        filename = f"{args['logdir'] or 'logs'}/resources-{rank}.json"
+    elif args['logdir'] is not None:
+        rank = 0
+        filename = f"{args['logdir']}/resources.json"
+    else:
+        return
+
+    with open(filename, 'w') as outfile:
+        json.dump({'rank': rank, 'components': resources, 'capabilities': capabilities},
+                  outfile, indent=1)
+
+
+def start_profiler(args, component_list, cap_table):
+    """
+    Start the sampling profiler, if it was requested.
+
+    :param args: Dictionary of command line arguments parsed by argparse.
+    :param component_list: List of components (with the RAB first in MP mode)
+    :param cap_table: Capability table
+    :return: The profiler, or None if profiling is off.
+
+    The profiler is turned on by the --profile option or by the profile
+    parameter in the [Global] section; see profiler.py.
+    """
+
+    from cassandra.profiler import SamplingProfiler
+    from cassandra.util import parseTFstring
+
+    params = cap_table['general'].params if 'general' in cap_table else {}
+    if not (args.get('profile') or parseTFstring(params.get('profile', 'False'))):
+        return None
+
+    profiler = SamplingProfiler.from_params(component_list, params)
+    profiler.outdir = params.get('profile_dir') or args['logdir'] or ('logs' if args['mp'] else '.')
+    profiler.prefix = f'profile-{component_list[0].rank}' if args['mp'] else 'profile'
+    profiler.start()
+    return profiler
+
+
+def start_monitor(args, component_list, cap_table):
+    """
+    Start publishing the live status of the run, if it was requested.
+
+    :param args: Dictionary of command line arguments parsed by argparse.
+    :param component_list: List of components (with the RAB first in MP mode)
+    :param cap_table: Capability table
+    :return: The monitor, or None if monitoring is off.
+
+    The monitor is configured by the monitor_* parameters in the [Global]
+    section; see monitor.py.
+    """
+
+    from cassandra.monitor import Monitor
+
+    params = cap_table['general'].params if 'general' in cap_table else {}
+    if args['mp']:
+        rab = component_list[0]
+        monitor = Monitor.from_params(component_list[1:], params, rab.rank, rab)
+    else:
+        monitor = Monitor.from_params(component_list, params)
+    if monitor is not None:
+        monitor.start()
+    return monitor
+
+
+def write_trace(args, component_list):
+    """
+    Write the trace of the run, if tracing was requested.
+
+    :param args: Dictionary of command line arguments parsed by argparse.
+    :param component_list: List of components (with the RAB first in MP mode)
+
+    In MP mode each rank writes its own file, with its rank inserted before the
+    extension; see tracing.py for how to merge them.
+    """
+
+    from cassandra import tracing
+
+    filename = args.get('trace')
+    if filename is None:
+        return
+    if args['mp']:
+        filename = tracing.rank_filename(filename, component_list[0].rank)
+    tracing.write(filename)
+    logging.info(f'Trace written to {filename}')
+
+
 def main(args):
     """
     Cassandra main entry function.
@@ -86,6 +255,12 @@ def main(args):
        verbose : Flag indicating whether to produce debugging output.
        quiet   : Flag indicating whether to suppress output except for warnings
                  and error messages
+       ensemble: Name of an ensemble sweep file, or None for a single run.
+                 (OPTIONAL - default is None)
+       trace   : Name of a file to write a timing trace to (see tracing.py),
+                 or None for no tracing. (OPTIONAL - default is None)
+       profile : Flag indicating whether to run the sampling profiler (see
+                 profiler.py).  (OPTIONAL - default is False)
     
     Keep in mind that this function will throw an exception if any of the
     components fail (whether by exception or by returning a failure code).  It's
@@ -106,17 +281,38 @@ def main(args):
     else:
         args['loglvl'] = logging.INFO
 
+    ensemble = args.get('ensemble') is not None
+
+    from cassandra import tracing
+    if args.get('trace') is not None:
+        tracing.enable()
+        tracing.name_thread('main')
+    bootstrap_start = tracing.now()
+
     if args['mp']:
         # See notes in mp.py about side effects of importing that module.
-        from cassandra.mp import bootstrap_mp, finalize
-        (component_list, cap_table) = bootstrap_mp(args)
+        from cassandra.mp import bootstrap_mp, bootstrap_ensemble_mp, finalize
+        if ensemble:
+            (component_list, cap_table) = bootstrap_ensemble_mp(args)
+        else:
+            (component_list, cap_table) = bootstrap_mp(args)
+    elif ensemble:
+        (component_list, cap_table) = bootstrap_ensemble_sp(args)
     else:
         (component_list, cap_table) = bootstrap_sp(args)
 
+    tracing.complete('bootstrap', 'bootstrap', bootstrap_start)
+
     # We will look up "general" in the cap_table and process any
     # global parameters here, but in the current version we don't
     # have any global parameters to process, so skip it.
 
+    from cassandra.components import track_consumers
+    track_consumers(component_list)
+
+    profiler = start_profiler(args, component_list, cap_table)
+    monitor = start_monitor(args, component_list, cap_table)
+
     threads = []
 
     for component in component_list:
@@ -135,6 +331,15 @@ def main(args):
     for thread in component_threads:
         thread.join()
 
+    if profiler is not None:
+        profiler.stop()
+        profiler.write(profiler.outdir, profiler.prefix)
+
+    # Make sure any output the components handed off to be written in the
+    # background (e.g., debug output) is on disk.
+    from cassandra.util import BackgroundWriter
+    BackgroundWriter.get().flush()
+
     # Check to see if any of the components failed, and that the RAB
     # is still running.  Once again take advantage of the fact that
     # if the RAB is present, it is always the first in the list.
@@ -158,10 +363,15 @@ def main(args):
         error('RAB has crashed or is otherwise not running.')
         nfail += 1
 
+    write_report(args, component_list, reg_comps)
+
     if nfail == 0:
         logging.info('\n****************All components completed successfully.')
     else:
         logging.error(f'\n****************{nfail} components failed.')
+        if monitor is not None:
+            monitor.stop()
+        write_trace(args, component_list)
         raise RuntimeError(f'{nfail} components failed.')
 
     # If this is a multiprocessing calculation, then we need to
@@ -169,6 +379,13 @@ def main(args):
     if args['mp']:
         finalize(component_list[0], threads[0])
 
+    if monitor is not None:
+        monitor.stop()
+
+    # In MP mode the RAB serves requests until finalize() returns, so the trace
+    # can't be written any sooner.
+    write_trace(args, component_list)
+
     logging.info("\nFIN.")
 
     return nfail
@@ -183,6 +400,12 @@ if __name__ == "__main__":
                         help='Verbose mode: log output at DEBUG level (overrides -q).')
     parser.add_argument('-q', dest='quiet', action='store_true', default=False,
                         help='Quiet mode: log output at WARNING level (overridden by -v).')
+    parser.add_argument('--ensemble', dest='ensemble', metavar='SWEEPFILE',
+                        help='Run the configuration as an ensemble, using the parameter sweep in SWEEPFILE.')
+    parser.add_argument('--trace', dest='trace', metavar='TRACEFILE',
+                        help='Record a timing trace of the run and write it to TRACEFILE (one file per rank in MP mode).')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='Run the sampling profiler and write a profile for each component (see profiler.py).')
     parser.add_argument('ctlfile', help='Name of the configuration file for the calculation.')
 
     argvals = parser.parse_args()
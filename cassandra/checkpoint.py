@@ -0,0 +1,435 @@
+"""Checkpoint and resume of completed components.
+
+When checkpointing is on, each component that finishes successfully saves its
+results to a checkpoint directory, along with a fingerprint of everything its
+results depend on:
+
+  - its class and parameters
+  - the contents of any files named in its parameters
+  - a digest of the data it fetched from other components (each capability,
+    or selection from a capability, that it fetched), except for progress
+    reports (see volatile())
+
+On a later run with the same checkpoint directory, each component checks its
+checkpoint before running.  If its class and parameters are unchanged, the
+files named in its parameters have the same contents, and the data it fetched
+last time is the same as what its providers offer now, its results are loaded
+from the checkpoint instead of running the component.  Checking the inputs
+means fetching them, so a component can't be restored until its providers have
+finished (or been restored themselves); in a chain of restored components this
+takes only as long as loading the data.  If anything has changed, the component
+runs as usual and its checkpoint is replaced.  Because the inputs are compared
+by their contents, this works the same way for providers on other ranks in MP
+runs, as long as all the ranks can see the checkpoint directory.
+
+Results are saved in numpy's binary format for numpy arrays, and pickled
+otherwise.  Arrays are restored as read-only memory maps of the checkpoint
+files, so restoring them is nearly instant and they are only read as they are
+used.  Results that can't be pickled (e.g., objects holding locks) can't be
+checkpointed; components with such results are always run.
+
+Checkpointing doesn't add work to the critical path of the calculation.  The
+digests of the data a component fetches are computed in the background (once
+for each object fetched, no matter how many components fetch it), and a
+component's checkpoint is written after it has released the components waiting
+on it.  Lazy results (store.LazyResult) aren't computed for the checkpoint;
+they are added to it, by the background writer (util.BackgroundWriter), when
+they are first fetched.  A checkpoint with lazy results that were never fetched
+is incomplete and can't be restored, so components with lazy results (e.g.,
+Tethys) should provide only the capabilities that are used.
+
+Checkpointing is configured in the [Global] section:
+
+  checkpoint_dir     - Directory for the checkpoints.  Checkpointing is off
+                       if this isn't given.
+  checkpoint_restore - If False, write checkpoints but always run the
+                       components.  (default True)
+
+The Global component is never checkpointed, and neither is the GCAM component,
+which has its own check for whether its output database is up to date (see
+GcamComponent).  Components are identified in the checkpoint by their labels
+(their configuration section names), so renaming a section invalidates its
+checkpoint.
+
+Classes:
+
+CheckpointStore - Save and restore component results.
+
+Functions:
+
+digest    - Compute a digest of a result's contents.
+
+digest_async - Compute a digest in the background.
+
+volatile  - Test whether fetched data is left out of checkpoints.
+
+configure - Set up checkpointing for new components.
+
+get_store - Get the checkpoint store for new components.
+
+"""
+
+import os
+import re
+import json
+import pickle
+import time
+import shutil
+import hashlib
+import logging
+import weakref
+import threading
+
+MANIFEST = 'manifest.json'
+
+# Background digests of fetched data (private, used in digest_async).  The
+# cache is indexed by object id, and entries are removed when their objects are
+# garbage collected.
+_digest_executor = None
+_digest_cache = {}
+_digest_lock = threading.RLock()
+
+
+def digest(value):
+    """Compute a digest of a result's contents.
+
+    numpy arrays are hashed by dtype, shape, and data; pandas objects by their
+    column names and the pandas hash of their rows; lists, tuples, and
+    dictionaries by their elements.  Anything else is pickled and the pickle
+    is hashed.
+
+    :return: Hex digest string
+
+    """
+    h = hashlib.blake2b(digest_size=20)
+    _update_digest(h, value)
+    return h.hexdigest()
+
+
+def digest_async(value):
+    """Start computing a digest of a result's contents in the background.
+
+    Objects that can be weakly referenced (e.g., numpy arrays and pandas
+    objects) are hashed only once while they are alive, however many times
+    this is called for them.  The object mustn't be modified while the digest
+    is computed (components shouldn't modify the data they fetch anyhow).
+
+    :return: concurrent.futures.Future for the hex digest string
+
+    """
+    import concurrent.futures as ft
+    global _digest_executor
+
+    key = id(value)
+    with _digest_lock:
+        entry = _digest_cache.get(key)
+        if entry is not None and entry[0]() is value:
+            return entry[1]
+        if _digest_executor is None:
+            _digest_executor = ft.ThreadPoolExecutor(max_workers=2,
+                                                     thread_name_prefix='checkpoint-digest')
+        future = _digest_executor.submit(digest, value)
+        try:
+            ref = weakref.ref(value, lambda ref: _forget_digest(key, ref))
+        except TypeError:
+            # Can't be weakly referenced (e.g., a list), so can't be cached.
+            return future
+        _digest_cache[key] = (ref, future)
+    return future
+
+
+def volatile(value):
+    """Test whether fetched data is left out of the fetching component's checkpoint.
+
+    Progress reports (supervise.Progress, e.g., 'gcam-progress') record the
+    times at which things happened, so they differ on every run.  If they
+    were recorded, the components fetching them could never be restored.
+
+    """
+    from cassandra.supervise import Progress
+    return isinstance(value, Progress)
+
+
+def _forget_digest(key, ref):
+    """Remove a garbage-collected object's cached digest (private)."""
+    with _digest_lock:
+        entry = _digest_cache.get(key)
+        if entry is not None and entry[0] is ref:
+            del _digest_cache[key]
+
+
+def _update_digest(h, value):
+    """Add a value to a digest (private, used by digest())."""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        h.update(f'ndarray{value.dtype.str}{value.shape}'.encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(f'{type(value).__name__}{list(getattr(value, "columns", [value.name]))}'.encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).values.data)
+    elif isinstance(value, (list, tuple)):
+        h.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _update_digest(h, item)
+    elif isinstance(value, dict):
+        h.update(f'dict{len(value)}'.encode())
+        for key in sorted(value, key=repr):
+            h.update(repr(key).encode())
+            _update_digest(h, value[key])
+    else:
+        h.update(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class CheckpointStore(object):
+    """Save and restore component results in a checkpoint directory.
+
+    Each component gets a subdirectory named for its label, holding a file for
+    each capability and a manifest.  The manifest is written last, so an
+    interrupted save leaves no usable checkpoint rather than a corrupt one.
+
+    """
+
+    def __init__(self, directory, restore=True):
+        """
+        :param directory: Checkpoint directory (created if necessary)
+        :param restore: If False, checkpoints are written but never restored.
+        """
+        self.directory = directory
+        self.restore = restore
+        self.lock = threading.Lock()  # for updating manifests with lazy results
+        os.makedirs(directory, exist_ok=True)
+
+    def component_dir(self, label):
+        """Directory for a component's checkpoint."""
+        return os.path.join(self.directory, re.sub(r'[^\w.\[\]-]', '_', label))
+
+    @staticmethod
+    def params_key(component):
+        """Digest of a component's class and parameters."""
+        params = {str(k): repr(v) for k, v in component.params.items()}
+        text = json.dumps([component.__class__.__module__, component.__class__.__name__,
+                           params], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @staticmethod
+    def param_files(component):
+        """Names of the existing files named in a component's parameters."""
+        files = []
+        for value in component.params.values():
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, str) and item != '' and os.path.isfile(item):
+                    files.append(item)
+        return sorted(set(files))
+
+    def load_manifest(self, label):
+        from cassandra import util
+        return util.read_manifest(os.path.join(self.component_dir(label), MANIFEST))
+
+    def try_restore(self, component):
+        """Restore a component's results from its checkpoint, if it is valid.
+
+        :param component: Component about to run.  Its inputs are fetched to
+                          check them against the checkpoint.
+        :return: True if the results were restored (in which case the
+                 component should not be run).
+
+        """
+        from cassandra import util
+
+        if not self.restore:
+            return False
+        manifest = self.load_manifest(component.label)
+        if manifest is None:
+            return False
+        if manifest['params'] != self.params_key(component):
+            logging.info(f'checkpoint: {component.label}: parameters have changed')
+            return False
+        files = util.fingerprint_files(self.param_files(component), manifest['files'])
+        if not util.fingerprints_match(manifest['files'], files):
+            logging.info(f'checkpoint: {component.label}: input files have changed')
+            return False
+
+        for entry in manifest['inputs']:
+            selector = pickle.loads(bytes.fromhex(entry['selector']))
+            try:
+                value = component.fetch_input(entry['capability'], selector)
+            except Exception as err:
+                logging.info(f"checkpoint: {component.label}: can't fetch {entry['capability']}: {err!r}")
+                return False
+            if digest(value) != entry['digest']:
+                logging.info(f"checkpoint: {component.label}: input {entry['capability']} has changed")
+                return False
+
+        lazy = [cap for cap, info in manifest['outputs'].items() if info['format'] == 'lazy']
+        if lazy:
+            logging.info(f'checkpoint: {component.label}: incomplete; {lazy} were never computed')
+            return False
+
+        compdir = self.component_dir(component.label)
+        outputs = {}
+        try:
+            for capability, info in manifest['outputs'].items():
+                filename = os.path.join(compdir, info['file'])
+                if info['format'] == 'npy':
+                    import numpy as np
+                    outputs[capability] = np.load(filename, mmap_mode='r')
+                else:
+                    with open(filename, 'rb') as infile:
+                        outputs[capability] = pickle.load(infile)
+        except Exception as err:
+            logging.warning(f"checkpoint: {component.label}: can't read checkpoint: {err!r}")
+            return False
+
+        for capability, value in outputs.items():
+            component.addresults(capability, value, early=manifest['outputs'][capability]['early'])
+
+        logging.info(f'checkpoint: restored {component.label} from {compdir}')
+        return True
+
+    def save(self, component, results, params_key):
+        """Save a component's results and the fingerprint of its inputs.
+
+        :param component: Component that has finished successfully.
+        :param results: Dictionary of the component's results by capability.
+                        (This is taken when the component finishes, since the
+                        result store might release results after that.)
+        :param params_key: params_key() for the component, computed before it
+                        ran (in case running changed its parameters).
+        :return: True if the checkpoint was written.
+
+        Lazy results that haven't been computed yet are recorded as missing,
+        and added to the checkpoint when they are computed.
+
+        """
+        from cassandra import util
+        from cassandra.store import LazyResult
+
+        compdir = self.component_dir(component.label)
+        tmpdir = f'{compdir}.tmp{os.getpid()}-{threading.get_ident()}'
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        os.makedirs(tmpdir)
+
+        outputs = {}
+        pending = {}            # lazy results that haven't been computed
+        try:
+            inputs = [dict(entry, digest=entry['digest'].result())
+                      for entry in component.checkpoint_inputs.values()]
+            for i, (capability, value) in enumerate(results.items()):
+                if isinstance(value, LazyResult):
+                    if not value.done:
+                        pending[capability] = value
+                        outputs[capability] = {'file': None, 'format': 'lazy',
+                                               'early': capability in component.early}
+                        continue
+                    value = value.get()
+                outputs[capability] = self.write_output(tmpdir, i, value)
+                outputs[capability]['early'] = capability in component.early
+        except Exception as err:
+            logging.warning(f"checkpoint: can't save {component.label}: {err!r}")
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            return False
+
+        run_id = f'{os.getpid()}-{threading.get_ident()}-{time.time()}'
+        manifest = {'label': component.label,
+                    'class': component.__class__.__name__,
+                    'run': run_id,
+                    'params': params_key,
+                    'files': util.fingerprint_files(self.param_files(component)),
+                    'inputs': inputs,
+                    'outputs': outputs}
+        util.write_manifest(os.path.join(tmpdir, MANIFEST), manifest)
+
+        # Swap the new checkpoint into place.
+        with self.lock:
+            olddir = f'{tmpdir}.old'
+            if os.path.exists(compdir):
+                os.rename(compdir, olddir)
+            os.rename(tmpdir, compdir)
+        shutil.rmtree(olddir, ignore_errors=True)
+        logging.debug(f'checkpoint: saved {component.label} to {compdir}')
+
+        writer = util.BackgroundWriter.get()
+        for capability, lazy in pending.items():
+            i = list(results).index(capability)
+            lazy.when_done(lambda value, capability=capability, i=i:
+                           writer.submit(self.add_output, component.label, run_id,
+                                         capability, i, value))
+        return True
+
+    def add_output(self, label, run_id, capability, i, value):
+        """Add a lazy result that has been computed to a saved checkpoint.
+
+        :param label: Label of the component
+        :param run_id: Run recorded in the manifest by save().  If the
+                       checkpoint has been replaced since, nothing is done.
+        :param capability: Capability of the result
+        :param i: Index of the result (for its file name)
+        :param value: Computed value
+
+        """
+        from cassandra import util
+
+        compdir = self.component_dir(label)
+        with self.lock:
+            manifest = self.load_manifest(label)
+            if manifest is None or manifest.get('run') != run_id:
+                return
+            try:
+                info = self.write_output(compdir, i, value)
+            except Exception as err:
+                logging.warning(f"checkpoint: can't save {capability} for {label}: {err!r}")
+                return
+            manifest['outputs'][capability].update(info)
+            util.write_manifest(os.path.join(compdir, MANIFEST), manifest)
+        logging.debug(f'checkpoint: added {capability} to {compdir}')
+
+    @staticmethod
+    def write_output(directory, i, value):
+        """Write a result to a checkpoint directory.
+
+        :return: Dictionary of the file name and format for the manifest.
+
+        """
+        import numpy as np
+
+        if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+            filename = f'{i}.npy'
+            np.save(os.path.join(directory, filename), value)
+            return {'file': filename, 'format': 'npy'}
+        filename = f'{i}.pkl'
+        with open(os.path.join(directory, filename), 'wb') as outfile:
+            pickle.dump(value, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        return {'file': filename, 'format': 'pickle'}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def configure(params):
+    """Set up checkpointing for components created after this call.
+
+    :param params: Dictionary of parameters (usually the [Global] section);
+                   see the module docstring.
+
+    """
+    from cassandra import util
+
+    global _store
+    with _store_lock:
+        directory = params.get('checkpoint_dir')
+        if directory is None:
+            _store = None
+        else:
+            restore = util.parseTFstring(params.get('checkpoint_restore', 'True'))
+            _store = CheckpointStore(directory, restore)
+            logging.info(f'checkpoint: saving checkpoints to {directory}'
+                         f"{'' if restore else ' (restore disabled)'}")
+
+
+def get_store():
+    """Get the checkpoint store for new components (None if checkpointing is off)."""
+    with _store_lock:
+        return _store
@@ -25,17 +25,21 @@ def create_component(compname, cap_tbl):
                      you can disambiguate multiple copies of a component by
                      adding '.<unique-id>' to the end of the component name.
     :param cap_tbl: Capability table to use to initialize the component.
-    :return: Newly created component.
+    :return: Newly created component.  Its label is set to the full name
+             (including any '.<unique-id>').
     """
 
     # ignore everything following a '.' in the component name
+    label = compname
     csplt = compname.split('.')
     compname = csplt[0].strip()
 
     if not compname in _available_components:
         raise RuntimeError(f'Unknown component type {compname}')
 
-    return _available_components[compname](cap_tbl)
+    component = _available_components[compname](cap_tbl)
+    component.label = label
+    return component
 
 def add_new_component(compname, classobj):
     """Add a new type of component to the list of available components.
@@ -41,13 +41,18 @@ DummyComponent        - A simple component class for tests.
 # relevant python component.
 
 import os
-import re
-import subprocess
+import time
+import pickle
+import shutil
 import threading
 import logging
 import pkg_resources
 import pandas as pd
 from cassandra import util
+from cassandra import store
+from cassandra import tracing
+from cassandra import checkpoint
+from cassandra.supervise import Progress, ProcessSupervisor
 
 # This class is here to make it easy for a class to ignore failures to
 # find a particular capability in fetch() while still failing on any
@@ -101,7 +106,21 @@ class ComponentBase(object):
 
     addresults(): Update the results for a single capability. Use this
                   rather than updating self.results directly, as this
-                  method ensures that the capability exists.
+                  method ensures that the capability exists.  Results
+                  added with early=True can be fetched right away,
+                  without waiting for the component to finish.
+
+    addearly(): Declare a capability that will be added with early=True,
+                  so that components fetching it before it is added wait
+                  only until it is added.
+
+    addconsumer(), consumed(): Used internally to track which components
+                  have fetched which capabilities.  Every component
+                  accepts a 'consumes' parameter listing the
+                  capabilities it will fetch.  Once all the declared
+                  consumers of a capability have fetched it, the
+                  provider releases its copy of the result.  See
+                  track_consumers().
 
     Methods that can be extended (but not overridden; you must be sure
          to call the base method):
@@ -139,8 +158,27 @@ class ComponentBase(object):
             Generally this array should be altered only by calling the
             addparam method.
 
+    label:  name of the component in log messages and traces.  Components
+            created from a config file are labeled with their section name
+            (see compfactory.create_component).
+
+    usage:  resources used by the component's run (time, memory, and bytes
+            fetched); see resource_report().
+
+    restored: True if the component's results were restored from a
+            checkpoint instead of running it (see checkpoint.py).
+
+    finish_hooks: functions called with no arguments when the component
+            finishes, whether it ran, was restored, or failed.  They are
+            called before waiting components are released.  (Used by
+            ensemble.MemberSlot.)
+
     """
 
+    # Components whose results can be checkpointed (see checkpoint.py).
+    # Subclasses can set this to False to opt out.
+    checkpointable = True
+
     def __init__(self, cap_tbl):
         """Initialize the component base.
 
@@ -161,8 +199,26 @@ class ComponentBase(object):
 
         """
         self.status = 0         # status indicator: 0- not yet run, 1- complete, 2- error
-        self.results = {}
+        self.results = store.create_store()  # dictionary-like; see store.py
+        self.early = set()      # capabilities that can be fetched before the component finishes
+        self.early_events = {}  # events set when declared early capabilities are added; see addearly()
+        self.consumes = set()   # capabilities this component declares it will fetch
+        self.consumers = {}     # declared consumers of our capabilities that haven't fetched them yet
+        self.released = set()   # capabilities whose results have been released
+        self.fetch_counts = {}  # number of times each of our capabilities has been fetched
+        self.peak_bytes = {}    # peak memory held for each of our capabilities
+        self.usage = {'start': None, 'wall_time': 0.0, 'cpu_time': 0.0, 'blocked_time': 0.0,
+                      'peak_rss_delta': None, 'bytes_fetched_local': 0,
+                      'bytes_fetched_remote': 0}  # resources used by run(); see resource_report()
+        self.lifetime_lock = threading.Lock()
         self.params = {}
+        self.label = self.__class__.__name__  # name used in logs and traces (usually the config section)
+        self.thread_id = None   # ident of the thread running the component, once it starts
+        self.waiting = None     # (capability, time) while blocked in fetch(); see monitor.py
+        self.checkpoint = checkpoint.get_store() if self.checkpointable else None
+        self.checkpoint_inputs = {}  # digests of the data we fetched, for the checkpoint
+        self.restored = False   # True if our results were restored from a checkpoint
+        self.finish_hooks = []  # called when the component finishes, however it finishes
         self.cap_tbl = cap_tbl  # store a reference to the capability lookup table
         self.condition = threading.Condition()
 
@@ -198,10 +254,24 @@ class ComponentBase(object):
         # entire time the run_component() method is running.  That's ok for
         # now, but it's not ideal, and it will cause problems when we
         # eventually try to implement co-simulations.
-        with self.condition:
+        self.thread_id = threading.get_ident()
+        tracing.name_thread(self.label)
+        self.usage['start'] = time.time()
+        wall0 = time.perf_counter()
+        cpu0 = time.thread_time()
+        rss0 = util.peak_rss()
+        results = None
+        with self.condition, tracing.span(self.label, 'component') as trace_info:
             try:
                 logging.debug(f'starting {self.__class__}')
-                rv = self.run_component()
+                if self.checkpoint is not None:
+                    # Taken before running, in case running changes the parameters.
+                    params_key = self.checkpoint.params_key(self)
+                if self.checkpoint is not None and self.checkpoint.try_restore(self):
+                    self.restored = True
+                    rv = 0
+                else:
+                    rv = self.run_component()
                 if not rv == 0:
                     # possibly add some other error handling here.
                     msg = f"{self.__class__}:  run_component returned error code {str(rv)}"
@@ -210,18 +280,41 @@ class ComponentBase(object):
                 else:
                     logging.debug(f"{self.__class__}: finished successfully.\n")
 
+                if self.checkpoint is not None and not self.restored:
+                    # Grab the results before any of them can be released.
+                    results = {cap: self.results[cap] for cap in self.results}
                 self.status = 1                  # set success condition
+                for capability in list(self.consumers):
+                    self.maybe_release(capability)
+                for capability in self.consumes:
+                    provider = self.cap_tbl.get(capability)
+                    if hasattr(provider, 'consumed'):
+                        provider.consumed(capability, self)
             except:
                 self.status = 2                  # set error condition
                 logging.exception(f'Exception in component {str(self.__class__)}.')
                 raise
             finally:
+                trace_info['status'] = self.status
+                self.usage['wall_time'] = time.perf_counter() - wall0
+                self.usage['cpu_time'] = time.thread_time() - cpu0
+                if rss0 is not None:
+                    self.usage['peak_rss_delta'] = util.peak_rss() - rss0
+                for hook in self.finish_hooks:
+                    hook()
                 self.condition.notify_all()      # release any waiting threads
+                for event in self.early_events.values():
+                    event.set()                  # release threads waiting on early results we never added
 
             logging.debug(f'completed {self.__class__}')
         # end of with block:  lock on condition var released.
 
-    def fetch(self, capability):
+        # Save the checkpoint after releasing the lock, so that consumers
+        # don't have to wait for it.
+        if results is not None:
+            self.checkpoint.save(self, results, params_key)
+
+    def fetch(self, capability, selector=None):
         """Return the data associated with the named capability.
 
         Components don't return results from run() because it will run
@@ -246,6 +339,14 @@ class ComponentBase(object):
         should publish a complete description of their data in their
         documentation.
 
+        If selector is given, only that part of the data is returned.
+        The selection is made by the provider (see util.select), so
+        only the selected part is copied or, for remote capabilities,
+        sent between processes.  For example, fetch('gridded_tas',
+        np.s_[0:2]) gets the first two realizations of the fldgen
+        temperature fields.  Selectors must be picklable to be used
+        with remote capabilities.
+
         WARNING: if a component tries to fetch a capability that it,
         itself, provides, this will lead to instant deadlock.  So,
         don't do that.
@@ -260,12 +361,39 @@ class ComponentBase(object):
         if self is not provider:
             # This is a request (presumably originating in our own run
             # method) for a capability in another component.  Forward
-            # it to that component.
-            return provider.fetch(capability)
+            # it to that component, and let it know we have our copy.  (The
+            # RAB doesn't track consumers, so we only do this for local
+            # providers.)  A consumer fetching selections might come back for
+            # more, so those only count as consumed when the consumer
+            # finishes.
+            start = time.perf_counter()
+            self.waiting = (capability, time.time())
+            try:
+                with tracing.span(f'fetch {capability}', 'fetch', capability=capability):
+                    rslt = provider.fetch(capability, selector)
+            finally:
+                self.waiting = None
+            self.record_fetch(provider, rslt, time.perf_counter() - start)
+            if self.checkpoint is not None and not checkpoint.volatile(rslt):
+                self.record_input(capability, selector, rslt)
+            if selector is None and hasattr(provider, 'consumed'):
+                provider.consumed(capability, self)
+            return rslt
 
         # If we get to here, then this is a request from another
         # component for some data we are holding.
 
+        # Early results are complete as soon as they are added, so there is
+        # no need to wait for the component to finish.  If a declared early
+        # result hasn't been added yet, wait for it without taking the
+        # condition lock, which is held for the whole run.
+        event = self.early_events.get(capability)
+        if event is not None and capability not in self.early:
+            logging.debug(f"\twaiting on early result {capability} from {self.__class__}\n")
+            event.wait()
+        if capability in self.early:
+            return util.select(self.get_result(capability), selector)
+
         # If the component is currently running, then the condition
         # variable will be locked, and we will block when the 'with'
         # statement tries to obtain the lock.
@@ -280,7 +408,98 @@ class ComponentBase(object):
         if self.status != 1:
             raise RuntimeError(f"{self.__class__}: wait() returned with non-success status!")
 
-        return self.results[capability]
+        return util.select(self.get_result(capability), selector)
+
+    def record_fetch(self, provider, rslt, blocked):
+        """Add a fetch from another component (or the RAB) to our resource usage."""
+        key = 'bytes_fetched_local' if isinstance(provider, ComponentBase) else 'bytes_fetched_remote'
+        nbytes = store.result_nbytes(rslt)
+        with self.lifetime_lock:
+            self.usage['blocked_time'] += blocked
+            self.usage[key] += nbytes
+
+    def record_input(self, capability, selector, rslt):
+        """Record the digest of data we fetched, for our checkpoint.
+
+        The digest is computed in the background (see checkpoint.digest_async)
+        and collected when the checkpoint is saved.
+
+        """
+        selector = pickle.dumps(selector).hex()
+        self.checkpoint_inputs[(capability, selector)] = {
+            'capability': capability, 'selector': selector, 'digest': checkpoint.digest_async(rslt)}
+
+    def fetch_input(self, capability, selector=None):
+        """Fetch data from another component without recording it as consumed.
+
+        This is used to check a component's inputs against its checkpoint.
+        If the check fails, the component runs and fetches its inputs as
+        usual, so the check mustn't allow them to be released.
+
+        """
+        try:
+            provider = self.cap_tbl[capability]
+        except KeyError:
+            raise CapabilityNotFound(capability)
+        return provider.fetch(capability, selector)
+
+    def get_result(self, capability):
+        """Get a result from the result store, checking that it hasn't been released."""
+        with self.lifetime_lock:
+            if capability in self.released:
+                raise RuntimeError(f'{self.__class__}: capability {capability} was fetched after all of its '
+                                   'declared consumers had fetched it and it was released.  Add the '
+                                   'fetching component to the consumers of the capability.')
+            self.fetch_counts[capability] = self.fetch_counts.get(capability, 0) + 1
+            rslt = self.results[capability]
+
+        if isinstance(rslt, store.LazyResult):
+            rslt = self.materialize(capability, rslt)
+        return rslt
+
+    def materialize(self, capability, lazy):
+        """Compute a lazy result and put the value in the result store."""
+        value = lazy.get()
+        with self.lifetime_lock:
+            if self.results.get(capability) is lazy:
+                logging.debug(f'{self.__class__}: materialized {capability}')
+                self.results[capability] = value
+                nbytes = self.results.nbytes(capability)
+                self.peak_bytes[capability] = max(nbytes, self.peak_bytes.get(capability, 0))
+            if capability in self.results:
+                value = self.results[capability]
+        return value
+
+    def addconsumer(self, capability, consumer):
+        """Declare that a component will fetch one of our capabilities.
+
+        Called by track_consumers() before the components start running.  Once
+        every declared consumer of a capability has fetched it and this
+        component has finished, the result is released from the result store
+        (see store.py).  Capabilities with no declared consumers are never
+        released, so if you declare any consumers for a capability, you must
+        declare all of them.
+
+        """
+        with self.lifetime_lock:
+            self.consumers.setdefault(capability, set()).add(consumer)
+
+    def consumed(self, capability, consumer):
+        """Record that a component has fetched one of our capabilities."""
+        with self.lifetime_lock:
+            if capability in self.consumers:
+                self.consumers[capability].discard(consumer)
+        self.maybe_release(capability)
+
+    def maybe_release(self, capability):
+        """Release a result if the component has finished and all its declared consumers have fetched it."""
+        with self.lifetime_lock:
+            if self.status != 1 or capability in self.released or \
+               capability not in self.consumers or self.consumers[capability]:
+                return
+            self.results.release(capability)
+            self.released.add(capability)
+        logging.debug(f'{self.__class__}: released {capability}')
 
     def finalize_parsing(self):
         """Process parameters that are common to all components (e.g. clobber).
@@ -295,6 +514,11 @@ class ComponentBase(object):
         if "clobber" in self.params:
             self.clobber = util.parseTFstring(self.params["clobber"])
 
+        consumes = self.params.get('consumes', [])
+        if not isinstance(consumes, list):
+            consumes = [consumes]
+        self.consumes.update(c for c in consumes if c != '')
+
         # processing for additional common parameters go here
         return
 
@@ -314,8 +538,19 @@ class ComponentBase(object):
             raise RuntimeError(f'Duplicate definition of capability {capability}.')
         self.cap_tbl[capability] = self
 
-    def addresults(self, capability, res):
-        """Add data to the specified capability of this component."""
+    def addresults(self, capability, res, early=False):
+        """Add data to the specified capability of this component.
+
+        Normally results can't be fetched until the component has finished
+        running.  If early is True, the results are made available to other
+        components immediately.  Only use this for results that are complete
+        when they are added (or, like a progress record, are meant to be
+        watched while the component runs).
+
+        res may be a store.LazyResult, in which case the data isn't
+        computed until the capability is first fetched.
+
+        """
         if capability not in self.cap_tbl:
             raise CapabilityNotFound(capability)
 
@@ -323,6 +558,29 @@ class ComponentBase(object):
             raise RuntimeError(f'Component {self.__class__} does not own capability {capability}.')
 
         self.results[capability] = res
+        if early:
+            self.early.add(capability)
+            if capability in self.early_events:
+                self.early_events[capability].set()
+
+        nbytes = self.results.nbytes(capability)
+        with self.lifetime_lock:
+            self.peak_bytes[capability] = max(nbytes, self.peak_bytes.get(capability, 0))
+
+    def addearly(self, capability):
+        """Declare that a capability will be added with early=True.
+
+        Components that fetch the capability before it has been added wait
+        only until it is added, rather than until this component finishes.
+        Call this from __init__() or finalize_parsing(), before the
+        components start running.  If the component finishes without adding
+        the capability, waiting components are treated as if they had
+        fetched an ordinary capability.
+
+        """
+        if capability not in self.cap_tbl:
+            raise CapabilityNotFound(capability)
+        self.early_events.setdefault(capability, threading.Event())
 
     def run_component(self):
         """Subclasses of ComponentBase are required to override this method.
@@ -338,6 +596,95 @@ class ComponentBase(object):
         raise NotImplementedError("ComponentBase is not a runnable class.")
 
 
+def track_consumers(component_list):
+    """Register each component's declared consumes with the providers.
+
+    :param component_list: List of all the components in this process
+
+    This must be called after all the components have been created and before
+    any of them start running.  Declared consumers on other MP ranks aren't
+    known to providers here, so capabilities fetched through the RAB should not
+    be declared.
+
+    """
+    for component in component_list:
+        for capability in getattr(component, 'consumes', ()):
+            provider = component.cap_tbl.get(capability)
+            if provider is None:
+                logging.warning(f'{component.__class__} declares that it consumes {capability}, '
+                                'but no component provides it.')
+            elif hasattr(provider, 'addconsumer'):
+                provider.addconsumer(capability, component)
+
+
+def capability_report(component_list):
+    """Summarize the memory used by each capability.
+
+    :param component_list: List of components
+    :return: List of dictionaries, one per capability provided by the
+             components, with entries capability, provider, peak_bytes,
+             fetches, and released, sorted by decreasing peak_bytes.
+
+    """
+    report = []
+    for component in component_list:
+        if not hasattr(component, 'peak_bytes'):
+            continue
+        with component.lifetime_lock:
+            for capability, nbytes in component.peak_bytes.items():
+                report.append({'capability': capability,
+                               'provider': component.__class__.__name__,
+                               'peak_bytes': nbytes,
+                               'fetches': component.fetch_counts.get(capability, 0),
+                               'released': capability in component.released})
+    report.sort(key=lambda r: r['peak_bytes'], reverse=True)
+    return report
+
+
+def resource_report(component_list):
+    """Summarize the resources used by each component.
+
+    :param component_list: List of components
+    :return: List of dictionaries, one per component, with entries:
+               component: the component's label
+                   class: the component's class name
+                  status: 0 (not run), 1 (success), or 2 (failure)
+                restored: True if the results were restored from a
+                          checkpoint (see checkpoint.py)
+                   start: wall clock time (seconds since the epoch) at which
+                          the component started running
+               wall_time: elapsed time in run_component(), in seconds
+                cpu_time: CPU time used by the component's own thread (this
+                          doesn't include subprocesses, such as GCAM, or
+                          threads the component starts)
+            blocked_time: time spent in fetch() waiting on other components
+          peak_rss_delta: increase in the process's peak resident set size
+                          while the component ran.  Components run
+                          concurrently in the same process, so this is only
+                          an upper bound on the component's own use.
+          bytes_produced: total of peak_bytes over the component's
+                          capabilities (see capability_report())
+     bytes_fetched_local: bytes fetched from components in this process
+    bytes_fetched_remote: bytes fetched from other processes through the RAB
+
+    Byte counts are estimated with store.result_nbytes().
+
+    """
+    report = []
+    for component in component_list:
+        if not isinstance(component, ComponentBase):
+            continue
+        with component.lifetime_lock:
+            entry = {'component': component.label,
+                     'class': component.__class__.__name__,
+                     'status': component.status,
+                     'restored': component.restored}
+            entry.update(component.usage)
+            entry['bytes_produced'] = sum(component.peak_bytes.values())
+        report.append(entry)
+    return report
+
+
 # class to hold the general parameters.
 class GlobalParamsComponent(ComponentBase):
     """Class to hold the general parameters for the calculation.
@@ -348,6 +695,9 @@ class GlobalParamsComponent(ComponentBase):
     capability table makes it easy for any component that needs one of
     the global parameters to look them up.
 
+    The Global component is never checkpointed (see checkpoint.py); it is
+    always cheap to run, and running it sets up the other components.
+
     Parameters:
 
     ModelInterface - Location of the jar file for the ModelInterface
@@ -370,8 +720,54 @@ class GlobalParamsComponent(ComponentBase):
                   in; otherwise, it will be relative to inputdir.
                   (OPTIONAL - default is 'rgn14')
 
+   result_store - Type of store to keep component results in: 'memory' or
+                  'memmap'.  (OPTIONAL - default is 'memory')
+
+spill_threshold - Size in bytes above which numpy array results are spilled to
+                  memory-mapped files by the 'memmap' store.  (OPTIONAL -
+                  default is 64 MiB)
+
+     scratchdir - Directory for spilled results.  (OPTIONAL - default is a
+                  temporary directory that is removed at exit)
+
+  shm_threshold - In MP runs, minimum size in bytes for numpy arrays to be sent
+                  to ranks on the same node through shared memory, or False to
+                  always use message passing.  (OPTIONAL - default is 1 MiB)
+
+        profile - True to run the sampling profiler.  The profile_interval,
+                  profile_overhead, profile_depth, and profile_dir parameters
+                  configure it; see profiler.py.  (OPTIONAL - default is
+                  False)
+
+   monitor_file - File to rewrite periodically with the live status of the
+                  run.  (OPTIONAL - default is no status file)
+
+   monitor_port - Port on localhost on which to serve the live status over
+                  HTTP.  (OPTIONAL - default is no server)
+
+monitor_interval - Seconds between updates of monitor_file.  (OPTIONAL -
+                  default is 10)
+
+ checkpoint_dir - Directory in which to save the results of completed
+                  components, so that they can be restored instead of rerun
+                  by later runs.  (OPTIONAL - default is no checkpoints)
+
+checkpoint_restore - If False, write checkpoints but don't restore from them.
+                  (OPTIONAL - default is True)
+
+reference_cache - True to cache converted reference data (e.g., the Xanthos
+                  reference grids) on disk, so that later runs don't have to
+                  convert it again, or the name of the directory to cache it
+                  in.  See util.configure_reference_cache.  (OPTIONAL -
+                  default is False: reference data is converted once per run)
+
+    See store.py for details on the result stores, and monitor.py for the
+    contents of the live status.
+
     """
 
+    checkpointable = False
+
     def __init__(self, cap_tbl):
         """Copy parameters into results dictionary.
 
@@ -393,6 +789,13 @@ class GlobalParamsComponent(ComponentBase):
         # global params component.  <- gross.  we need a better way to do this.
         util.global_params = self
 
+    def finalize_parsing(self):
+        """Configure the result store for the components created after this one."""
+        super(GlobalParamsComponent, self).finalize_parsing()
+        store.configure(self.params)
+        checkpoint.configure(self.params)
+        util.configure_reference_cache(self.params)
+
     def run_component(self):
         """Set the default value for the optional parameters, and convert filenames to absolute paths."""
         genrslt = self.results['general']
@@ -426,18 +829,73 @@ class GcamComponent(ComponentBase):
       config     = full path to gcam configuration file
       logconfig  = full path to gcam log configuration file
       clobber    = flag: True = clobber old outputs, False = preserve old outputs
+      force      = flag: True = rerun GCAM even if the inputs are unchanged
+                   since the run that produced the existing outputs.
+                   (OPTIONAL - default is False)
+      logfile    = file for GCAM's stdout (OPTIONAL - default is our stdout)
+      timeout    = wall-clock limit for the GCAM run in seconds.  If GCAM
+                   runs longer than this, it is killed and the component
+                   fails.  (OPTIONAL - default is no limit)
+      progress_pattern = regular expression identifying the lines in GCAM's
+                   output that report a completed period.  The first group
+                   must capture the period number; an optional second group
+                   captures the year.
+                   (OPTIONAL - default matches lines like 'Period 3: 2010')
 
     Results:
-      dbxml      = gcam dbxml output file.  We get this from the gcam config.xml file.
+      capability 'gcam-core':
+        dbxml    = gcam dbxml output file.  We get this from the gcam config.xml file.
+        changed  = 1 if GCAM was run, 0 if existing outputs were reused.
+      resources  = resource usage of the GCAM run (wall and CPU times, peak
+                   RSS); see supervise.ProcessSupervisor.  Absent if the run
+                   was skipped.
+
+      capability 'gcam-config': Run metadata parsed from the gcam config.xml
+        file (database location, scenario name, periods, input files).  See
+        util.read_gcam_config for the structure.  Components that need
+        information from the GCAM config should fetch this rather than parsing
+        the file themselves.  This capability is available as soon as the
+        component starts running.
+
+      capability 'gcam-progress': A supervise.Progress object recording the
+        periods GCAM has completed.  This capability is also available as
+        soon as the component starts, so dependent components can use
+        Progress.wait_for() to start work on early periods while GCAM is
+        still running.
 
     Component dependencies: none
 
+    When a run completes successfully, the component writes a manifest of
+    fingerprints for the exe, config, logconfig, and the input files listed in
+    the config next to the dbxml.  On subsequent runs, if the dbxml exists and
+    the fingerprints still match, the run is skipped, even if clobber is set.
+
+    This component is never checkpointed (see checkpoint.py).  Its results
+    point to the dbxml on disk, and the checks above, which a restore from a
+    checkpoint would skip, are what tell whether the dbxml is still valid.
+    They make an unneeded rerun cheap anyway.
+
     """
 
+    checkpointable = False
+
     def __init__(self, cap_tbl):
         """Add self to the capability table."""
         super(GcamComponent, self).__init__(cap_tbl)
         self.addcapability('gcam-core')
+        self.addcapability('gcam-config')
+        self.addcapability('gcam-progress')
+        self.addearly('gcam-config')
+        self.addearly('gcam-progress')
+
+    def finalize_parsing(self):
+        super(GcamComponent, self).finalize_parsing()
+        self.params['force'] = util.parseTFstring(self.params.get('force', 'False'))
+        if 'timeout' in self.params:
+            self.params['timeout'] = float(self.params['timeout'])
+        else:
+            self.params['timeout'] = None
+        self.params.setdefault('progress_pattern', r'Period\s+(\d+)\s*:\s*(\d+)')
 
     def run_component(self):
         """Run the GCAM core model.
@@ -448,7 +906,10 @@ class GcamComponent(ComponentBase):
         config.xml file to find out what outputs we expect, and we
         check to see if they are already present.  If they are, and if
         'clobber' is not set to True, then we skip the run and return
-        the location of the existing dbxml.  Otherwise, we do the GCAM
+        the location of the existing dbxml.  If 'clobber' is set, we
+        compare the fingerprints of the current inputs to the ones
+        recorded by the run that produced the dbxml, and skip the run
+        if they match (unless 'force' is set).  Otherwise, we do the GCAM
         run and then return the dbxml location.
 
         """
@@ -480,62 +941,84 @@ class GcamComponent(ComponentBase):
         # we also need to get the location of the dbxml output file.
         # It's in the gcam.config file (we don't repeat it in the
         # config for this component because then we would have no way to
-        # ensure consistency).
-        dbxmlfpat = re.compile(r'<Value name="xmldb-location">(.*)</Value>')
-        dbenabledpat = re.compile(r'<Value name="write-xml-db">(.*)</Value>')
+        # ensure consistency).  The rest of the run metadata we collect from
+        # the config is published as the 'gcam-config' capability.
+        gcamcfg = util.read_gcam_config(cfg, self.workdir)
+        self.addresults('gcam-config', gcamcfg, early=True)
 
-        # get a reference to the results that we will be exporting
-        gcamrslt = {}
+        progress = Progress()
+        self.addresults('gcam-progress', progress, early=True)
 
-        with open(cfg, "r") as cfgfile:
-            # we don't need to parse the whole config file; all we
-            # want is to locate the name of the output file make sure
-            # the dbxml output is turned on.
-            dbxmlfile = None
-            for line in cfgfile:
-                # the dbxml file name will come early in the file
-                match = dbxmlfpat.match(line.lstrip())
-                if match:
-                    dbxmlfile = match.group(1)
-                    break
-
-            logging.info(f"{self.__class__}:  dbxmlfile = {dbxmlfile}")
-            # The file spec is a relative path, starting from the
-            # directory that contains the config file.
-            dbxmlfile = os.path.join(self.workdir, dbxmlfile)
-            gcamrslt["dbxml"] = dbxmlfile  # This is our eventual output
-            if os.path.exists(dbxmlfile):
-                if not self.clobber:
-                    # This is not an error; it just means we can leave
-                    # the existing output in place and return it.
-                    logging.info("GcamComponent:  results exist and no clobber.  Skipping.")
-                    gcamrslt["changed"] = 0  # mark the cached results as clean
-                    return 0
-                else:
-                    # have to remove the dbxml, or we will merely append to it
-                    os.unlink(dbxmlfile)
-
-            # now make sure that the dbxml output is turned on
-            for line in cfgfile:
-                match = dbenabledpat.match(line.lstrip())
-                if match:
-                    if match.group(1) != "1":
-                        raise RuntimeError(
-                            msgpfx + "Config file has dbxml input turned off.  Running GCAM would be futile.")
-                    else:
-                        break
+        dbxmlfile = gcamcfg['dbxml']
+        logging.info(f"{self.__class__}:  dbxmlfile = {dbxmlfile}")
+        if dbxmlfile is None:
+            raise RuntimeError(msgpfx + "Config file does not set xmldb-location.")
 
+        # get a reference to the results that we will be exporting
+        gcamrslt = {}
         # Add our output structure to the results dictionary.
         self.addresults('gcam-core', gcamrslt)
+        gcamrslt["dbxml"] = dbxmlfile  # This is our eventual output
+
+        if os.path.exists(dbxmlfile) and not self.clobber:
+            # This is not an error; it just means we can leave
+            # the existing output in place and return it.
+            logging.info("GcamComponent:  results exist and no clobber.  Skipping.")
+            gcamrslt["changed"] = 0  # mark the cached results as clean
+            progress.finish()
+            return 0
+
+        # Fingerprint everything that determines the outputs.  The manifest
+        # from the previous run (if any) lets us skip hashing files whose
+        # size and mtime haven't changed.
+        manifest_file = os.path.normpath(dbxmlfile) + '.fingerprint.json'
+        prev_manifest = util.read_manifest(manifest_file)
+        fingerprints = util.fingerprint_files([exe, cfg, logcfg] + gcamcfg['inputs'],
+                                              prev_manifest)
+
+        if os.path.exists(dbxmlfile):
+            if not self.params['force'] and util.fingerprints_match(prev_manifest, fingerprints):
+                logging.info("GcamComponent:  results exist and inputs are unchanged.  Skipping.")
+                gcamrslt["changed"] = 0
+                progress.finish()
+                return 0
+
+        # now make sure that the dbxml output is turned on (before we remove
+        # any existing results)
+        if gcamcfg['write-xml-db'] is False:
+            raise RuntimeError(
+                msgpfx + "Config file has dbxml input turned off.  Running GCAM would be futile.")
+
+        if os.path.exists(dbxmlfile):
+            # have to remove the dbxml, or we will merely append to it
+            if os.path.isdir(dbxmlfile):
+                shutil.rmtree(dbxmlfile)
+            else:
+                os.unlink(dbxmlfile)
+
+        # The old manifest no longer describes anything on disk.
+        if prev_manifest is not None:
+            os.unlink(manifest_file)
+
+        gcamrslt["changed"] = 1
 
         # now we're ready to actually do the run.  We don't check the return code; we let the run() method do that.
         logging.info(f"Running:  {exe} -C{cfg} -L{logcfg}")
 
-        if logfile is None:
-            return subprocess.call([exe, '-C'+cfg, '-L'+logcfg], cwd=self.workdir)
-        else:
-            with open(logfile, "w") as lf:
-                return subprocess.call([exe, '-C'+cfg, '-L'+logcfg], stdout=lf, cwd=self.workdir)
+        supervisor = ProcessSupervisor([exe, '-C'+cfg, '-L'+logcfg], cwd=self.workdir,
+                                       logfile=logfile,
+                                       progress_pattern=self.params['progress_pattern'],
+                                       timeout=self.params['timeout'], progress=progress)
+        try:
+            rv = supervisor.run()
+        finally:
+            gcamrslt['resources'] = supervisor.stats
+            logging.info(f"GcamComponent:  resource usage: {supervisor.stats}")
+
+        if rv == 0:
+            util.write_manifest(manifest_file, fingerprints)
+
+        return rv
 
 
 class TethysComponent(ComponentBase):
@@ -552,8 +1035,24 @@ class TethysComponent(ComponentBase):
 
     For more information: https://github.com/JGCRI/tethys
 
+    Each sector's data is converted to the result type only when its
+    capability is first fetched (optionally to a more compact type), so
+    sectors that are never fetched are never copied.  Each sector is held
+    separately, so it is freed as soon as its capability is released (see
+    track_consumers), whether or not it was fetched.  Sectors not listed in
+    the outputs parameter are discarded as soon as Tethys finishes.
+
     params:
-       config_file - path to Tethys config file
+       config_file - path to Tethys config file.  The driver's parse of the
+                     file is cached (see util.read_ini); Tethys reads the
+                     file itself when it runs.
+           outputs - list of capabilities to provide (OPTIONAL - default is
+                     all of them).  For example, a run that uses only the
+                     total demand can set
+                     outputs = gridded_water_demand_total
+             dtype - numpy type to convert the gridded results to when they
+                     are fetched, e.g. float32 (OPTIONAL - default is to keep
+                     Tethys's type)
     """
 
     def __init__(self, cap_tbl):
@@ -579,38 +1078,72 @@ class TethysComponent(ComponentBase):
             "gridded_monthly_water_demand_min": "twdmin",    # Mining
         }
 
-        for cap in self.capability_map.keys():
-            self.addcapability(cap)
-
     def finalize_parsing(self):
         super(TethysComponent, self).finalize_parsing()
 
         # Check if Tethys is running with temporal downscaling (an optional output)
-        from configobj import ConfigObj
-
-        tethys_config = ConfigObj(self.params['config_file'])
+        tethys_config = util.read_ini(self.params['config_file'])
         temporal_downscaling = tethys_config['Project']['PerformTemporal']
 
         # If it is, add the temporal downscaling capabilities
         if temporal_downscaling:
-            for cap in self.temporal_sectors.keys():
-                self.addcapability(cap)
             self.capability_map.update(self.temporal_sectors)
 
+        outputs = self.params.get('outputs')
+        if outputs is not None:
+            if not isinstance(outputs, list):
+                outputs = [outputs]
+            outputs = [o for o in outputs if o != '']
+            for cap in outputs:
+                if cap not in self.capability_map:
+                    raise RuntimeError(f'Unknown Tethys output {cap}.')
+            self.capability_map = {cap: self.capability_map[cap] for cap in outputs}
+
+        for cap in self.capability_map.keys():
+            self.addcapability(cap)
+
+        self.params['dtype'] = self.params.get('dtype')
+
     def run_component(self):
         """Run Tethys."""
         from tethys.model import Tethys
 
         config_file = self.params["config_file"]
 
-        # run the Tethys model
+        # run the Tethys model.  Tethys takes the path to its config file (it
+        # resolves other paths relative to it), so it parses the file itself.
         tethys_results = Tethys(config=config_file)
-
+        gridded_data = tethys_results.gridded_data
+
+        # Drop the outputs we aren't providing, so that they can be freed.
+        wanted = set(self.capability_map.values())
+        for attr in list(self.temporal_sectors.values()) + [
+                'wddom', 'wdelec', 'wdirr', 'wdliv', 'wdmfg', 'wdmin', 'wdnonag', 'wdtotal']:
+            if attr not in wanted and hasattr(gridded_data, attr):
+                setattr(gridded_data, attr, None)
+
+        # Each lazy result holds only its own sector's data, so each sector is
+        # freed as soon as its result is released, whether or not it was ever
+        # materialized.
         for capability_name, tethys_attr in self.capability_map.items():
-            self.addresults(capability_name, getattr(tethys_results.gridded_data, tethys_attr))
+            data = getattr(gridded_data, tethys_attr)
+            setattr(gridded_data, tethys_attr, None)
+            self.addresults(capability_name, store.LazyResult(self.sector_getter(data)))
 
         return 0
 
+    def sector_getter(self, data):
+        """Make a function that converts a sector's data to the configured dtype."""
+        dtype = self.params['dtype']
+
+        def get_sector():
+            import numpy as np
+            if dtype is not None:
+                return np.asarray(data, dtype=dtype)
+            return data
+
+        return get_sector
+
 
 class XanthosComponent(ComponentBase):
     """Class for the global hydrologic model Xanthos
@@ -625,9 +1158,25 @@ class XanthosComponent(ComponentBase):
     the grids in the precipitation and temperature lists match one another.
 
     params:
-          config_file    - Path to Xanthos config file
+          config_file    - Path to Xanthos config file.  The driver's parse
+                           of the file is cached (see util.read_ini); Xanthos
+                           reads the file itself when it runs.
           OutputNameStr  - Name for the directory to create for Xanthos outputs
 
+    The reference file mapping Xanthos cells to coordinates is read in the
+    background, starting when the component's parameters are parsed, so that
+    it overlaps with the startup of the other components.  Components using
+    the same reference file share a single copy (see
+    util.read_reference_table).
+
+    Xanthos parses its reference grids (grid areas, coordinates, and the
+    basin, region, and country maps) every time it runs.  These are also
+    converted to .npy files in the background (see util.reference_npy), and
+    Xanthos is given the converted files instead, so each grid is parsed only
+    once per run, or only once for all runs if the reference_cache global
+    parameter is set.  The ABCD parameters are already stored as .npy, and
+    the name tables are small, so Xanthos reads those itself.
+
     Capability dependencies (all optional):
            gridded_pr  - List of gridded monthly precipitation by grid cell
           gridded_tas  - List of gridded monthly temperature by grid cell
@@ -645,31 +1194,72 @@ class XanthosComponent(ComponentBase):
         self.addcapability("gridded_runoff")
 
     def finalize_parsing(self):
-        """Load the reference file mapping Xanthos cell index to lat/lon."""
+        """Start loading the reference file mapping Xanthos cell index to lat/lon."""
         super(XanthosComponent, self).finalize_parsing()
 
-        from configobj import ConfigObj
-        import pandas as pd
-
-        xanthos_config = ConfigObj(self.params['config_file'])
+        xanthos_config = util.read_ini(self.params['config_file'])
         root_dir = xanthos_config['Project']['RootDir']
         in_dir = xanthos_config['Project']['InputFolder']
         ref_dir = xanthos_config['Project']['RefDir']
 
-        cell_map_path = os.path.join(root_dir, in_dir, ref_dir, 'coordinates.csv')
+        ref_path = os.path.abspath(os.path.join(root_dir, in_dir, ref_dir))
+        cell_map_path = os.path.join(ref_path, 'coordinates.csv')
+        self.cell_map_future = util.prefetch(('xanthos-cell-map', cell_map_path),
+                                             self.read_cell_map, cell_map_path)
+        self.reference_future = util.prefetch(('xanthos-reference', ref_path, util.reference_cache_dir()),
+                                              self.convert_reference_grids, ref_path)
+
+    @staticmethod
+    def read_cell_map(cell_map_path):
+        """Read the reference file mapping Xanthos cell index to lat/lon."""
         xcolnames = ['cell_id', 'lon', 'lat', 'lon_idx', 'lat_idx']
+        return util.read_reference_table(cell_map_path, names=xcolnames)
+
+    # Reference grids that Xanthos parses with np.genfromtxt: Xanthos config
+    # attribute, file name in the reference directory, and number of header
+    # lines (see xanthos.data_reader.data_load.DataLoader).
+    reference_grids = [('Area', 'Grid_Areas_ID.csv', 0),
+                       ('Coord', 'coordinates.csv', 0),
+                       ('BasinIDs', 'basin.csv', 1),
+                       ('GCAMRegionIDs', 'region32_grids.csv', 1),
+                       ('CountryIDs', 'country.csv', 1)]
+
+    @classmethod
+    def convert_reference_grids(cls, ref_path):
+        """Convert the Xanthos reference grids to .npy files.
 
-        self.cell_map = pd.read_csv(cell_map_path, names=xcolnames)
+        Returns a dictionary of Xanthos config attributes and the converted
+        files, for passing to Xanthos.execute().  Grids that don't exist are
+        left to Xanthos.
+
+        """
+        grids = {}
+        for attr, filename, header in cls.reference_grids:
+            path = os.path.join(ref_path, filename)
+            if os.path.exists(path):
+                grids[attr] = util.reference_npy(path, delimiter=',', skip_header=header,
+                                                 filling_values='0')
+        return grids
+
+    @property
+    def cell_map(self):
+        """Xanthos cell map (waits for the background load to finish)."""
+        return self.cell_map_future.result()
 
     def run_component(self):
         """Run Xanthos."""
         import xanthos
 
+        # Xanthos takes the path to its config file, so it parses the file
+        # itself.
         config_file = self.params["config_file"]
         xth = xanthos.Xanthos(config_file)
 
         gridded_runoff = []
 
+        # Point Xanthos at the converted reference grids.
+        args = dict(self.reference_future.result())
+
         # Other components should produce gridded climate data as a list of 2d numpy arrays
         cap_names = ['gridded_pr', 'gridded_tas', 'gridded_pr_coord', 'gridded_tas_coord']
         if all(cap in self.cap_tbl for cap in cap_names):
@@ -679,7 +1269,6 @@ class XanthosComponent(ComponentBase):
             tas_coord = self.fetch('gridded_tas_coord')
 
             # Run Xanthos for each pair of precipitation and temperature grids
-            args = {}
             if self.params.get('OutputNameStr') is not None:
                 args['OutputNameStr'] = self.params['OutputNameStr']
 
@@ -689,7 +1278,7 @@ class XanthosComponent(ComponentBase):
                 xth_results = xth.execute(args)
                 gridded_runoff.append(xth_results.Q)
         else:
-            xth_results = xth.execute()
+            xth_results = xth.execute(args)
             gridded_runoff.append(xth_results.Q)
 
         self.addresults("gridded_runoff", gridded_runoff)
@@ -750,18 +1339,47 @@ class FldgenComponent(ComponentBase):
        ngrids   - Number of climate fields to generate.
       startyr   - Starting year for the climate fields
         nyear   - Number of years in the climate fields.  This MUST match the
-                  number of years the emulator was trained on.
-                  TODO:  get this from the emulator when we read it in so that
-                  we don't have to set it manually.
+                  number of years the emulator was trained on.  (OPTIONAL -
+                  default is to get it from the emulator's metadata; see below)
      scenario   - Hector scenario to use for the mean field calculation.
       RNGseed   - Optional seed for the R random number generator.  If omitted,
                   then the R instance will seed its RNG with whatever default it
                   normally uses.
       a2mfrac   - monthly fraction dataset to use for monthly downscaling.  If
                   omitted, the data is assumed to have been generated at monthly
-                  resolution.
+                  resolution.  This can be the name of a dataset in the an2month
+                  package or an .npz file (see rutil.load_fractions).
+    a2mmethod   - 'numpy' to do the monthly downscaling natively, on the whole
+                  ensemble at once (see downscale.py), or 'R' to use the
+                  an2month package's downscaling.  (OPTIONAL - default is numpy)
      debugdir   - Location to write debug file output.  If omitted, no debug output
-                  is produced.
+                  is produced.  The output for each variable is a numpy array of
+                  (realization x month x grid cell) for the first 24 months and
+                  10 grid cells, written to debug-tas.npy and debug-pr.npy in
+                  the background.
+ debugcompress  - If true, write the debug output as compressed .npz files
+                  instead.  (OPTIONAL - default is False)
+     rworkers   - Number of R worker processes to run the calculation in.  If
+                  0 (the default), the calculation runs in this process's
+                  embedded R, and R calls from all fldgen components are
+                  serialized.  Otherwise it runs in a pool of worker processes
+                  (shared by all fldgen components asking for the same number
+                  of workers), so that several fldgen components can run in
+                  parallel.  Either way, packages and emulators are loaded only
+                  once per process.  See rutil.py.
+    chunksize   - Maximum number of realizations to generate in one R call.  If
+                  ngrids is larger than this, the realizations are generated in
+                  chunks, which run in parallel when rworkers > 0.  Each chunk
+                  gets its own RNG seed derived from RNGseed, so results are
+                  reproducible for a given RNGseed and chunksize.  (OPTIONAL -
+                  default is ngrids, i.e., one chunk)
+
+    The first time an emulator is used, its coordinates and dimensions are
+    saved in a metadata cache next to the RDS file (see
+    rutil.read_emulator_metadata).  On later runs these are read from the cache
+    without starting R, and the coordinate capabilities are published as soon
+    as the component starts running, rather than after the fields have been
+    generated.
 
     Capability dependencies:
        Tgav     - Global mean temperature.  Tgav is normally provided by
@@ -771,13 +1389,15 @@ class FldgenComponent(ComponentBase):
     results: precipitation (pr) and temperature (tas) grids and coordinate
     matrix.  The results are organized thus:
 
-    capability 'gridded_pr': list of matrices.  Each matrix is one of the
-    generated precipitation fields, with grid cells in rows and months in
-    columns.  TODO: document units of precip (kg/m^2/s ?)
+    capability 'gridded_pr': float32 array of (realization x grid cell x
+    month).  Each element along the first axis is one of the generated
+    precipitation fields, with grid cells in rows and months in columns.
+    Iterating over the array yields the individual fields, so it can be used
+    like a list of matrices.  TODO: document units of precip (kg/m^2/s ?)
 
-    capability 'gridded_tas': list of matrices.  Each matrix is one of the
-    generated temperature fields, with grid cells in rows and months in
-    columns.  TODO: document units of temperature (K ?)
+    capability 'gridded_tas': float32 array of (realization x grid cell x
+    month), organized the same way as 'gridded_pr', holding the generated
+    temperature fields.  TODO: document units of temperature (K ?)
 
     capability 'gridded_tas_coord': Matrix of lat/lon coordinates for the
     temperature grid cells.  The rows are in the same order as the rows in the
@@ -805,87 +1425,118 @@ class FldgenComponent(ComponentBase):
         self.addcapability("gridded_tas")
         self.addcapability('gridded_pr_coord')
         self.addcapability('gridded_tas_coord')
+        self.addearly('gridded_pr_coord')
+        self.addearly('gridded_tas_coord')
 
     def finalize_parsing(self):
         super(FldgenComponent, self).finalize_parsing()
         self.params['loadpkgs'] = util.parseTFstring(self.params['loadpkgs'])
         self.params['ngrids'] = int(self.params['ngrids'])
         self.params['startyr'] = int(self.params['startyr'])
-        self.params['nyear'] = int(self.params['nyear'])
+        if self.params.get('nyear') is not None:
+            self.params['nyear'] = int(self.params['nyear'])
+        self.params['rworkers'] = int(self.params.get('rworkers', 0))
+        self.params['debugcompress'] = util.parseTFstring(self.params.get('debugcompress', 'False'))
+        self.params['chunksize'] = int(self.params.get('chunksize', self.params['ngrids']))
+        if self.params['chunksize'] < 1:
+            raise RuntimeError(f"{self.__class__}: chunksize must be at least 1 (got {self.params['chunksize']}).")
+        if self.params.get('RNGseed') is not None:
+            self.params['RNGseed'] = int(self.params['RNGseed'])
 
     def run_component(self):
         """Run the fldgen and an2month R scripts."""
-        from rpy2.robjects.packages import importr
-        import rpy2.robjects as robjects
-        import numpy as np
-        from rpy2.robjects import numpy2ri
-        numpy2ri.activate()  # enable automatic conversion of numpy objects to R equivalents.
-
-        if self.params['loadpkgs']:
-            import os
-            pkgdir = self.params["pkgdir"]
+        from cassandra.rutil import fldgen_task, split_task, merge_results, \
+            read_emulator_metadata, emulator_metadata_task
 
-            an2month = os.path.join(pkgdir, "an2month")
-            fldgen = os.path.join(pkgdir, "fldgen")
-
-            devtools = importr("devtools")
-            devtools.load_all(an2month)
-            devtools.load_all(fldgen)
-
-        # Import fldgen and run the generator
-        fldgen = importr('fldgen')
-        emu = fldgen.loadmodel(self.params['emulator'])
-        if self.params.get('RNGseed') is not None:
-            setseed = robjects.r['set.seed']
-            setseed(self.params['RNGseed'])
-
-        fullgrids_annual = self.run_fldgen(emu, fldgen)
-
-        coords = self.extract_coords(emu, fldgen)
-
-        if self.params.get('a2mfrac') is None:
-            # Data is already at monthly resolution; however, we do still
-            # need to transpose it so that months are in columns.
-            fullgrids_monthly = {}
-            fullgrids_monthly['pr'] = [np.transpose(np.asarray(x, dtype=np.float32)) for x in fullgrids_annual['pr']]
-            fullgrids_monthly['tas'] = [np.transpose(np.asarray(x, dtype=np.float32)) for x in fullgrids_annual['tas']]
-        else:
-            fullgrids_monthly = self.run_monthlyds(fullgrids_annual, coords)
-
-        self.addresults('gridded_pr', fullgrids_monthly['pr'])
-        self.addresults('gridded_tas', fullgrids_monthly['tas'])
-        self.addresults('gridded_pr_coord', coords['pr'])
-        self.addresults('gridded_tas_coord', coords['tas'])
+        task = {
+            'loadpkgs': self.params['loadpkgs'],
+            'pkgdir': self.params.get('pkgdir'),
+            'emulator': self.params['emulator'],
+        }
 
-        # Produce debug output, if requested
+        # Get the coordinates and dimensions from the emulator metadata cache,
+        # creating it if necessary.
+        meta = read_emulator_metadata(self.params['emulator'])
+        if meta is None:
+            meta = self.run_r(emulator_metadata_task, [task])[0]
+        coords = meta['coords']
+        self.addresults('gridded_pr_coord', coords['pr'], early=True)
+        self.addresults('gridded_tas_coord', coords['tas'], early=True)
+
+        if self.params.get('nyear') is None:
+            if meta['nyear'] is None:
+                raise RuntimeError(f"Can't determine nyear from emulator {self.params['emulator']}.  "
+                                   'Set it in the configuration.')
+            self.params['nyear'] = meta['nyear']
+        elif meta['nyear'] is not None and meta['nyear'] != self.params['nyear']:
+            logging.warning(f"nyear = {self.params['nyear']}, but emulator was trained on "
+                            f"{meta['nyear']} years.")
+
+        task.update({
+            'ngrids': self.params['ngrids'],
+            'RNGseed': self.params.get('RNGseed'),
+            'tgav': self.get_tgav(),
+            'a2mfrac': self.params.get('a2mfrac'),
+            'a2mmethod': self.params.get('a2mmethod', 'numpy'),
+            'startyr': self.params['startyr'],
+            'coords': coords,
+        })
+
+        chunks = split_task(task, self.params['chunksize'])
+        rslt = merge_results(self.run_r(fldgen_task, chunks))
+
+        self.addresults('gridded_pr', rslt['pr'])
+        self.addresults('gridded_tas', rslt['tas'])
+
+        # Produce debug output, if requested.  The writes happen in the
+        # background, so they don't hold up the components waiting on our
+        # results.
         ddir = self.params.get('debugdir')
         if ddir is not None:
             import os.path
             import numpy as np
 
+            writer = util.BackgroundWriter.get()
             for var in ['tas', 'pr']:
-                filestem = os.path.join(ddir, f'debug-{var}')
-                for i, m in enumerate(fullgrids_monthly[var]):
-                    # Write debug output with months in rows, as it will be easier to visually scan that way.
-                    tasdata = np.transpose(m[0:10, 0:24])
-                    filename = f'{filestem}-{i}.csv'
-                    np.savetxt(filename, tasdata)
+                # Write debug output with months in rows, as it will be easier
+                # to visually scan that way.  Copy the slice so that the writer
+                # doesn't keep the full results alive.
+                data = np.ascontiguousarray(np.transpose(rslt[var][:, 0:10, 0:24], (0, 2, 1)))
+                writer.submit(util.save_array, os.path.join(ddir, f'debug-{var}'), data,
+                              self.params['debugcompress'])
 
         return 0
 
-    def run_fldgen(self, emu, fldgen):
-        """Run the fldgen calculation and return the results.
+    def run_r(self, fn, tasks):
+        """Run R tasks, returning a list of their results in order.
+
+        :param fn: Function to run for each task (e.g., rutil.fldgen_task)
+        :param tasks: List of task dictionaries to pass to the function
 
-        :param emu: Fldgen emulator structure
-        :param fldgen: Fldgen package handle from rpy2
-        :return: Dictionary with entries 'tas' and 'pr'.  Each entry is a list
-                 of numpy arrays.
+        The R calculations run either on the process-wide R thread or in
+        worker processes with their own R, so that several fldgen components
+        can't interfere with each other in the embedded R.  With workers, the
+        tasks run in parallel.
 
         """
-        import numpy as np
+        from cassandra.rutil import RSession, RWorkerPool
+
+        if self.params['rworkers'] > 0:
+            pool = RWorkerPool.get(self.params['rworkers'])
+            futures = [pool.submit(fn, task) for task in tasks]
+            return [future.result() for future in futures]
+        else:
+            session = RSession.get()
+            return [session.call(fn, task) for task in tasks]
 
-        # Calculate residuals
-        resids = fldgen.generate_TP_resids(emu, self.params['ngrids'])
+    def get_tgav(self):
+        """Get the global mean temperatures for the fldgen calculation.
+
+        :return: numpy array of temperatures for the years startyr through
+                 startyr+nyear-1, in order.
+
+        """
+        import numpy as np
 
         # Get global mean temperatures.  This is returned as a dataframe
         # containing multiple scenarios, so we need to filter it down to the
@@ -903,78 +1554,7 @@ class FldgenComponent(ComponentBase):
 
         year = tgavdf['year'].values
         perm = np.argsort(year)
-        tgav = tgavdf['value'].values[perm]
-
-        fullgrids = fldgen.generate_TP_fullgrids(emu, resids, tgav)
-
-        # fullgrids is a list of paired temperature and precipitation grids. in R notation they
-        # are stored in fullgrids$fullgrids[[i]]$tas and fullgrids$fullgrids[[i]]$pr.  We don't care about
-        # anything else in the fullgrids structure above.  (Remember x[[1]] in R is
-        # x[0] in python.)
-        gridstructs = fullgrids.rx2('fullgrids')
-
-        tas = [np.asarray(gs.rx2('tas')) for gs in gridstructs]
-        pr = [np.asarray(gs.rx2('pr')) for gs in gridstructs]
-
-        return {'tas': tas, 'pr': pr}
-
-    def extract_coords(self, emu, fldgen):
-        """Extract the coordinate structure from the emulator
-
-        :param emu: Fldgen emulator structure.
-        :param fldgen: Fldgen package structure from rpy2.
-        :return: Dictionary with entries 'tas' and 'pr'.  Each is a matrix of coordinates
-                 for each grid cell, with cells in rows and latitude, longitude in the two
-                 columns.
-
-        """
-
-        import numpy as np
-        griddataT = emu[0]
-        griddataP = emu[1]
-        coords = {}
-        for name, griddata in zip(['tas', 'pr'], [griddataT, griddataP]):
-            gd = dict(griddata.items())
-            try:
-                coord = np.asarray(gd['coord'])
-            except KeyError:
-                # If the grid is regular, then fldgen doesn't store a coordinate
-                # array.  Use the coord_array function tocreate one.
-                coord = np.asarray(fldgen.coord_array(gd['lat'], gd['lon']))
-            coords[name] = coord
-
-        return coords
-
-    def run_monthlyds(self, annual_flds, coords):
-        """Run the monthly downscaling calculation
-
-        :param annual_flds: Structure returned from run_fldgen
-        :param coords: Coordinate matrix returned from fldgen
-        :return: Dictionary with 'pr' and 'tas' entries. Each entry is a list of
-                 matrices of field data at monthly resolution (grid cells in rows,
-                 months in columns)
-        """
-
-        from rpy2.robjects.packages import importr
-        import numpy as np
-
-        an2month = importr('an2month')
-
-        rslt = {}
-        for var in annual_flds:
-            ntime = np.asarray(annual_flds[var][0]).shape[0]  # there is probably an easier way to do this.
-            time = np.arange(ntime) + self.params['startyr'] - 1
-            monthly = an2month.downscaling_component_api(self.params['a2mfrac'], annual_flds[var],
-                                                         coords[var], time, var)
-
-            if var == 'pr':
-                # If this is precipitation, convert units.
-                monthly = [an2month.pr_conversion(x) for x in monthly]
-
-            rslt[var] = [np.transpose(np.asarray(x, dtype=np.float32)) for x in monthly]
-            logging.debug(f'Result for {var}: len = {len(rslt[var])}. Shape = {rslt[var][0].shape}')
-
-        return rslt
+        return tgavdf['value'].values[perm]
 
 
 class HectorStubComponent(ComponentBase):
@@ -6,6 +6,9 @@ TAG_CONFIG = 100                # configuration distribution method
 TAG_REQ = 101
 TAG_REQID_BASE = 102            # Base for block of tag values indicating responses
                                 # to requests.
+TAG_SHM_DONE = 99               # consumer has mapped an array published in shared
+                                # memory (see shmem.py).  This must be below
+                                # TAG_REQ, since response tags count up from there.
 
 ### Other config constants for MPI
 SUPERVISOR_RANK = 0
@@ -0,0 +1,119 @@
+"""Annual to monthly downscaling of gridded fields, in numpy.
+
+This is a native implementation of the monthly fraction downscaling done by the
+an2month R package.  The R version downscales one realization at a time and
+converts precipitation units with a separate R call for each realization.  Here
+the whole stacked ensemble (realization x grid cell x year) is downscaled with
+a single broadcast operation, with the unit conversion folded into the
+precipitation fractions beforehand.
+
+The downscaling follows an2month:
+  tas: monthly = annual + frac            (frac is the monthly offset from the
+                                           annual mean temperature)
+   pr: monthly = annual * 12 * frac       (frac is the fraction of the annual
+                                           precipitation falling in each month)
+Precipitation is then converted from a flux (kg m-2 s-1) to a monthly total
+(mm/month) by multiplying by the number of seconds in each month.
+
+Functions:
+
+align_fractions  - Put a monthly fraction table into the grid cell order of a
+                   set of fields.
+
+monthly_factors  - Prepare the (grid cell x month) table that is broadcast
+                   against the annual fields.
+
+downscale        - Downscale a stack of annual fields to monthly resolution.
+
+"""
+
+import numpy as np
+
+
+# Days in each month (no leap years), as used by an2month's pr_conversion
+DAYS_PER_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+SECONDS_PER_DAY = 86400
+
+
+def align_fractions(frac, frac_coords, fld_coords):
+    """Put a monthly fraction table into the grid cell order of some fields.
+
+    :param frac: Array of monthly fractions (grid cell x month)
+    :param frac_coords: Array of (lat, lon) coordinates for the rows of frac, or
+                        None if frac is already in field order.
+    :param fld_coords: Array of (lat, lon) coordinates for the grid cells of the
+                       fields (grid cell x 2)
+    :return: Fraction array with rows matching the rows of fld_coords.
+
+    """
+    frac = np.asarray(frac)
+    if frac.ndim != 2 or 12 not in frac.shape:
+        raise ValueError(f'Monthly fractions must be a (grid cell x month) array; got shape {frac.shape}')
+    if frac.shape[1] != 12:
+        frac = frac.T
+
+    if frac_coords is None:
+        if frac.shape[0] != fld_coords.shape[0]:
+            raise ValueError(f'Monthly fractions have {frac.shape[0]} grid cells; fields have {fld_coords.shape[0]}.')
+        return frac
+
+    rowidx = {(lat, lon): i for i, (lat, lon) in enumerate(np.asarray(frac_coords)[:, 0:2].tolist())}
+    try:
+        order = [rowidx[(lat, lon)] for lat, lon in np.asarray(fld_coords)[:, 0:2].tolist()]
+    except KeyError as err:
+        raise ValueError(f'Field grid cell {err.args[0]} is not in the monthly fraction data.')
+    return frac[order, :]
+
+
+def monthly_factors(frac, var, dtype=np.float32):
+    """Prepare the table that is broadcast against the annual fields.
+
+    :param frac: Aligned monthly fractions (grid cell x month)
+    :param var: Variable name ('tas' or 'pr')
+    :param dtype: Type of the result
+    :return: (grid cell x month) array.  For tas, this is the offset to add to
+             the annual values; for pr, it is the factor to multiply them by,
+             including the unit conversion.
+
+    The table is computed in double precision and rounded once at the end.
+
+    """
+    frac = np.asarray(frac, dtype=np.float64)
+    if var == 'tas':
+        factors = frac
+    elif var == 'pr':
+        factors = frac * (12 * SECONDS_PER_DAY * DAYS_PER_MONTH)
+    else:
+        raise ValueError(f'Unknown variable for monthly downscaling: {var}')
+    return np.ascontiguousarray(factors, dtype=dtype)
+
+
+def downscale(annual, factors, var, out=None):
+    """Downscale a stack of annual fields to monthly resolution.
+
+    :param annual: Array of annual fields (realization x grid cell x year)
+    :param factors: Table from monthly_factors() (grid cell x month)
+    :param var: Variable name ('tas' or 'pr')
+    :param out: Optional output array (realization x grid cell x 12*year).  If
+                None, a new array with the same type as annual is allocated.
+    :return: Array of monthly fields (realization x grid cell x month), with
+             the months of each year in consecutive columns.
+
+    """
+    nreal, ncell, nyear = annual.shape
+    if factors.shape != (ncell, 12):
+        raise ValueError(f'Monthly factors have shape {factors.shape}; expected {(ncell, 12)}')
+
+    if out is None:
+        out = np.empty((nreal, ncell, nyear*12), dtype=annual.dtype)
+    out4 = out.reshape(nreal, ncell, nyear, 12)
+
+    # (nreal, ncell, nyear, 1) against (ncell, 1, 12)
+    if var == 'tas':
+        np.add(annual[..., np.newaxis], factors[:, np.newaxis, :], out=out4)
+    elif var == 'pr':
+        np.multiply(annual[..., np.newaxis], factors[:, np.newaxis, :], out=out4)
+    else:
+        raise ValueError(f'Unknown variable for monthly downscaling: {var}')
+
+    return out
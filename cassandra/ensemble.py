@@ -0,0 +1,249 @@
+"""Support for running ensembles of configurations in a single invocation.
+
+An ensemble run takes a base configuration file and a sweep file.  The sweep
+file has an [Ensemble] section giving the values to sweep over for some of the
+parameters in the base configuration:
+
+    [Ensemble]
+    mode = product             # or zip
+    shared = HectorStubComponent
+    max_concurrent = 8
+      [[FldgenComponent]]
+      RNGseed = 1, 2, 3, 4
+      scenario = rcp45, rcp85
+
+Each combination of swept values (all combinations for mode=product; the i-th
+value of every list for mode=zip) defines an ensemble member.  Every member gets
+its own copy of each component in the base configuration, except for the
+sections listed under 'shared'.  Those components (and the Global section) are
+created once and serve their capabilities to all of the members, so data that
+doesn't vary across the ensemble (e.g., Hector output) is only loaded once.
+
+Each member has its own capability table, so members can use the same
+capability names without colliding.  Shared components, on the other hand, can
+see only the capabilities of other shared components.
+
+Any string parameter containing '{member}' has it replaced by the member
+number, which is useful for giving each member its own output directory.
+
+If max_concurrent is given, at most that many members will run at once;
+otherwise all members run concurrently, subject to their data dependencies.
+
+Functions:
+
+read_sweep     - Read the [Ensemble] section from a sweep file.
+
+expand_sweep   - Expand a base configuration and a sweep into shared sections
+                 and per-member sections.
+
+create_members - Create the components for the shared sections and members.
+
+"""
+
+import itertools
+import threading
+import logging
+from cassandra.compfactory import create_component
+
+
+def read_sweep(filename):
+    """Read an ensemble sweep file.
+
+    :param filename: Name of the sweep file.
+    :return: Dictionary with entries:
+                 mode: 'product' or 'zip'
+               shared: list of section names to share between members
+       max_concurrent: maximum number of members to run at once (None for no
+                       limit)
+                sweep: dictionary of {section: {parameter: [values]}}
+
+    """
+    from configobj import ConfigObj
+
+    config = ConfigObj(filename)
+    try:
+        ens = config['Ensemble']
+    except KeyError:
+        raise RuntimeError("Sweep file must have an '[Ensemble]' section")
+
+    mode = ens.get('mode', 'product')
+    if mode not in ('product', 'zip'):
+        raise RuntimeError(f'Unknown ensemble mode {mode}.')
+
+    shared = ens.get('shared', [])
+    if not isinstance(shared, list):
+        shared = [shared]
+    shared = [s for s in shared if s != '']
+
+    max_concurrent = ens.get('max_concurrent')
+    if max_concurrent is not None:
+        max_concurrent = int(max_concurrent)
+
+    sweep = {}
+    for section in ens.sections:
+        sweep[section] = {}
+        for key, vals in ens[section].items():
+            if not isinstance(vals, list):
+                vals = [vals]
+            sweep[section][key] = vals
+
+    return {'mode': mode, 'shared': shared, 'max_concurrent': max_concurrent,
+            'sweep': sweep}
+
+
+def expand_sweep(config, sweepinfo):
+    """Expand a base configuration into ensemble members.
+
+    :param config: Base configuration (dictionary of sections, e.g. a ConfigObj)
+    :param sweepinfo: Sweep structure returned by read_sweep()
+    :return: (shared, members).  shared is a dictionary of the configuration
+             sections that are shared by all members (always including
+             Global).  members is a list with one entry per member; each entry
+             is a dictionary of that member's configuration sections.
+
+    """
+    if 'Global' not in config:
+        raise RuntimeError("Config file must have a '[Global]' section")
+
+    sweep = sweepinfo['sweep']
+    shared_names = ['Global'] + [s for s in sweepinfo['shared'] if s != 'Global']
+    for section in shared_names:
+        if section not in config:
+            raise RuntimeError(f'Shared section {section} is not in the base configuration.')
+    for section in sweep:
+        if section not in config:
+            raise RuntimeError(f'Swept section {section} is not in the base configuration.')
+        if section in shared_names:
+            raise RuntimeError(f'Section {section} is shared, so it cannot be swept.')
+
+    # Flatten the sweep into a list of (section, key) and a list of value lists
+    keys = [(section, key) for section in sweep for key in sweep[section]]
+    vals = [sweep[section][key] for (section, key) in keys]
+
+    if sweepinfo['mode'] == 'zip':
+        if len(set(len(v) for v in vals)) > 1:
+            raise RuntimeError('All swept parameters must have the same number of values in zip mode.')
+        combos = list(zip(*vals))
+    else:
+        combos = list(itertools.product(*vals))
+
+    shared = {section: config[section] for section in shared_names}
+
+    members = []
+    for i, combo in enumerate(combos):
+        member = {}
+        for section in config.keys():
+            if section in shared:
+                continue
+            member[section] = _member_params(config[section], i)
+        for (section, key), val in zip(keys, combo):
+            member[section][key] = _member_value(val, i)
+        members.append(member)
+
+    logging.info(f'Ensemble: {len(members)} members, shared sections: {shared_names}')
+    return (shared, members)
+
+
+def _member_value(val, i):
+    """Substitute the member number into a parameter value (private)."""
+    if isinstance(val, str):
+        return val.replace('{member}', str(i))
+    if isinstance(val, list):
+        return [_member_value(v, i) for v in val]
+    return val
+
+
+def _member_params(conf, i):
+    """Make a member's copy of a configuration section (private)."""
+    return {key: _member_value(val, i) for key, val in conf.items()}
+
+
+def create_members(shared, members, cap_tbl, max_concurrent=None):
+    """Create the components for an ensemble.
+
+    :param shared: Dictionary of shared sections from expand_sweep()
+    :param members: List of member sections from expand_sweep()
+    :param cap_tbl: Capability table for the shared components.  Each member
+                    gets a copy of this table, to which its own capabilities are
+                    added.
+    :param max_concurrent: Maximum number of members to run at once (None for
+                    no limit).
+    :return: List of components, shared components first.
+
+    """
+    component_list = []
+    for section, conf in shared.items():
+        component = create_component(section, cap_tbl)
+        component.params.update(conf)
+        component.finalize_parsing()
+        component_list.append(component)
+
+    slots = None
+    if max_concurrent is not None:
+        slots = threading.BoundedSemaphore(max_concurrent)
+
+    for i, member in enumerate(members):
+        member_tbl = dict(cap_tbl)
+        member_comps = []
+        for section, conf in member.items():
+            component = create_component(section, member_tbl)
+            component.label = f'{section}[{i}]'
+            component.params.update(conf)
+            component.finalize_parsing()
+            member_comps.append(component)
+
+        if slots is not None:
+            MemberSlot(slots, member_comps)
+        component_list += member_comps
+
+    return component_list
+
+
+class MemberSlot(object):
+    """Limit the number of ensemble members running at once.
+
+    All of the components of a member share a single slot.  The first of them
+    to start running acquires the slot from a semaphore shared by all members,
+    and the last of them to finish releases it.  The other components of the
+    member don't wait for a slot, so components within a member can't deadlock
+    waiting on each other.
+
+    This works by wrapping each component's run_component() method to acquire
+    the slot and adding a finish hook to give it back, so it must be set up
+    before the components are started.  The finish hook is called however the
+    component finishes, so components that are restored from a checkpoint
+    (and so never call run_component()) still count as finished.
+
+    """
+
+    def __init__(self, slots, components):
+        self.slots = slots
+        self.lock = threading.Lock()
+        self.remaining = len(components)
+        self.held = False
+        for component in components:
+            component.run_component = self.wrap(component.run_component)
+            component.finish_hooks.append(self.exit)
+
+    def wrap(self, run_component):
+        def gated_run_component():
+            self.enter()
+            return run_component()
+        return gated_run_component
+
+    def enter(self):
+        with self.lock:
+            if self.held:
+                return
+            # Acquire the slot while holding our lock so that the other
+            # components of this member wait for it rather than also trying to
+            # acquire one.
+            self.slots.acquire()
+            self.held = True
+
+    def exit(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining == 0 and self.held:
+                self.held = False
+                self.slots.release()
@@ -0,0 +1,181 @@
+"""Live status of a running calculation.
+
+The monitor publishes a snapshot of the state of the calculation while it is
+running, so that stalls and load imbalance can be diagnosed without waiting for
+the run to finish.  The snapshot is a JSON document giving:
+
+  - the rank, host, process id, and elapsed time
+  - the current and peak memory (RSS) of the process
+  - for each component: its status (0 = running or waiting to run, 1 =
+    finished, 2 = failed), and, if it is blocked in fetch(), the capability
+    it is waiting on and for how long
+  - in MP runs, for the RAB: the number of requests from other ranks that it
+    is serving (queue depth), and the number of requests this rank has sent
+    to other ranks and is waiting on
+
+The snapshot can be published in either or both of two ways, configured in the
+[Global] section:
+
+  monitor_file     - File to rewrite with the snapshot every monitor_interval
+                     seconds.  In MP runs, the rank is inserted before the
+                     extension (status.json -> status-3.json).  The file is
+                     replaced atomically, so readers never see a partial file.
+  monitor_port     - Port on which to serve the snapshot over HTTP on
+                     localhost (e.g., curl http://localhost:8642/).  In MP
+                     runs, each rank uses monitor_port + rank.
+  monitor_interval - Seconds between updates of monitor_file (default 10)
+
+With neither monitor_file nor monitor_port, the monitor is off.
+
+Classes:
+
+Monitor - Collect and publish status snapshots.
+
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import logging
+
+DEFAULT_INTERVAL = 10           # seconds
+
+
+class Monitor(object):
+    """Publish snapshots of the calculation's status."""
+
+    def __init__(self, component_list, rank=0, rab=None, filename=None, port=None,
+                 interval=DEFAULT_INTERVAL):
+        """
+        :param component_list: Components to report on (not including the RAB)
+        :param rank: MPI rank of this process (0 in SP runs)
+        :param rab: The RAB, in MP runs
+        :param filename: Status file to rewrite periodically, or None
+        :param port: Port for the HTTP server on localhost, or None
+        :param interval: Seconds between updates of the status file
+        """
+        self.components = component_list
+        self.rank = rank
+        self.rab = rab
+        self.filename = filename
+        self.port = port
+        self.interval = interval
+        self.start_time = time.time()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+
+    @classmethod
+    def from_params(cls, component_list, params, rank=0, rab=None):
+        """Create a monitor configured from the [Global] parameters.
+
+        :return: The monitor, or None if neither monitor_file nor
+                 monitor_port is set.
+        """
+        filename = params.get('monitor_file')
+        port = params.get('monitor_port')
+        if filename is None and port is None:
+            return None
+        if filename is not None and rab is not None:
+            root, ext = os.path.splitext(filename)
+            filename = f'{root}-{rank}{ext}'
+        if port is not None:
+            port = int(port) + (rank if rab is not None else 0)
+        return cls(component_list, rank, rab, filename, port,
+                   float(params.get('monitor_interval', DEFAULT_INTERVAL)))
+
+    def snapshot(self):
+        """Collect the current status.
+
+        :return: Dictionary of status information (see module docstring)
+        """
+        from cassandra import util
+
+        now = time.time()
+        components = []
+        for component in self.components:
+            entry = {'component': component.label, 'status': component.status}
+            waiting = component.waiting
+            if waiting is not None:
+                entry['waiting_on'] = waiting[0]
+                entry['waiting_for'] = now - waiting[1]
+            components.append(entry)
+
+        status = {'rank': self.rank, 'host': socket.gethostname(), 'pid': os.getpid(),
+                  'time': now, 'elapsed': now - self.start_time,
+                  'rss': util.current_rss(), 'peak_rss': util.peak_rss(),
+                  'components': components,
+                  'running': sum(1 for c in components if c['status'] == 0),
+                  'blocked': sum(1 for c in components if 'waiting_on' in c)}
+        if self.rab is not None:
+            status['rab'] = {'queue_depth': len(self.rab.requests_outstanding),
+                             'fetches_pending': self.rab.fetches_pending}
+        return status
+
+    def write(self):
+        """Write the current status to the status file."""
+        dirname = os.path.dirname(self.filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmpname = f'{self.filename}.tmp'
+        with open(tmpname, 'w') as outfile:
+            json.dump(self.snapshot(), outfile, indent=1)
+        os.replace(tmpname, self.filename)
+
+    def start(self):
+        """Start publishing status."""
+        if self.port is not None:
+            self.start_server()
+        if self.filename is not None:
+            self.thread = threading.Thread(target=self.run, name='monitor', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop publishing status, writing the final status to the status file."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def run(self):
+        """Rewrite the status file periodically (thread target)."""
+        while True:
+            try:
+                self.write()
+            except Exception as err:
+                logging.warning(f'monitor: failed to write {self.filename}: {err!r}')
+            if self.stop_event.wait(self.interval):
+                break
+        try:
+            self.write()
+        except Exception as err:
+            logging.warning(f'monitor: failed to write {self.filename}: {err!r}')
+
+    def start_server(self):
+        """Serve the status over HTTP on localhost."""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        monitor = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(monitor.snapshot(), indent=1).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f'monitor: {self.address_string()} {format % args}')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), StatusHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='monitor-http',
+                         daemon=True).start()
+        logging.info(f'monitor: serving status on http://127.0.0.1:{self.server.server_port}/')
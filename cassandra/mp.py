@@ -32,28 +32,20 @@ from cassandra import __version__
 from cassandra.rab import RAB
 from cassandra.constants import TAG_CONFIG, SUPERVISOR_RANK
 from cassandra.compfactory import create_component
+from cassandra import tracing
 import logging
 import os
 
 
-def bootstrap_mp(args):
-    """Bootstrap the multiprocessing system.
+def configure_logging_mp(args, rank):
+    """Configure logging for a multiprocessing calculation.
 
     :param args: Dictionary of arguments parsed from the command line.
+    :param rank: MPI rank of this process.
 
-    1. Parse configuration files
-    2. Distribute configuration information to peers
-    3. Create RABs
-    4. Create components
-    5. Add remote capabilities to capability table
-    6. Return component list (including the RAB first in the list).  The main loop 
-       will be able to start these components in the usual way.
-
+    Each rank logs to its own file in the log directory.
     """
 
-    world = MPI.COMM_WORLD
-    rank = world.Get_rank()
-
     if args['logdir'] is None:
         logdir = 'logs'
     else:
@@ -68,22 +60,71 @@ def bootstrap_mp(args):
         # Print the location of the logs so that it will appear in the
         # output file of batch jobs.
         print(f'\nThis is Cassandra version {__version__}.  Log output will be written to {logdir}.')
-        my_assignment = distribute_assignments_supervisor(args)
-    else:
-        my_assignment = distribute_assignments_worker(args)
+
+
+def shm_threshold(global_params):
+    """Get the RAB's shared memory threshold from the Global parameters.
+
+    :param global_params: Parameters from the [Global] section.  The
+                          shm_threshold parameter gives the minimum size in
+                          bytes for arrays to be sent to ranks on the same node
+                          through shared memory, or False to always use message
+                          passing.  (OPTIONAL - default is 1 MiB)
+    :return: Threshold in bytes, or None if shared memory is disabled.
+
+    """
+    from cassandra.rab import DEFAULT_SHM_THRESHOLD
+    from cassandra.util import parseTFstring
+
+    val = global_params.get('shm_threshold')
+    if val is None:
+        return DEFAULT_SHM_THRESHOLD
+    if not parseTFstring(val):
+        return None
+    return int(float(val))
+
+
+def bootstrap_mp(args):
+    """Bootstrap the multiprocessing system.
+
+    :param args: Dictionary of arguments parsed from the command line.
+
+    1. Parse configuration files
+    2. Distribute configuration information to peers
+    3. Create RABs
+    4. Create components
+    5. Add remote capabilities to capability table
+    6. Return component list (including the RAB first in the list).  The main loop 
+       will be able to start these components in the usual way.
+
+    """
+
+    world = MPI.COMM_WORLD
+    rank = world.Get_rank()
+    tracing.set_process(rank)
+
+    configure_logging_mp(args, rank)
+
+    with tracing.span('distribute assignments', 'bootstrap'):
+        if rank == SUPERVISOR_RANK:
+            my_assignment = distribute_assignments_supervisor(args)
+        else:
+            my_assignment = distribute_assignments_worker(args)
 
     # my_assignment will be a dictionary of configuration sections assigned to
     # this process.  We need to create and initialize the components assigned to
     # us.  We also need to create a RAB.
     cap_tbl = {}
-    rab = RAB(cap_tbl, world)
+    with tracing.span('create RAB', 'bootstrap'):
+        rab = RAB(cap_tbl, world, shm_threshold(my_assignment['Global']))
     comps = [rab]
     logging.debug(f'rank: {rank} assignments: {my_assignment}\n')
-    for section, conf in my_assignment.items():
-        component = create_component(section, cap_tbl)
-        component.params.update(conf)
-        component.finalize_parsing()
-        comps.append(component)
+    with tracing.span('create components', 'bootstrap'):
+        for section, conf in my_assignment.items():
+            component = create_component(section, cap_tbl)
+            component.params.update(conf)
+            component.finalize_parsing()
+            comps.append(component)
 
     # Next we need to compile a table of remote capabilities.  To do this, each
     # component needs to distribute its local capability table to all the other
@@ -94,7 +135,8 @@ def bootstrap_mp(args):
     capabilities = list(cap_tbl.keys())
     capabilities.remove('general')
     logging.debug(f'rank {rank} capabilities:  {list(cap_tbl.keys())}')
-    allcaptbls = world.allgather(capabilities)
+    with tracing.span('exchange capabilities', 'bootstrap'):
+        allcaptbls = world.allgather(capabilities)
 
     for i, remote_cap in enumerate(allcaptbls):
         if i == rank:
@@ -107,6 +149,85 @@ def bootstrap_mp(args):
     return (comps, cap_tbl)
 
 
+def bootstrap_ensemble_mp(args):
+    """Bootstrap an ensemble calculation in multiprocessing mode.
+
+    :param args: Dictionary of arguments parsed from the command line.
+
+    Ensemble members are assigned whole to ranks, round-robin, so all of the
+    components of a member run in the same process and communicate without
+    going through the RAB.  Each rank creates its own copy of the shared
+    components (see ensemble.py), so shared data is loaded once per rank
+    rather than once per member.  The return value is the same as for
+    bootstrap_mp().
+
+    """
+    from cassandra.ensemble import create_members
+
+    world = MPI.COMM_WORLD
+    rank = world.Get_rank()
+    tracing.set_process(rank)
+
+    configure_logging_mp(args, rank)
+
+    with tracing.span('distribute assignments', 'bootstrap'):
+        if rank == SUPERVISOR_RANK:
+            my_assignment = distribute_ensemble_supervisor(args)
+        else:
+            my_assignment = distribute_assignments_worker(args)
+
+    shared, members, max_concurrent = my_assignment
+    logging.debug(f'rank: {rank} ensemble members: {[i for (i, m) in members]}\n')
+
+    # Since members don't span ranks, there are no remote capabilities to add
+    # to the RAB, but we still need it for the finalization procedure.
+    cap_tbl = {}
+    with tracing.span('create RAB', 'bootstrap'):
+        rab = RAB(cap_tbl, world, shm_threshold(shared['Global']))
+    with tracing.span('create components', 'bootstrap'):
+        comps = [rab] + create_members(shared, [m for (i, m) in members], cap_tbl,
+                                       max_concurrent)
+
+    return (comps, cap_tbl)
+
+
+def distribute_ensemble_supervisor(args):
+    """Parse config and sweep files and distribute ensemble members.
+
+    :param args: Dictionary of arguments parsed by argparse.
+    :return: Assignment for this process (i.e., the supervisor).  Each
+             assignment is a tuple of (shared sections, list of (member
+             number, member sections), max_concurrent).
+
+    This function should be called only by the supervisor process.  Members are
+    dealt out round-robin, starting with the rank after the supervisor.  The
+    max_concurrent limit from the sweep file applies separately on each rank.
+    """
+
+    from configobj import ConfigObj
+    from cassandra.ensemble import read_sweep, expand_sweep
+
+    config = ConfigObj(args['ctlfile'])
+    sweepinfo = read_sweep(args['ensemble'])
+    shared, members = expand_sweep(config, sweepinfo)
+
+    world = MPI.COMM_WORLD
+    nproc = world.Get_size()
+    nextrank = (SUPERVISOR_RANK+1) % nproc
+
+    assignments = [[] for r in range(nproc)]
+    for i, member in enumerate(members):
+        assignments[nextrank].append((i, member))
+        nextrank = (nextrank+1) % nproc
+
+    for r in range(nproc):
+        if r != SUPERVISOR_RANK:
+            world.send((shared, assignments[r], sweepinfo['max_concurrent']),
+                       dest=r, tag=TAG_CONFIG)
+
+    return (shared, assignments[SUPERVISOR_RANK], sweepinfo['max_concurrent'])
+
+
 def distribute_assignments_worker(args):
     """Prepare to receive component assignments
 
@@ -207,7 +328,8 @@ def finalize(rab, thread):
 
     logging.debug(f'{rab.comm.Get_rank()} entering finalize.')
 
-    rab.comm.barrier()
+    with tracing.span('finalize barrier', 'bootstrap'):
+        rab.comm.barrier()
 
     rab.shutdown()
     thread.join()
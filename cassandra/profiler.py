@@ -0,0 +1,152 @@
+"""Sampling profiler for running components.
+
+The profiler is a thread that periodically takes a snapshot of the stack of
+every component's thread (using sys._current_frames) and counts how often each
+stack is seen.  At the end of the run, the counts for each component are
+written in the "collapsed stack" format, one file per component, which can be
+turned into a flame graph with flamegraph.pl or loaded directly into
+speedscope (https://www.speedscope.app).  A component whose thread is blocked
+in fetch() shows up with fetch() at the top of its stacks, so the files show
+waiting as well as computing.
+
+Only python code running in the components' own threads is seen.  Time spent
+in subprocesses (e.g., GCAM) shows up as the python code waiting on them.
+
+The profiler is turned on with the profile parameter in the [Global] section, or
+with the --profile option to cassandra_main.py.  The parameters are:
+
+  profile          - True to turn on the profiler (default False)
+  profile_interval - Time between samples, in milliseconds (default 10)
+  profile_overhead - Maximum fraction of the time that the profiler should
+                     spend taking samples (default 0.01).  If taking a sample
+                     takes longer than that allows, the interval is lengthened.
+  profile_depth    - Maximum number of frames recorded per stack (default 64).
+                     Deeper stacks are truncated, keeping the innermost frames.
+  profile_dir      - Directory for the output files (default: the log
+                     directory, or the current directory if there is none)
+
+Classes:
+
+SamplingProfiler - The profiler.
+
+"""
+
+import os
+import re
+import sys
+import time
+import threading
+import logging
+from collections import Counter
+
+DEFAULT_INTERVAL = 10           # ms
+DEFAULT_OVERHEAD = 0.01
+DEFAULT_DEPTH = 64
+
+
+class SamplingProfiler(object):
+    """Sample the stacks of component threads.
+
+    Usage:
+        profiler = SamplingProfiler(component_list)
+        profiler.start()
+        ... run the components ...
+        profiler.stop()
+        profiler.write(outdir)
+
+    """
+
+    def __init__(self, component_list, interval=DEFAULT_INTERVAL, overhead=DEFAULT_OVERHEAD,
+                 depth=DEFAULT_DEPTH):
+        """
+        :param component_list: Components to profile.  Each component's
+                               thread is identified by its thread_id
+                               attribute, which is set when it starts running.
+        :param interval: Time between samples, in milliseconds
+        :param overhead: Maximum fraction of time to spend sampling
+        :param depth: Maximum number of frames to record per stack
+        """
+        self.components = [c for c in component_list if hasattr(c, 'thread_id')]
+        self.interval = interval / 1000.0
+        self.overhead = overhead
+        self.depth = depth
+        self.stacks = {}        # component label -> Counter of collapsed stacks
+        self.nsample = 0
+        self.sample_time = 0.0  # total time spent taking samples
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_params(cls, component_list, params):
+        """Create a profiler configured from the [Global] parameters (see module docstring)."""
+        return cls(component_list,
+                   interval=float(params.get('profile_interval', DEFAULT_INTERVAL)),
+                   overhead=float(params.get('profile_overhead', DEFAULT_OVERHEAD)),
+                   depth=int(params.get('profile_depth', DEFAULT_DEPTH)))
+
+    def start(self):
+        """Start sampling in a separate (daemon) thread."""
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampling thread to exit."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        """Sampling loop (thread target)."""
+        delay = self.interval
+        while not self.stop_event.wait(delay):
+            t0 = time.perf_counter()
+            self.sample()
+            cost = time.perf_counter() - t0
+            self.sample_time += cost
+            # Keep the sampling cost below the overhead limit
+            delay = max(self.interval, cost / self.overhead - cost)
+
+    def sample(self):
+        """Record the current stack of each running component."""
+        frames = sys._current_frames()
+        for component in self.components:
+            frame = frames.get(component.thread_id)
+            if frame is None or component.status != 0:
+                continue
+            stack = self.collapse(frame)
+            self.stacks.setdefault(component.label, Counter())[stack] += 1
+        self.nsample += 1
+
+    def collapse(self, frame):
+        """Convert a frame to a collapsed stack string (outermost frame first)."""
+        names = []
+        while frame is not None and len(names) < self.depth:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+                         .replace(';', ':'))
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def write(self, outdir, prefix='profile'):
+        """Write a collapsed stack file for each component.
+
+        :param outdir: Directory for the files (created if necessary)
+        :param prefix: Prefix for the file names.  The files are named
+                       <prefix>-<component-label>.folded
+        :return: List of the files written
+
+        """
+        os.makedirs(outdir, exist_ok=True)
+        filenames = []
+        for label, stacks in self.stacks.items():
+            safelabel = re.sub(r'[^\w.-]', '_', label)
+            filename = os.path.join(outdir, f'{prefix}-{safelabel}.folded')
+            with open(filename, 'w') as outfile:
+                for stack, count in stacks.most_common():
+                    outfile.write(f'{stack} {count}\n')
+            filenames.append(filename)
+
+        logging.info(f'profiler: {self.nsample} samples, {self.sample_time:.3f} s sampling; '
+                     f'wrote {len(filenames)} profiles to {outdir}')
+        return filenames
@@ -8,12 +8,23 @@ components.
 The name RAB was originally an acronym for "Remote Access Broker", but mostly
 it's just a name.  Also, "RAB" are my mom's initials.  Hi, Mom!
 
+When several ranks run on the same node, large numpy arrays requested by a
+co-located rank are published in shared memory (see shmem.py) instead of being
+pickled and sent through MPI.  Only the small handle for the shared memory goes
+through MPI, and the requestor maps the array directly and then tells the
+provider (with a TAG_SHM_DONE message) so that the provider can unlink the
+shared memory as soon as all the requestors it was sent to have mapped it.
+Requests from ranks on other nodes are handled as usual.
+
 This module should _only_ be imported by the my.py module.  It imports mpi4py,
 which will have the side effect of trying to initialize MPI if mp.py hasn't
 already done it.
 """
 
-from cassandra.constants import TAG_REQ, TAG_REQID_BASE
+from cassandra.constants import TAG_REQ, TAG_REQID_BASE, TAG_SHM_DONE
+from cassandra import shmem
+from cassandra import tracing
+from cassandra.store import result_nbytes
 from mpi4py import MPI
 import concurrent.futures as ft
 import threading
@@ -25,16 +36,38 @@ import logging
 # if those models are implemented in python and running in the same process).
 RAB_LOOP_SLEEP = 0.05          # 50 ms
 
+# Arrays smaller than this are sent by message passing even to ranks on the same
+# node, since setting up the shared memory would cost more than it saves.
+DEFAULT_SHM_THRESHOLD = 1024 * 1024     # 1 MiB
+
 
 class RAB(object):
-    def __init__(self, cap_tbl, comm=MPI.COMM_WORLD):
+    def __init__(self, cap_tbl, comm=MPI.COMM_WORLD, shm_threshold=DEFAULT_SHM_THRESHOLD):
+        """Create the RAB.
+
+        :param cap_tbl: Capability table for this process
+        :param comm: MPI communicator
+        :param shm_threshold: Minimum size in bytes for an array to be sent to
+                              ranks on the same node through shared memory.
+                              None disables shared memory.
+
+        This is a collective operation on comm (it determines which ranks share
+        our node), so all ranks must create their RABs together.
+
+        """
         self.cap_tbl = cap_tbl
         self.comm = comm
         self.rank = comm.Get_rank()
+        self.shm_threshold = shm_threshold
+        nodecomm = comm.Split_type(MPI.COMM_TYPE_SHARED)
+        self.node_ranks = set(nodecomm.allgather(self.rank))  # ranks on our node (comm numbering)
+        nodecomm.Free()
+        self.publisher = shmem.SharedArrayPublisher()
         self.status = 0         # status indicator follows ComponentBase convention
         self.terminate = False  # sentinel indicating when it's time for the RAB to exit
         self.remote_caps = {}   # Table of remote capabilities
         self.requests_outstanding = {}  # Table of requests in process
+        self.fetches_pending = 0  # Requests we have sent to other ranks and not yet received
 
         # members for managing message tags
         self.taglock = threading.Condition()  # Lock for working with the list of tags
@@ -80,7 +113,7 @@ class RAB(object):
             self.tags.add(tag)
             return tag
 
-    def fetch(self, capability):
+    def fetch(self, capability, selector=None):
         """Fetch a capability from a remote process.
 
         This method uses blocking sends and receives, so it will automatically
@@ -106,22 +139,65 @@ class RAB(object):
         # existence.
         provider = self.cap_tbl[capability]
         if self is not provider:
-            return provider.fetch(capability)
+            return provider.fetch(capability, selector)
 
         provider_rank = self.remote_caps[capability]
         reqtag = self.unique_tag()  # get a unique tag for the response
 
-        # send both the capability and the tag we will be expecting for the
-        # response to the remote RAB
-        data = (capability, reqtag)
+        # send the capability, the tag we will be expecting for the response,
+        # and the selector (which the remote RAB's provider will apply) to the
+        # remote RAB
+        data = (capability, reqtag, selector)
         logging.debug(f'requesting {capability} from {provider_rank} on tag {reqtag}')
-        self.comm.send(data, dest=provider_rank, tag=TAG_REQ)
-        # wait for the response
+        with self.taglock:
+            self.fetches_pending += 1
+        with tracing.span('rab request', 'rab', capability=capability, rank=provider_rank):
+            self.comm.send(data, dest=provider_rank, tag=TAG_REQ)
+        # wait for the response.  This covers the time the provider spends
+        # getting the result, as well as the transfer.
         logging.debug(f'waiting on {provider_rank} with tag {reqtag}')
-        rslt = self.comm.recv(source=provider_rank, tag=reqtag)
+        with tracing.span('rab receive', 'rab', capability=capability,
+                          rank=provider_rank) as info:
+            rslt = self.comm.recv(source=provider_rank, tag=reqtag)
+            with self.taglock:
+                self.fetches_pending -= 1
+            if isinstance(rslt, shmem.SharedArrayHandle):
+                handle = rslt
+                rslt = shmem.attach(handle)
+                self.comm.send(handle.name, dest=provider_rank, tag=TAG_SHM_DONE)
+                info['shared_memory'] = True
+            if tracing.enabled():
+                info['bytes'] = result_nbytes(rslt)
         logging.debug(f'got {reqtag} from {provider_rank}')
         return rslt
 
+    def serve(self, capability, source, selector=None, received=None):
+        """Fetch a capability for a remote requestor (run in a listener thread).
+
+        If the requestor is on our node and the result is a large array,
+        publish it in shared memory and return the handle instead.  Each
+        capability, or selection from a capability, is published once and
+        shared by all of the requestors on our node.
+
+        received is the time the request arrived (from tracing.now()); it is
+        used to record how long the request waited for a thread.
+
+        """
+        if received is not None:
+            tracing.complete('rab queue', 'rab', received, {'capability': capability, 'rank': source})
+
+        with tracing.span('rab serve', 'rab', capability=capability, rank=source):
+            rslt = self.fetch(capability, selector)
+            if self.shm_threshold is not None and source in self.node_ranks and \
+               shmem.shareable(rslt, self.shm_threshold):
+                if selector is None:
+                    key = capability
+                else:
+                    import pickle
+                    key = (capability, pickle.dumps(selector))
+                return self.publisher.publish(key, rslt, allow_file=selector is None)
+        return rslt
+
     def listen_wrap(self):
         """Thread wrapper for the listen() method.
 
@@ -130,6 +206,7 @@ class RAB(object):
 
         """
 
+        tracing.name_thread('RAB')
         try:
             return self.listen()
         except:
@@ -177,10 +254,16 @@ class RAB(object):
                 if self.terminate:
                     logging.debug('listen loop got request to terminate')
                     assert(len(self.requests_outstanding) == 0)
+                    self.process_shm_done()
                     break
 
                 sleep(RAB_LOOP_SLEEP)
 
+        # By now every rank has passed the finalization barrier, so all of the
+        # shared memory we published has been mapped by its consumers, even if
+        # we haven't received all of their TAG_SHM_DONE messages.
+        self.publisher.close()
+
         logging.debug(f'{self.comm.Get_rank()}: listen exiting')
         return 0
 
@@ -188,21 +271,32 @@ class RAB(object):
         """Dispatch incoming requests from other nodes, if any.
         """
 
+        self.process_shm_done()
+
         stat = MPI.Status()
         while self.comm.iprobe(tag=TAG_REQ, status=stat):
             source = stat.Get_source()
-            capability, rtag = self.comm.recv(source=source)
+            capability, rtag, selector = self.comm.recv(source=source)
             logging.debug(f'{self.rank}: processing {capability} from {source} on tag {rtag}')
 
             # Create a thread to fetch the capability.  This thread might block.
-            future = self.executor.submit(self.fetch, capability)
+            received = tracing.now() if tracing.enabled() else None
+            future = self.executor.submit(self.serve, capability, source, selector, received)
 
             # Add the source and the remote tag to the table, indexed by thread.
             # We don't need the capability anymore, so we don't store it.
             self.requests_outstanding[future] = (source, rtag)
+            tracing.counter('rab requests', {'outstanding': len(self.requests_outstanding)})
 
     # End of process_incoming()
 
+    def process_shm_done(self):
+        """Unlink shared memory that our requestors report having mapped."""
+        stat = MPI.Status()
+        while self.comm.iprobe(tag=TAG_SHM_DONE, status=stat):
+            name = self.comm.recv(source=stat.Get_source(), tag=TAG_SHM_DONE)
+            self.publisher.done(name)
+
     def process_outstanding(self):
         """Process any threads that have finished servicing their requests.
 
@@ -224,7 +318,13 @@ class RAB(object):
             logging.debug(f'sending result to {source} on tag {rtag}')
             # theoretically this could block, but the fetch method on the remote
             # node will have posted a receive as soon as the request was sent.
-            self.comm.send(rslt, dest=source, tag=rtag)
+            # The send time includes pickling the result.
+            with tracing.span('rab send', 'rab', rank=source, tag=rtag) as info:
+                if tracing.enabled():
+                    info['bytes'] = result_nbytes(rslt)
+                    info['shared_memory'] = isinstance(rslt, shmem.SharedArrayHandle)
+                self.comm.send(rslt, dest=source, tag=rtag)
             logging.debug(f'sent {rtag} to {source}')
+            tracing.counter('rab requests', {'outstanding': len(self.requests_outstanding)})
 
     # End of process_outstanding
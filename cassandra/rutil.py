@@ -0,0 +1,646 @@
+"""Utilities for components that run R code through rpy2.
+
+rpy2 embeds a single R interpreter in the python process.  That interpreter is
+not thread safe, and it is global, so two components calling into R from their
+own threads will interfere with each other.  This module provides:
+
+RSession       - A process-wide session that runs all R calls on one
+                 dedicated thread, fed by a queue.  It also caches loaded
+                 packages and emulators so that they are loaded only once per
+                 process.
+
+RWorkerPool    - A pool of worker processes, each with its own embedded R.
+                 Tasks submitted to the pool run truly in parallel.  Workers
+                 keep the same caches as the RSession, so each worker loads a
+                 given package or emulator only once.
+
+fldgen_task    - Run a complete fldgen calculation (field generation,
+                 coordinate extraction, and optional monthly downscaling) and
+                 return the results as numpy arrays.  This is the unit of work
+                 that the FldgenComponent hands to the session or the pool.
+
+split_task     - Split an fldgen task into chunks of realizations, each with
+                 its own reproducible RNG seed.
+
+merge_results  - Merge the results of chunked fldgen tasks.
+
+read_emulator_metadata - Read an emulator's coordinates and dimensions from its
+                 sidecar metadata cache, without starting R.
+
+emulator_metadata_task - Load an emulator in R and write its sidecar metadata
+                 cache.
+
+load_fractions - Load a monthly fraction dataset for the numpy downscaling in
+                 cassandra.downscale (cached).
+
+r_matrices_to_array - Convert a list of R matrices to a single stacked,
+                 transposed numpy array, reading the R data in place.
+
+Nothing in this module imports rpy2 until an R call is actually made, so it can
+be imported on systems without R.
+
+"""
+
+import os
+import threading
+import logging
+import concurrent.futures as ft
+from cassandra import downscale
+from cassandra import util
+
+
+class RSession(object):
+    """Serialize calls into the embedded R interpreter.
+
+    Use RSession.get() to get the process-wide session, then call(fn, ...) to
+    run fn on the session's R thread.  call() blocks until fn has run and
+    returns its result (or raises its exception).  Anything that touches R
+    objects, including converting them to numpy, must happen inside fn.
+
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """Get the process-wide R session, creating it if necessary."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self):
+        # A single worker thread gives us a dedicated R thread and a queue.
+        self.executor = ft.ThreadPoolExecutor(max_workers=1, thread_name_prefix='rsession')
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the R thread and return the result."""
+        return self.executor.submit(fn, *args, **kwargs).result()
+
+
+class RWorkerPool(object):
+    """Pool of worker processes, each running its own R interpreter.
+
+    Use RWorkerPool.get(n) to get the process-wide pool with n workers.  Pools
+    are shared, so several components asking for the same number of workers
+    will share (and compete for) the same processes.
+
+    Worker processes are started with the 'spawn' method.  Forking a process
+    that has an embedded R and several running threads is not safe.
+
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, nworkers):
+        """Get the process-wide pool with the requested number of workers."""
+        with cls._pools_lock:
+            if nworkers not in cls._pools:
+                cls._pools[nworkers] = cls(nworkers)
+            return cls._pools[nworkers]
+
+    def __init__(self, nworkers):
+        import multiprocessing
+        self.nworkers = nworkers
+        self.executor = ft.ProcessPoolExecutor(max_workers=nworkers,
+                                               mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit fn(*args, **kwargs) to the pool.
+
+        fn must be a module-level function, and its arguments and return
+        value must be picklable.  Returns a concurrent.futures.Future.
+
+        """
+        return self.executor.submit(fn, *args, **kwargs)
+
+
+# Caches for packages and emulators.  These are per-process; in the main
+# process they are used only from the RSession thread, and in worker processes
+# only from the worker's main thread, so they need no locking.
+_pkg_cache = {}
+_emu_cache = {}
+_frac_cache = {}
+
+
+def load_packages(loadpkgs=False, pkgdir=None):
+    """Prepare the embedded R to use the fldgen and an2month packages (cached).
+
+    :param loadpkgs: If True, load the packages from source with
+                     devtools::load_all; otherwise they must be installed in
+                     the R library.
+    :param pkgdir: Directory containing the fldgen and an2month package
+                   repositories (ignored if loadpkgs is False).
+
+    Once this has been called, use package() to get handles for the packages.
+
+    """
+    key = (loadpkgs, pkgdir)
+    if key in _pkg_cache:
+        return
+
+    from rpy2.robjects.packages import importr
+
+    if loadpkgs:
+        devtools = importr("devtools")
+        devtools.load_all(os.path.join(pkgdir, "an2month"))
+        devtools.load_all(os.path.join(pkgdir, "fldgen"))
+
+    _pkg_cache[key] = True
+
+
+def package(name):
+    """Get the rpy2 handle for an R package (cached)."""
+    if name not in _pkg_cache:
+        from rpy2.robjects.packages import importr
+        _pkg_cache[name] = importr(name)
+    return _pkg_cache[name]
+
+
+def load_emulator(fldgen, filename):
+    """Load an fldgen emulator from an RDS file (cached).
+
+    The cache is indexed by the absolute file name and modification time, so
+    replacing the file causes it to be reloaded.
+
+    :param fldgen: fldgen package handle from package()
+    :param filename: Name of the RDS file containing the emulator.
+    :return: The emulator structure.
+
+    """
+    filename = os.path.abspath(os.path.expanduser(filename))
+    key = (filename, os.stat(filename).st_mtime_ns)
+    if key not in _emu_cache:
+        logging.info(f'loading emulator {filename}')
+        _emu_cache[key] = fldgen.loadmodel(filename)
+    return _emu_cache[key]
+
+
+# Emulator metadata sidecars.  The first time an emulator is loaded, its
+# coordinates and dimensions are written to a directory next to the RDS file
+# (emulator.rds -> emulator.rds.meta/), along with a fingerprint of the RDS.
+# As long as the fingerprint matches, the metadata can be read back without
+# starting R.  In-process reads are cached by file name and modification time.
+_META_VERSION = 1
+_meta_cache = {}
+_meta_lock = threading.Lock()
+
+
+def _meta_dir(filename):
+    """Name of the metadata sidecar directory for an emulator (private)."""
+    return filename + '.meta'
+
+
+def read_emulator_metadata(filename):
+    """Read an emulator's metadata from its sidecar cache.
+
+    :param filename: Name of the emulator RDS file
+    :return: Dictionary with entries
+                nyear - number of years in the emulator's training data (None
+                        if the emulator doesn't record it)
+                 grid - {var: {'ncell': n, 'nlat': n, 'nlon': n}} (nlat and
+                        nlon are None for irregular grids)
+               coords - {var: coordinate matrix}, as from extract_coords()
+          fingerprint - fingerprint of the RDS file
+             or None if there is no valid sidecar for the current contents of
+             the file.
+
+    This function doesn't use R, so it can be called from any thread.
+
+    """
+    import numpy as np
+
+    filename = os.path.abspath(os.path.expanduser(filename))
+    key = (filename, os.stat(filename).st_mtime_ns)
+    with _meta_lock:
+        if key in _meta_cache:
+            return _meta_cache[key]
+
+    metadir = _meta_dir(filename)
+    meta = util.read_manifest(os.path.join(metadir, 'meta.json'))
+    if meta is None or meta.get('version') != _META_VERSION:
+        return None
+    fp = util.fingerprint_files([filename], meta['fingerprint'])
+    if not util.fingerprints_match(meta['fingerprint'], fp):
+        logging.info(f'emulator {filename} has changed; ignoring its metadata cache.')
+        return None
+
+    try:
+        meta['coords'] = {var: np.load(os.path.join(metadir, f'coord-{var}.npy'))
+                          for var in ['tas', 'pr']}
+    except (OSError, ValueError):
+        return None
+    meta['fingerprint'] = fp
+
+    with _meta_lock:
+        _meta_cache[key] = meta
+    return meta
+
+
+def write_emulator_metadata(filename, meta):
+    """Write an emulator's metadata sidecar.
+
+    :param filename: Name of the emulator RDS file
+    :param meta: Metadata dictionary (see read_emulator_metadata()).  The
+                 fingerprint entry is filled in here.
+
+    Failure to write the sidecar (e.g., because the emulator's directory is
+    read-only) is logged but is not an error.
+
+    """
+    filename = os.path.abspath(os.path.expanduser(filename))
+    metadir = _meta_dir(filename)
+    meta['fingerprint'] = util.fingerprint_files([filename])
+    try:
+        util.mkdir_if_noexist(metadir)
+        for var, coord in meta['coords'].items():
+            util.save_array(os.path.join(metadir, f'coord-{var}'), coord)
+        # Write the json last; its presence means the sidecar is complete.
+        util.write_manifest(os.path.join(metadir, 'meta.json'),
+                            {'version': _META_VERSION, 'nyear': meta['nyear'],
+                             'grid': meta['grid'], 'fingerprint': meta['fingerprint']})
+    except OSError as err:
+        logging.warning(f'Unable to write metadata cache for emulator {filename}: {err}')
+
+
+def build_emulator_metadata(fldgen, emu):
+    """Extract an emulator's coordinates and dimensions.
+
+    :param fldgen: fldgen package handle from package()
+    :param emu: Emulator structure from load_emulator()
+    :return: Metadata dictionary (see read_emulator_metadata()), without the
+             fingerprint.
+
+    """
+    coords = extract_coords(fldgen, emu)
+    grid = {}
+    nyear = None
+    for name, griddata in zip(['tas', 'pr'], [emu[0], emu[1]]):
+        gd = dict(griddata.items())
+        grid[name] = {'ncell': int(coords[name].shape[0]),
+                      'nlat': len(gd['lat']) if 'lat' in gd else None,
+                      'nlon': len(gd['lon']) if 'lon' in gd else None}
+        if nyear is None and 'time' in gd:
+            nyear = len(set(gd['time']))
+
+    return {'nyear': nyear, 'grid': grid, 'coords': coords}
+
+
+def emulator_metadata_task(task):
+    """Load an emulator and write its metadata sidecar.
+
+    :param task: Task dictionary (see fldgen_task).  Only the loadpkgs,
+                 pkgdir, and emulator entries are used.
+    :return: Metadata dictionary (see read_emulator_metadata())
+
+    Like fldgen_task, this must be run on the RSession thread or in an
+    RWorkerPool worker.
+
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects.conversion import localconverter
+
+    with localconverter(robjects.default_converter):
+        load_packages(task['loadpkgs'], task['pkgdir'])
+        fldgen = package('fldgen')
+        emu = load_emulator(fldgen, task['emulator'])
+        meta = build_emulator_metadata(fldgen, emu)
+
+    write_emulator_metadata(task['emulator'], meta)
+    return meta
+
+
+def load_fractions(a2mfrac):
+    """Load a monthly fraction dataset (cached).
+
+    :param a2mfrac: Name of a dataset in the an2month package, or the name of
+                    an .npz file with 'tas' and 'pr' arrays (grid cell x month)
+                    and, optionally, a 'coordinates' array of (lat, lon) for
+                    each grid cell.
+    :return: Dictionary with 'tas', 'pr', and 'coordinates' (None if the
+             dataset has no coordinates) numpy arrays.
+
+    """
+    import numpy as np
+
+    if a2mfrac.endswith('.npz'):
+        filename = os.path.abspath(os.path.expanduser(a2mfrac))
+        key = (filename, os.stat(filename).st_mtime_ns)
+    else:
+        key = a2mfrac
+
+    if key not in _frac_cache:
+        logging.info(f'loading monthly fractions {a2mfrac}')
+        if a2mfrac.endswith('.npz'):
+            with np.load(filename) as npz:
+                fracs = {name: npz[name] for name in ['tas', 'pr']}
+                fracs['coordinates'] = npz['coordinates'] if 'coordinates' in npz.files else None
+        else:
+            import rpy2.robjects as robjects
+            package('an2month')
+            dataset = dict(robjects.r(f'an2month::{a2mfrac}').items())
+            fracs = {name: np.array(_transposed_view(dataset[name]).T) for name in ['tas', 'pr']}
+            coords = dataset.get('coordinates')
+            fracs['coordinates'] = None if coords is None else np.array(_transposed_view(coords).T)
+        _frac_cache[key] = fracs
+
+    return _frac_cache[key]
+
+
+def load_monthly_factors(a2mfrac, var, coords):
+    """Get the monthly downscaling factors for a grid (cached).
+
+    :param a2mfrac: Monthly fraction dataset (see load_fractions())
+    :param var: Variable name ('tas' or 'pr')
+    :param coords: Coordinate matrix for the grid, from extract_coords()
+    :return: (grid cell x month) table for cassandra.downscale.downscale()
+
+    """
+    key = (a2mfrac, var, coords.shape, coords.tobytes())
+    if key not in _frac_cache:
+        fracs = load_fractions(a2mfrac)
+        frac = downscale.align_fractions(fracs[var], fracs['coordinates'], coords)
+        _frac_cache[key] = downscale.monthly_factors(frac, var)
+    return _frac_cache[key]
+
+
+def fldgen_task(task):
+    """Run an fldgen calculation.
+
+    :param task: Dictionary of task parameters:
+          loadpkgs, pkgdir - see load_packages()
+                  emulator - RDS file containing the emulator
+                    ngrids - number of fields to generate
+                   RNGseed - seed for the R RNG, or None
+                      tgav - numpy array of global mean temperatures
+                   a2mfrac - monthly fraction dataset for downscaling, or
+                             None if the emulator is already monthly
+                   startyr - first year of the fields
+                 a2mmethod - 'numpy' (default) to downscale with
+                             cassandra.downscale, or 'R' to use an2month's
+                             own downscaling
+                    coords - coordinate matrices from the emulator's metadata
+                             (OPTIONAL; if omitted, they are extracted from
+                             the emulator)
+    :return: Dictionary with entries 'tas', 'pr', and 'coords'.  The first
+             two are float32 arrays of (realization x grid cell x month); coords
+             is a dictionary of coordinate matrices by variable.
+
+    This function must be run either on the RSession thread or in an
+    RWorkerPool worker.
+
+    """
+    import rpy2.robjects as robjects
+    from rpy2.robjects.conversion import localconverter
+
+    # We do all of the conversions to numpy explicitly, so turn off any
+    # automatic conversion that might be active.
+    with localconverter(robjects.default_converter):
+        load_packages(task['loadpkgs'], task['pkgdir'])
+        fldgen = package('fldgen')
+        emu = load_emulator(fldgen, task['emulator'])
+
+        if task.get('RNGseed') is not None:
+            setseed = robjects.r['set.seed']
+            setseed(task['RNGseed'])
+
+        tgav = robjects.FloatVector(task['tgav'])
+        fullgrids_annual = generate_fields(fldgen, emu, task['ngrids'], tgav)
+        coords = task.get('coords')
+        if coords is None:
+            coords = extract_coords(fldgen, emu)
+
+        if task.get('a2mfrac') is None:
+            # Data is already at monthly resolution; however, we do still
+            # need to transpose it so that months are in columns.
+            fullgrids_monthly = {var: r_matrices_to_array(fullgrids_annual[var])
+                                 for var in ['tas', 'pr']}
+        elif task.get('a2mmethod', 'numpy') == 'R':
+            fullgrids_monthly = monthly_downscale(package('an2month'), fullgrids_annual, coords,
+                                                  task['a2mfrac'], task['startyr'])
+        else:
+            fullgrids_monthly = {}
+            for var in ['tas', 'pr']:
+                annual = r_matrices_to_array(fullgrids_annual[var])
+                factors = load_monthly_factors(task['a2mfrac'], var, coords[var])
+                fullgrids_monthly[var] = downscale.downscale(annual, factors, var)
+                del annual
+
+    return {'tas': fullgrids_monthly['tas'], 'pr': fullgrids_monthly['pr'], 'coords': coords}
+
+
+def split_task(task, chunksize):
+    """Split an fldgen task into chunks of realizations.
+
+    :param task: Task dictionary (see fldgen_task)
+    :param chunksize: Maximum number of realizations per chunk
+    :return: List of task dictionaries, one per chunk, in realization order.
+
+    If the task has an RNG seed, each chunk gets its own seed, derived from the
+    task's seed with numpy's SeedSequence.  The chunks therefore draw from
+    independent random streams, and the results are reproducible for a given
+    seed and chunk size, no matter how many workers run the chunks or in
+    what order they finish.  (Changing the chunk size changes the results.)  A
+    task that fits in a single chunk keeps its seed unchanged, so it produces
+    the same results as an unchunked run.
+
+    """
+    import numpy as np
+
+    ngrids = task['ngrids']
+    if chunksize is None or chunksize >= ngrids:
+        return [task]
+
+    sizes = [min(chunksize, ngrids - start) for start in range(0, ngrids, chunksize)]
+
+    if task.get('RNGseed') is not None:
+        children = np.random.SeedSequence(task['RNGseed']).spawn(len(sizes))
+        # R's set.seed takes a (signed) 32-bit integer.
+        seeds = [int(child.generate_state(1)[0] & 0x7fffffff) for child in children]
+    else:
+        seeds = [None] * len(sizes)
+
+    chunks = []
+    for size, seed in zip(sizes, seeds):
+        chunk = dict(task)
+        chunk['ngrids'] = size
+        chunk['RNGseed'] = seed
+        chunks.append(chunk)
+    return chunks
+
+
+def merge_results(results):
+    """Merge the results of chunked fldgen tasks.
+
+    :param results: List of fldgen_task results, in realization order.  The
+                    list is emptied as the results are merged, so that each
+                    chunk's arrays can be freed as soon as they are copied.
+    :return: A single fldgen_task result containing all the realizations.
+
+    """
+    import numpy as np
+
+    if len(results) == 1:
+        return results.pop()
+
+    merged = {'coords': results[0]['coords']}
+    for var in ['tas', 'pr']:
+        shape = results[0][var].shape[1:]
+        n = sum(r[var].shape[0] for r in results)
+        merged[var] = np.empty((n,) + shape, dtype=results[0][var].dtype)
+
+    start = 0
+    while results:
+        rslt = results.pop(0)
+        n = rslt['tas'].shape[0]
+        for var in ['tas', 'pr']:
+            merged[var][start:start+n] = rslt[var]
+        start += n
+
+    return merged
+
+
+def generate_fields(fldgen, emu, ngrids, tgav):
+    """Run the fldgen field generator.
+
+    :param fldgen: Fldgen package handle from rpy2
+    :param emu: Fldgen emulator structure
+    :param ngrids: Number of fields to generate
+    :param tgav: Global mean temperature for each year (R vector)
+    :return: Dictionary with entries 'tas' and 'pr'.  Each entry is an R list
+             of (time x grid cells) matrices.  They are left as R objects so
+             that they can be passed on to the downscaling without a round
+             trip through numpy.
+
+    """
+    import rpy2.robjects as robjects
+
+    # Calculate residuals
+    resids = fldgen.generate_TP_resids(emu, ngrids)
+
+    fullgrids = fldgen.generate_TP_fullgrids(emu, resids, tgav)
+
+    # fullgrids is a list of paired temperature and precipitation grids. in R notation they
+    # are stored in fullgrids$fullgrids[[i]]$tas and fullgrids$fullgrids[[i]]$pr.  We don't care about
+    # anything else in the fullgrids structure above.
+    gridstructs = fullgrids.rx2('fullgrids')
+
+    lapply = robjects.r['lapply']
+    tas = lapply(gridstructs, robjects.r('function(g) g$tas'))
+    pr = lapply(gridstructs, robjects.r('function(g) g$pr'))
+
+    return {'tas': tas, 'pr': pr}
+
+
+def r_matrices_to_array(mats, dtype=None):
+    """Convert a sequence of R matrices to a stacked, transposed numpy array.
+
+    :param mats: Sequence of R numeric matrices, all with the same dimensions
+                 (nrow x ncol).  numpy arrays are also accepted.
+    :param dtype: dtype of the result (default float32)
+    :return: C-contiguous array of shape (len(mats), ncol, nrow).  That is,
+             element i is the transpose of mats[i].
+
+    R stores matrices in column-major order, so the memory of an (nrow x ncol)
+    R matrix is exactly the memory of its (ncol x nrow) transpose in C order.
+    We read it through the buffer protocol, without copying, as that transpose
+    and copy it (with the dtype conversion) straight into its slot in a
+    preallocated output array.  Each matrix is therefore read once and
+    written once, and there are no intermediate float64 or non-contiguous
+    copies.
+
+    """
+    import numpy as np
+
+    if dtype is None:
+        dtype = np.float32
+
+    mats = list(mats)
+    if len(mats) == 0:
+        return np.empty((0, 0, 0), dtype=dtype)
+
+    first = _transposed_view(mats[0])
+    out = np.empty((len(mats),) + first.shape, dtype=dtype)
+    for i, mat in enumerate(mats):
+        src = first if i == 0 else _transposed_view(mat)
+        if src.shape != out.shape[1:]:
+            raise ValueError(f'Matrix {i} has shape {src.shape[::-1]}; expected {out.shape[:0:-1]}')
+        out[i] = src
+
+    return out
+
+
+def _transposed_view(mat):
+    """Get a numpy view of the transpose of an R (or numpy) matrix (private)."""
+    import numpy as np
+
+    if hasattr(mat, 'memoryview'):
+        nrow, ncol = (int(d) for d in mat.do_slot('dim'))
+        return np.asarray(mat.memoryview()).reshape(ncol, nrow)
+    return np.asarray(mat).T
+
+
+def extract_coords(fldgen, emu):
+    """Extract the coordinate structure from the emulator
+
+    :param fldgen: Fldgen package structure from rpy2.
+    :param emu: Fldgen emulator structure.
+    :return: Dictionary with entries 'tas' and 'pr'.  Each is a matrix of coordinates
+             for each grid cell, with cells in rows and latitude, longitude in the two
+             columns.
+
+    """
+
+    import numpy as np
+    griddataT = emu[0]
+    griddataP = emu[1]
+    coords = {}
+    for name, griddata in zip(['tas', 'pr'], [griddataT, griddataP]):
+        gd = dict(griddata.items())
+        try:
+            coord = gd['coord']
+        except KeyError:
+            # If the grid is regular, then fldgen doesn't store a coordinate
+            # array.  Use the coord_array function tocreate one.
+            coord = fldgen.coord_array(gd['lat'], gd['lon'])
+        coords[name] = np.ascontiguousarray(_transposed_view(coord).T, dtype=np.float64)
+
+    return coords
+
+
+def monthly_downscale(an2month, annual_flds, coords, a2mfrac, startyr):
+    """Run the monthly downscaling calculation
+
+    :param an2month: an2month package handle from rpy2
+    :param annual_flds: Structure returned from generate_fields
+    :param coords: Coordinate matrix returned from extract_coords
+    :param a2mfrac: Name of the monthly fraction dataset
+    :param startyr: First year of the fields
+    :return: Dictionary with 'pr' and 'tas' entries. Each entry is a float32
+             array of (realization x grid cell x month).
+    """
+
+    import numpy as np
+    import rpy2.robjects as robjects
+
+    rslt = {}
+    for var in annual_flds:
+        ntime = int(annual_flds[var][0].do_slot('dim')[0])
+        time = robjects.IntVector(np.arange(ntime) + startyr - 1)
+        coord = coords[var]
+        rcoord = robjects.r['matrix'](robjects.FloatVector(coord.ravel(order='F')),
+                                      nrow=coord.shape[0], ncol=coord.shape[1])
+        monthly = an2month.downscaling_component_api(a2mfrac, annual_flds[var],
+                                                     rcoord, time, var)
+
+        if var == 'pr':
+            # If this is precipitation, convert units.
+            monthly = robjects.r['lapply'](monthly, an2month.pr_conversion)
+
+        rslt[var] = r_matrices_to_array(monthly)
+        logging.debug(f'Result for {var}: Shape = {rslt[var].shape}')
+
+    return rslt
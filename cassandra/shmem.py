@@ -0,0 +1,237 @@
+"""Zero-copy transfer of numpy arrays between processes on the same node.
+
+When several MP ranks run on the same node, the RAB doesn't need to pickle large
+arrays and send them through MPI.  Instead, the provider puts the array in POSIX
+shared memory (or, if the array is already a memory-mapped file, e.g. from the
+memmap result store, just uses that file) and sends a small handle describing
+it.  The consumer maps the same memory, so no copies are made on the consumer
+side, and all the consumers on the node share the same pages.
+
+Classes:
+
+SharedArrayHandle - Picklable description of an array in shared memory or in a
+                    memory-mapped file.
+
+SharedArrayPublisher - Provider-side table of published arrays.  Each array is
+                    published once, no matter how many consumers fetch it, and
+                    unlinked once they have all mapped it.
+
+Functions:
+
+shareable - Test whether an array can (and should) be published this way.
+
+attach    - Map a published array in the consumer's process.
+
+"""
+
+import os
+import weakref
+import threading
+import logging
+
+
+class SharedArrayHandle(object):
+    """Description of an array published for same-node consumers.
+
+    Attributes:
+        kind - 'shm' for POSIX shared memory, 'file' for a memory-mapped .npy
+               file
+        name - Name of the shared memory segment, or the file name
+       shape, dtype - Shape and dtype (as a string) of the array (used for
+               shared memory only; .npy files carry their own)
+
+    """
+
+    def __init__(self, kind, name, shape=None, dtype=None):
+        self.kind = kind
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __repr__(self):
+        return f'SharedArrayHandle({self.kind!r}, {self.name!r}, {self.shape!r}, {self.dtype!r})'
+
+
+def shareable(value, threshold):
+    """Test whether a value should be published in shared memory.
+
+    :param value: Result being sent to a consumer
+    :param threshold: Minimum size in bytes worth publishing
+    :return: True if value is a numpy array (not of python objects) at least
+             threshold bytes in size
+
+    """
+    import numpy as np
+    return isinstance(value, np.ndarray) and not value.dtype.hasobject and \
+        value.nbytes >= threshold
+
+
+class SharedArrayPublisher(object):
+    """Publish arrays for consumers on the same node.
+
+    Each time an array is published, the publisher counts one more consumer
+    that has a handle for it but might not have mapped it yet.  When the
+    consumer has mapped the array, it tells the provider, which calls done()
+    with the handle's name.  Once all of the consumers given a handle have
+    mapped it, the segment is unlinked; the memory is freed when the last of
+    the consumers' maps is closed.  Segments that some consumer never
+    reported on are unlinked by close(), which should be called after all of
+    the consumers have mapped them (for the RAB, after the finalization
+    barrier).  Consumers' maps remain valid after the segment is unlinked.
+
+    The publisher holds only weak references to the arrays it publishes, so
+    it doesn't keep the provider's results from being released.  Memory-mapped
+    files are published through a hard link that the publisher owns, so a
+    result store removing its spill file (e.g., when the result is released)
+    can't pull the file out from under a consumer that hasn't mapped it yet.
+
+    """
+
+    def __init__(self):
+        self.published = {}     # key -> entry for the array currently published under the key
+        self.entries = {}       # handle name -> entry, for every segment not yet unlinked
+        self.nlinks = 0         # number of file links made (for unique link names)
+        self.lock = threading.Lock()
+
+    def publish(self, key, array, allow_file=True):
+        """Get a handle for an array, publishing it if necessary.
+
+        :param key: Hashable key for the array (e.g., the capability name).  If
+                    the same array is published again under the same key, the
+                    existing segment is reused.
+        :param array: Array to publish
+        :param allow_file: If True, and the array is a memory-mapped .npy file,
+                    publish the file instead of copying the array to shared
+                    memory.  This must be False if the array is only part of
+                    the file (e.g., a selection).
+
+        Each handle returned must be reported with done() once the consumer
+        has mapped it (or the segment will be kept until close()).
+
+        """
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        with self.lock:
+            entry = self.published.get(key)
+            if entry is not None and entry['array']() is array:
+                entry['pending'] += 1
+                return entry['handle']
+
+            handle = None
+            segment = None
+            filename = getattr(array, 'filename', None)
+            if allow_file and isinstance(array, np.memmap) and filename is not None and \
+               str(filename).endswith('.npy'):
+                # Already in a file that the consumers can map themselves.
+                # Link it under our own name to pin it until they have.
+                filename = str(filename)
+                self.nlinks += 1
+                linkname = f'{filename[:-4]}.pub{os.getpid()}-{self.nlinks}.npy'
+                try:
+                    os.link(filename, linkname)
+                    handle = SharedArrayHandle('file', linkname)
+                except OSError as err:
+                    logging.debug(f"can't link {filename} for publication ({err}); "
+                                  'copying to shared memory')
+            if handle is None:
+                segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                shared = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+                shared[...] = array
+                del shared
+                handle = SharedArrayHandle('shm', segment.name, array.shape, array.dtype.str)
+                logging.debug(f'published {key} ({array.nbytes} bytes) in {segment.name}')
+
+            entry = {'key': key, 'array': weakref.ref(array), 'handle': handle,
+                     'segment': segment, 'pending': 1}
+            self.published[key] = entry
+            self.entries[handle.name] = entry
+            return handle
+
+    def done(self, name):
+        """Record that a consumer has mapped a published array.
+
+        :param name: Name of the handle given to the consumer
+
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return
+            entry['pending'] -= 1
+            if entry['pending'] > 0:
+                return
+            del self.entries[name]
+            if self.published.get(entry['key']) is entry:
+                del self.published[entry['key']]
+        logging.debug(f'unlinking {name}; all of its consumers have mapped it')
+        self._unlink(entry)
+
+    def close(self):
+        """Unlink all of the published segments."""
+        with self.lock:
+            entries = list(self.entries.values())
+            self.published = {}
+            self.entries = {}
+        for entry in entries:
+            self._unlink(entry)
+
+    @staticmethod
+    def _unlink(entry):
+        """Unlink a published segment or file link (private)."""
+        segment = entry['segment']
+        if segment is None:
+            try:
+                os.remove(entry['handle'].name)
+            except OSError:
+                pass
+            return
+        try:
+            segment.close()
+        except BufferError:
+            # Someone in this process still has a view of it; the memory will
+            # be freed when they're done with it.
+            pass
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def attach(handle):
+    """Map a published array.
+
+    :param handle: SharedArrayHandle received from the provider
+    :return: Read-only numpy array backed by the shared memory or file.
+
+    """
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    if handle.kind == 'file':
+        return np.load(handle.name, mmap_mode='r')
+
+    segment = shared_memory.SharedMemory(name=handle.name)
+    # Before python 3.13, attaching registers the segment with this process's
+    # resource tracker, which would unlink it out from under the provider when
+    # we exit.  The provider owns the segment, so stop tracking it here.
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except Exception:
+        pass
+
+    array = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=segment.buf)
+    array.flags.writeable = False
+    # Keep the segment open for as long as the array (or any view of it) is
+    # in use, and close our map of it after that.
+    weakref.finalize(array, _close_segment, segment)
+    return array
+
+
+def _close_segment(segment):
+    """Close our map of a shared memory segment (private, used by attach())."""
+    try:
+        segment.close()
+    except BufferError:
+        pass
@@ -0,0 +1,295 @@
+"""Storage for component results.
+
+Each component keeps its results in a result store, which behaves like a
+dictionary of results indexed by capability name (it is the component's
+self.results).  The default store simply keeps everything in memory.  The
+memmap store spills large numpy arrays to .npy files in a scratch directory and
+keeps read-only memory maps of them in their place.  Consumers fetching the
+result get the memory map, so several consumers share the same pages, and the
+operating system can page the data out when memory is tight instead of the
+process running out of memory.
+
+The store type is configured process-wide from the [Global] section of the
+configuration file (see GlobalParamsComponent):
+
+  result_store    - 'memory' (default) or 'memmap', or the name of a store type
+                    added with add_store_type()
+  spill_threshold - Size in bytes above which arrays are spilled to disk by the
+                    memmap store (default 64 MiB)
+  scratchdir      - Directory for spilled results.  (default: a temporary
+                    directory, which is removed when the program exits)
+
+The Global section is parsed before any other component is created, so every
+other component gets a store of the configured type.
+
+Classes:
+
+ResultStore  - In-memory result store (the default).
+
+MemmapStore  - Result store that spills large arrays to memory-mapped files.
+
+LazyResult   - Placeholder for a result that is computed on first fetch.
+
+Functions:
+
+result_nbytes  - Estimate the memory used by a result.
+
+configure      - Set the type of store to create for new components.
+
+create_store   - Create a result store of the configured type.
+
+add_store_type - Register a new type of result store.
+
+"""
+
+import os
+import re
+import atexit
+import shutil
+import tempfile
+import threading
+import logging
+from collections.abc import MutableMapping
+
+DEFAULT_SPILL_THRESHOLD = 64 * 1024 * 1024
+
+
+class ResultStore(MutableMapping):
+    """Keep results in memory.
+
+    This is a dictionary of results by capability, with two additional
+    methods, which subclasses may override:
+
+    release(capability) - Drop the store's reference to a result.  (For this
+                          class, the same as deleting it.)
+
+    nbytes(capability)  - Memory held by the store for a result (see
+                          result_nbytes()).
+
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def __getitem__(self, capability):
+        return self.data[capability]
+
+    def __setitem__(self, capability, value):
+        self.data[capability] = value
+
+    def __delitem__(self, capability):
+        del self.data[capability]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.data!r})'
+
+    def release(self, capability):
+        """Drop the store's reference to a result."""
+        self.data.pop(capability, None)
+
+    def nbytes(self, capability):
+        """Memory held by the store for a result, in bytes."""
+        return result_nbytes(self.data.get(capability))
+
+
+class MemmapStore(ResultStore):
+    """Spill large numpy arrays to memory-mapped .npy files.
+
+    Arrays at least threshold bytes in size (other than arrays of python
+    objects, which numpy can't map) are written to scratchdir and replaced by
+    read-only memory maps of the file.  Everything else is kept in memory.  The
+    file is removed when the result is replaced, deleted, or released.
+
+    """
+
+    def __init__(self, scratchdir, threshold=DEFAULT_SPILL_THRESHOLD):
+        super(MemmapStore, self).__init__()
+        self.scratchdir = scratchdir
+        self.threshold = threshold
+        self.files = {}
+
+    def __setitem__(self, capability, value):
+        import numpy as np
+
+        self._remove(capability)
+        if isinstance(value, np.ndarray) and value.nbytes >= self.threshold and \
+           not value.dtype.hasobject:
+            safename = re.sub(r'[^\w.-]', '_', capability)
+            (fd, filename) = tempfile.mkstemp(prefix=f'{safename}-', suffix='.npy',
+                                              dir=self.scratchdir)
+            with os.fdopen(fd, 'wb') as outfile:
+                np.save(outfile, value)
+            logging.debug(f'spilled {capability} ({value.nbytes} bytes) to {filename}')
+            self.files[capability] = filename
+            value = np.load(filename, mmap_mode='r')
+        self.data[capability] = value
+
+    def __delitem__(self, capability):
+        del self.data[capability]
+        self._remove(capability)
+
+    def release(self, capability):
+        self.data.pop(capability, None)
+        self._remove(capability)
+
+    def nbytes(self, capability):
+        # Spilled results are backed by their file, not by our memory.
+        if capability in self.files:
+            return 0
+        return super(MemmapStore, self).nbytes(capability)
+
+    def _remove(self, capability):
+        """Remove a result's spill file, if it has one (private).
+
+        Memory maps of the file that consumers are still holding remain valid;
+        the space is freed when the last of them is closed.
+
+        """
+        filename = self.files.pop(capability, None)
+        if filename is not None:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+class LazyResult(object):
+    """A result that is computed the first time it is fetched.
+
+    Components can add one of these with addresults() in place of the actual
+    data.  The first fetch of the capability calls the function and replaces
+    the placeholder in the result store with the value it returns (so, e.g., a
+    large array is spilled by the memmap store only if it is actually used).
+    If nobody fetches the capability, the function is never called, and the
+    data it would have produced need never be held.
+
+    """
+
+    def __init__(self, fn):
+        """
+        :param fn: Function of no arguments returning the result.  It is
+                   called at most once, from the thread of the first consumer
+                   to fetch the capability.
+        """
+        self.fn = fn
+        self.lock = threading.Lock()
+        self.done = False
+        self.value = None
+        self.callbacks = []
+
+    def get(self):
+        """Get the value, computing it if necessary."""
+        with self.lock:
+            if self.done:
+                return self.value
+            self.value = self.fn()
+            self.fn = None          # drop anything the function was holding
+            self.done = True
+            callbacks = self.callbacks
+            self.callbacks = []
+        for callback in callbacks:
+            callback(self.value)
+        return self.value
+
+    def when_done(self, callback):
+        """Call callback(value) once the value has been computed.
+
+        If it has already been computed, the callback is called right away.
+        Otherwise it is called from the thread that computes it, so it should
+        be quick.
+
+        """
+        with self.lock:
+            if not self.done:
+                self.callbacks.append(callback)
+                return
+        callback(self.value)
+
+
+def result_nbytes(value):
+    """Estimate the memory used by a result, in bytes.
+
+    numpy arrays, pandas data frames, and lists, tuples, and dictionaries of
+    them are counted; anything else counts as 0.  Memory maps count as 0, since
+    they are backed by their files.
+
+    """
+    import numpy as np
+
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, 'memory_usage'):
+        # pandas DataFrame or Series
+        return int(np.sum(value.memory_usage(index=True)))
+    if isinstance(value, (list, tuple)):
+        return sum(result_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(result_nbytes(v) for v in value.values())
+    return 0
+
+
+_store_types = {
+    'memory': lambda config: ResultStore(),
+    'memmap': lambda config: MemmapStore(config['scratchdir'], config['spill_threshold']),
+}
+
+_config = {'result_store': 'memory', 'spill_threshold': DEFAULT_SPILL_THRESHOLD,
+           'scratchdir': None}
+_config_lock = threading.Lock()
+
+
+def configure(params):
+    """Set the type of store to create for new components.
+
+    :param params: Dictionary of parameters (usually the [Global] section);
+                   see the module docstring.  Missing parameters keep their
+                   defaults.
+
+    """
+    with _config_lock:
+        store_type = params.get('result_store', 'memory')
+        if store_type not in _store_types:
+            raise RuntimeError(f'Unknown result store type {store_type}')
+        _config['result_store'] = store_type
+        _config['spill_threshold'] = int(float(params.get('spill_threshold',
+                                                          DEFAULT_SPILL_THRESHOLD)))
+
+        scratchdir = params.get('scratchdir')
+        if scratchdir is None:
+            if store_type != 'memory' and _config['scratchdir'] is None:
+                scratchdir = tempfile.mkdtemp(prefix='cassandra-')
+                atexit.register(shutil.rmtree, scratchdir, True)
+                _config['scratchdir'] = scratchdir
+        else:
+            os.makedirs(scratchdir, exist_ok=True)
+            _config['scratchdir'] = scratchdir
+
+        logging.debug(f'result store: {_config}')
+
+
+def create_store():
+    """Create a result store of the configured type."""
+    with _config_lock:
+        return _store_types[_config['result_store']](dict(_config))
+
+
+def add_store_type(name, factory):
+    """Register a new type of result store.
+
+    :param name: Name by which the store type will be known in the result_store
+                 parameter.
+    :param factory: Function taking the store configuration dictionary (with
+                    entries result_store, spill_threshold, and scratchdir) and
+                    returning a new store.  The store should be a subclass of
+                    ResultStore.
+
+    """
+    _store_types[name] = factory
@@ -0,0 +1,252 @@
+"""Supervision of long-running model subprocesses.
+
+Some models (notably GCAM) run as external executables that can take hours to
+complete.  The ProcessSupervisor class in this module runs such an executable,
+streams its output to a log file as it is produced, watches the output for lines
+that indicate progress, and keeps track of the resources the process uses.
+
+Classes:
+
+Progress          - Thread-safe record of a model's progress through its time
+                    periods.  Components can publish one of these as an early
+                    result so that other components can wait on particular
+                    periods instead of on the whole run.
+
+ProcessSupervisor - Run a subprocess, stream its output, record progress and
+                    resource usage, and enforce a wall-clock timeout.
+
+"""
+
+import os
+import re
+import sys
+import signal
+import subprocess
+import threading
+import time
+import logging
+
+
+class Progress(object):
+    """Progress of a running model.
+
+    Attributes:
+      period - Last period reported as complete (-1 if none yet)
+        year - Year of that period, if the model reported it (else None)
+      events - List of (time, period, year) tuples, one for each progress
+               report, with times in seconds since the start of the run.
+        done - Flag indicating that the model has exited.
+
+    The object can be pickled (e.g., for transfer by the RAB).  The unpickled
+    copy is a snapshot; it won't receive further updates.
+
+    """
+
+    def __init__(self):
+        self.period = -1
+        self.year = None
+        self.events = []
+        self.done = False
+        self.condition = threading.Condition()
+
+    def update(self, t, period, year=None):
+        """Record that a period has been completed."""
+        with self.condition:
+            self.period = period
+            self.year = year
+            self.events.append((t, period, year))
+            self.condition.notify_all()
+
+    def finish(self):
+        """Record that the model has exited."""
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def wait_for(self, period, timeout=None):
+        """Wait until the given period has been completed.
+
+        :param period: Period to wait for.
+        :param timeout: Maximum time to wait in seconds (default: no limit)
+        :return: True if the period was completed; False if the model exited
+                 without reaching it or if the wait timed out.
+
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.period >= period or self.done,
+                                    timeout)
+            return self.period >= period
+
+    def __getstate__(self):
+        with self.condition:
+            state = self.__dict__.copy()
+            state['events'] = list(self.events)
+        del state['condition']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.condition = threading.Condition()
+
+
+class ProcessSupervisor(object):
+    """Run and monitor a subprocess.
+
+    The subprocess's stdout and stderr are read by a separate thread as they
+    are produced and copied to the log file (or to our stdout if there is no
+    log file).  Each line is checked against the progress pattern; the pattern
+    must have a group that captures the period number and may have a second
+    group that captures the year.
+
+    While the process runs, its resident set size is sampled from /proc so that
+    the peak memory usage is available even if the process is killed.  When it
+    exits, its CPU times and peak RSS are collected with os.wait4, which
+    reports the usage for that child alone (unlike getrusage(RUSAGE_CHILDREN),
+    which would include any other children of this process).
+
+    Attributes (valid after run() returns):
+       progress - Progress object for the run
+          stats - Dictionary of resource usage: wall (s), utime (s),
+                  stime (s), peak_rss (bytes)
+
+    """
+
+    def __init__(self, cmd, cwd=None, logfile=None, progress_pattern=None,
+                 timeout=None, poll_interval=1.0, progress=None):
+        """Set up the supervisor.
+
+        :param cmd: Command to run, as a list of strings
+        :param cwd: Working directory for the command
+        :param logfile: File to copy the command's output to.  If None, copy
+                        it to our stdout.
+        :param progress_pattern: Regular expression (string or compiled)
+                        identifying progress lines.  If None, no progress is
+                        recorded.
+        :param timeout: Wall-clock limit in seconds.  If the process runs
+                        longer than this, it is killed (along with its process
+                        group) and run() raises
+                        subprocess.TimeoutExpired.  None means no limit.
+        :param poll_interval: Maximum interval in seconds between checks on the
+                        process.
+        :param progress: Progress object to update.  If None, a new one is
+                        created.
+
+        """
+        self.cmd = cmd
+        self.cwd = cwd
+        self.logfile = logfile
+        if isinstance(progress_pattern, str):
+            progress_pattern = re.compile(progress_pattern)
+        self.progress_pattern = progress_pattern
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.progress = Progress() if progress is None else progress
+        self.stats = {}
+
+    def run(self):
+        """Run the process to completion and return its exit code."""
+        t0 = time.time()
+        # Open the log before starting the process, so that a bad log file is
+        # reported to the caller instead of killing the reader thread.
+        out = sys.stdout if self.logfile is None else open(self.logfile, 'w')
+        try:
+            proc = subprocess.Popen(self.cmd, cwd=self.cwd, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, universal_newlines=True,
+                                    errors='replace', bufsize=1, start_new_session=True)
+        except:
+            if out is not sys.stdout:
+                out.close()
+            raise
+        reader = threading.Thread(target=self._read_output, args=(proc.stdout, out, t0))
+        reader.start()
+
+        peak_rss = 0
+        rusage = None
+        # Poll quickly at first so that short runs aren't padded out to a full
+        # poll interval, then back off.
+        interval = min(0.01, self.poll_interval)
+        try:
+            while True:
+                pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+                if pid != 0:
+                    break
+                peak_rss = max(peak_rss, self._sample_rss(proc.pid))
+                if self.timeout is not None and time.time() - t0 > self.timeout:
+                    logging.error(f'{self.cmd[0]} exceeded time limit of {self.timeout} s.  Killing.')
+                    # Kill the whole process group, so that any children still
+                    # holding the output pipe open go too.
+                    os.killpg(proc.pid, signal.SIGKILL)
+                    _, _, rusage = os.wait4(proc.pid, 0)
+                    proc.returncode = -9
+                    raise subprocess.TimeoutExpired(self.cmd, self.timeout)
+                time.sleep(interval)
+                interval = min(2*interval, self.poll_interval)
+
+            if os.WIFSIGNALED(status):
+                proc.returncode = -os.WTERMSIG(status)
+            else:
+                proc.returncode = os.WEXITSTATUS(status)
+        finally:
+            reader.join()
+            proc.stdout.close()
+            self.progress.finish()
+
+            self.stats['wall'] = time.time() - t0
+            if rusage is not None:
+                self.stats['utime'] = rusage.ru_utime
+                self.stats['stime'] = rusage.ru_stime
+                # ru_maxrss is in kB on Linux
+                peak_rss = max(peak_rss, rusage.ru_maxrss * 1024)
+            self.stats['peak_rss'] = peak_rss
+
+        return proc.returncode
+
+    def _read_output(self, stream, out, t0):
+        """Copy the process output to the log, recording progress (thread target).
+
+        The pipe is drained to the end even if writing to the log fails;
+        otherwise the process would block once the pipe filled up.
+
+        """
+        try:
+            for line in stream:
+                if out is not None:
+                    try:
+                        out.write(line)
+                    except Exception as err:
+                        logging.error(f'{self.cmd[0]}: error writing output to '
+                                      f'{self.logfile or "stdout"}: {err!r}.  Discarding further output.')
+                        out = self._close_log(out)
+                if self.progress_pattern is None:
+                    continue
+                match = self.progress_pattern.search(line)
+                if match:
+                    groups = match.groups()
+                    period = int(groups[0])
+                    year = int(groups[1]) if len(groups) > 1 and groups[1] is not None else None
+                    self.progress.update(time.time() - t0, period, year)
+                    logging.debug(f'{self.cmd[0]}: completed period {period} ({year})')
+        finally:
+            self._close_log(out)
+
+    @staticmethod
+    def _close_log(out):
+        """Close the log file (but not stdout), ignoring errors; return None."""
+        if out is not None and out is not sys.stdout:
+            try:
+                out.close()
+            except OSError:
+                pass
+        return None
+
+    @staticmethod
+    def _sample_rss(pid):
+        """Get the high-water RSS (bytes) for a running process from /proc."""
+        try:
+            with open(f'/proc/{pid}/status', 'r') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return 0
@@ -45,6 +45,14 @@ class TestCapabilities(unittest.TestCase):
         self.assertEqual(self.d1.results['Alice'], data)
         self.assertRaises(RuntimeError, self.d1.addresults, 'Bob', data)
 
+    def testFetchSelector(self):
+        """Test fetching part of a capability."""
+        data = ['a', 'b', 'c']
+        self.d1.addresults('Alice', data, early=True)
+        self.assertEqual(self.d2.fetch('Alice', 1), 'b')
+        self.assertEqual(self.d2.fetch('Alice', [2, 0]), ['c', 'a'])
+        self.assertEqual(self.d2.fetch('Alice'), data)
+
 
 if __name__ == '__main__':
     unittest.main()
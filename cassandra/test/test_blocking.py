@@ -5,9 +5,29 @@ are supposed to.
 """
 
 from cassandra.components import *
+import threading
+import time
 import unittest
 
 
+class EarlyComponent(ComponentBase):
+    """Publish an early result partway through a run, then wait to be released."""
+
+    def __init__(self, cap_tbl):
+        super(EarlyComponent, self).__init__(cap_tbl)
+        self.addcapability('early')
+        self.addearly('early')
+        self.added = threading.Event()
+        self.release = threading.Event()
+
+    def run_component(self):
+        time.sleep(0.2)         # give the fetch a chance to start waiting
+        self.addresults('early', 'data', early=True)
+        self.added.set()
+        self.release.wait(30)
+        return 0
+
+
 class TestBlocking(unittest.TestCase):
     def setUp(self):
         """Defines the DummyComponents that interact with each other."""
@@ -72,6 +92,21 @@ class TestBlocking(unittest.TestCase):
         # in this test is the finish delay
         self.assertEqual(d1_ms, finish_delay * len(self.component_list))
 
+    def testEarly(self):
+        """Test that fetching a declared early result before it's added waits only until it's added."""
+        provider = EarlyComponent(self.d1.cap_tbl)
+        thread = provider.run()
+        try:
+            self.assertEqual(self.d1.fetch('early'), 'data')
+            # The fetch returned after the result was added, while the
+            # provider was still running.
+            self.assertTrue(provider.added.is_set())
+            self.assertEqual(provider.status, 0)
+        finally:
+            provider.release.set()
+            thread.join()
+        self.assertEqual(provider.status, 1)
+
     def confirmSuccess(self):
         """Ensure each component finished successfully."""
         for component in self.component_list:
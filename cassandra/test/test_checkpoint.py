@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""Test checkpointing and restoring component results."""
+
+from cassandra import checkpoint
+from cassandra import store
+from cassandra import util
+from cassandra.components import ComponentBase, DummyComponent
+from cassandra.supervise import Progress
+import numpy as np
+import os
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+
+class ArrayComponent(ComponentBase):
+    """Publish arange(size) * scale, times the sum of the first two elements of an input, if any."""
+
+    def __init__(self, cap_tbl):
+        super(ArrayComponent, self).__init__(cap_tbl)
+        self.nrun = 0
+
+    def finalize_parsing(self):
+        super(ArrayComponent, self).finalize_parsing()
+        self.addcapability(self.params['name'])
+
+    def run_component(self):
+        self.nrun += 1
+        value = np.arange(float(self.params['size'])) * float(self.params.get('scale', 1))
+        if 'input' in self.params:
+            value *= self.fetch(self.params['input'], np.s_[0:2]).sum()
+        self.addresults(self.params['name'], value)
+        return 0
+
+
+class LazyComponent(ComponentBase):
+    """Publish two lazy arrays, counting how many times each is computed."""
+
+    def __init__(self, cap_tbl):
+        super(LazyComponent, self).__init__(cap_tbl)
+        self.addcapability('x')
+        self.addcapability('y')
+        self.computed = []
+
+    def run_component(self):
+        for cap in ['x', 'y']:
+            self.addresults(cap, store.LazyResult(lambda cap=cap: self.compute(cap)))
+        return 0
+
+    def compute(self, cap):
+        self.computed.append(cap)
+        return np.arange(3.0)
+
+
+class ProgressComponent(ComponentBase):
+    """Publish a progress report, which is different on every run (like GcamComponent)."""
+
+    checkpointable = False
+
+    def __init__(self, cap_tbl):
+        super(ProgressComponent, self).__init__(cap_tbl)
+        self.addcapability('progress')
+
+    def run_component(self):
+        progress = Progress()
+        progress.update(time.time(), 1)
+        progress.finish()
+        self.addresults('progress', progress)
+        return 0
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        checkpoint.configure({'checkpoint_dir': self.tmpdir.name})
+
+    def tearDown(self):
+        checkpoint.configure({})
+        self.tmpdir.cleanup()
+
+    def run_components(self, params):
+        """Create, run, and return components for a list of parameter dicts."""
+        cap_tbl = {}
+        comps = []
+        for p in params:
+            comp = ArrayComponent(cap_tbl)
+            comp.label = p['name']
+            comp.params.update(p)
+            comp.finalize_parsing()
+            comps.append(comp)
+        threads = [comp.run() for comp in comps]
+        for thread in threads:
+            thread.join()
+        for comp in comps:
+            self.assertEqual(comp.status, 1)
+        return comps
+
+    def testRestore(self):
+        """Test that unchanged components are restored and changed ones rerun."""
+        params = [{'name': 'a', 'size': '10'},
+                  {'name': 'b', 'size': '5', 'input': 'a'}]
+        (a, b) = self.run_components(params)
+        self.assertEqual((a.nrun, b.nrun), (1, 1))
+        expected = np.arange(5.0) * 1.0
+        np.testing.assert_array_equal(b.results['b'], expected)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, 'b', 'manifest.json')))
+
+        # Nothing changed: both are restored
+        (a, b) = self.run_components(params)
+        self.assertEqual((a.nrun, b.nrun), (0, 0))
+        self.assertTrue(a.restored and b.restored)
+        self.assertIsInstance(b.results['b'], np.memmap)
+        np.testing.assert_array_equal(b.results['b'], expected)
+
+        # Changing b's parameters reruns only b
+        params[1]['size'] = '6'
+        (a, b) = self.run_components(params)
+        self.assertEqual((a.nrun, b.nrun), (0, 1))
+
+        # Changing the part of a's output that b uses reruns a, and b because
+        # its input changed
+        params[0]['scale'] = '2'
+        (a, b) = self.run_components(params)
+        self.assertEqual((a.nrun, b.nrun), (1, 1))
+
+        # Changing a in a way that doesn't affect the part b fetches reruns
+        # only a
+        params[0]['size'] = '30'
+        (a, b) = self.run_components(params)
+        self.assertEqual((a.nrun, b.nrun), (1, 0))
+
+    def testParamFiles(self):
+        """Test that changes to files named in the parameters are detected."""
+        filename = os.path.join(self.tmpdir.name, 'input.txt')
+        with open(filename, 'w') as f:
+            f.write('one')
+        params = [{'name': 'a', 'size': '3', 'datafile': filename}]
+        self.run_components(params)
+        self.assertEqual(self.run_components(params)[0].nrun, 0)
+        with open(filename, 'w') as f:
+            f.write('two')
+        self.assertEqual(self.run_components(params)[0].nrun, 1)
+
+    def testDummy(self):
+        """Test that non-array results are checkpointed."""
+        cap_tbl = {}
+        comp = DummyComponent(cap_tbl)
+        comp.addparam('name', 'Alice')
+        comp.addparam('finish_delay', '0')
+        comp.finalize_parsing()
+        comp.run().join()
+
+        cap_tbl = {}
+        restored = DummyComponent(cap_tbl)
+        restored.addparam('name', 'Alice')
+        restored.addparam('finish_delay', '0')
+        restored.finalize_parsing()
+        restored.run().join()
+        self.assertTrue(restored.restored)
+        self.assertEqual(restored.report_test_results(), comp.report_test_results())
+
+    def testLazy(self):
+        """Test that lazy results are checkpointed only when they are computed."""
+        def run():
+            comp = LazyComponent({})
+            comp.run().join()
+            self.assertEqual(comp.status, 1)
+            return comp
+
+        comp = run()
+        self.assertEqual(comp.computed, [])
+        comp.fetch('x')
+        util.BackgroundWriter.get().flush()
+
+        # y was never computed, so the checkpoint can't be restored
+        comp = run()
+        self.assertFalse(comp.restored)
+        comp.fetch('x')
+        comp.fetch('y')
+        self.assertEqual(comp.computed, ['x', 'y'])
+        util.BackgroundWriter.get().flush()
+
+        comp = run()
+        self.assertTrue(comp.restored)
+        np.testing.assert_array_equal(comp.fetch('y'), np.arange(3.0))
+
+    def testProgress(self):
+        """Test that fetching a progress report doesn't prevent restoring."""
+        def run():
+            cap_tbl = {}
+            ProgressComponent(cap_tbl)
+            comp = DummyComponent(cap_tbl)
+            comp.label = 'Bob'
+            for key, val in [('name', 'Bob'), ('capability_reqs', 'progress'),
+                             ('request_delays', '0'), ('finish_delay', '0')]:
+                comp.addparam(key, val)
+            comp.finalize_parsing()
+            threads = [c.run() for c in set(cap_tbl.values())]
+            for thread in threads:
+                thread.join()
+            self.assertEqual(comp.status, 1)
+            return comp
+
+        self.assertFalse(run().restored)
+        self.assertTrue(run().restored)
+
+    def testParamsKeyFailure(self):
+        """Test that a failure to fingerprint the parameters fails the component instead of hanging."""
+        comp = ArrayComponent({})
+        comp.params.update({'name': 'a', 'size': '3'})
+        comp.finalize_parsing()
+        with unittest.mock.patch.object(checkpoint.CheckpointStore, 'params_key',
+                                        side_effect=ValueError('bad params')), \
+                self.assertLogs(level='ERROR'):
+            comp.run().join()
+        self.assertEqual(comp.status, 2)
+        self.assertRaises(RuntimeError, comp.fetch, 'a')
+
+    def testDigest(self):
+        """Test result digests."""
+        a = np.arange(10.0)
+        self.assertEqual(checkpoint.digest(a), checkpoint.digest(a.copy()))
+        self.assertNotEqual(checkpoint.digest(a), checkpoint.digest(a.astype(np.float32)))
+        self.assertNotEqual(checkpoint.digest(a), checkpoint.digest(a.reshape(2, 5)))
+        self.assertEqual(checkpoint.digest({'x': [a, 'b']}), checkpoint.digest({'x': [a.copy(), 'b']}))
+        self.assertEqual(checkpoint.digest_async(a).result(), checkpoint.digest(a))
+        self.assertIs(checkpoint.digest_async(a), checkpoint.digest_async(a))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Tests for the numpy monthly downscaling."""
+
+import unittest
+import numpy as np
+from cassandra import downscale
+
+
+def reference_downscale(annual, frac, var):
+    """Downscale one realization at a time, the way an2month does."""
+    rslt = []
+    for fld in annual:
+        ncell, nyear = fld.shape
+        monthly = np.empty((ncell, nyear*12))
+        for y in range(nyear):
+            for m in range(12):
+                if var == 'tas':
+                    monthly[:, y*12+m] = fld[:, y] + frac[:, m]
+                else:
+                    monthly[:, y*12+m] = (fld[:, y] * 12 * frac[:, m] *
+                                          downscale.SECONDS_PER_DAY * downscale.DAYS_PER_MONTH[m])
+        rslt.append(monthly)
+    return np.array(rslt)
+
+
+def have_an2month():
+    try:
+        from rpy2.robjects.packages import importr
+        importr('an2month')
+        return True
+    except Exception:
+        return False
+
+
+class TestDownscale(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(867)
+        self.ncell = 7
+        self.annual = {'tas': rng.normal(280, 10, (3, self.ncell, 4)).astype(np.float32),
+                       'pr': rng.uniform(0, 1e-4, (3, self.ncell, 4)).astype(np.float32)}
+        frac = rng.uniform(0, 1, (self.ncell, 12))
+        self.frac = {'tas': rng.normal(0, 5, (self.ncell, 12)),
+                     'pr': frac / frac.sum(axis=1, keepdims=True)}
+
+    def testMatchesReference(self):
+        """Test that the broadcast downscaling matches the per-realization calculation."""
+        for var in ['tas', 'pr']:
+            factors = downscale.monthly_factors(self.frac[var], var)
+            monthly = downscale.downscale(self.annual[var], factors, var)
+            self.assertEqual(monthly.shape, (3, self.ncell, 48))
+            self.assertEqual(monthly.dtype, np.float32)
+            ref = reference_downscale(self.annual[var].astype(np.float64), self.frac[var], var)
+            np.testing.assert_allclose(monthly, ref, rtol=1e-5)
+
+    def testAlign(self):
+        """Test putting fractions into field grid order."""
+        coords = np.array([[lat, 2.5*lat] for lat in range(self.ncell)], dtype=np.float64)
+        perm = [3, 0, 6, 1, 5, 2, 4]
+        aligned = downscale.align_fractions(self.frac['pr'][perm, :].T, coords[perm, :], coords)
+        np.testing.assert_array_equal(aligned, self.frac['pr'])
+
+        with self.assertRaises(ValueError):
+            downscale.align_fractions(self.frac['pr'], coords, coords + 1)
+        with self.assertRaises(ValueError):
+            downscale.align_fractions(self.frac['pr'][0:5, :], None, coords)
+
+    @unittest.skipUnless(have_an2month(), 'rpy2 and an2month are not available')
+    def testMatchesR(self):
+        """Test that the numpy downscaling matches an2month."""
+        import rpy2.robjects as robjects
+        from rpy2.robjects.conversion import localconverter
+        from cassandra.rutil import package, load_fractions, load_monthly_factors, \
+            monthly_downscale, r_matrices_to_array
+
+        a2mfrac = 'frac_ipsl_cm5a_lr'
+        with localconverter(robjects.default_converter):
+            an2month = package('an2month')
+            fracs = load_fractions(a2mfrac)
+            coords = np.ascontiguousarray(fracs['coordinates'][:, 0:2], dtype=np.float64)
+            ncell = coords.shape[0]
+            rng = np.random.RandomState(5309)
+
+            annual_r = {}
+            annual_np = {}
+            for var, lo, hi in [('tas', 250, 300), ('pr', 0, 1e-4)]:
+                # R matrices are (year x grid cell)
+                flds = [rng.uniform(lo, hi, (5, ncell)) for i in range(2)]
+                annual_r[var] = robjects.r['list'](
+                    *[robjects.r['matrix'](robjects.FloatVector(f.ravel(order='F')), nrow=5, ncol=ncell)
+                      for f in flds])
+                annual_np[var] = r_matrices_to_array(annual_r[var])
+
+            rslt = monthly_downscale(an2month, annual_r, {'tas': coords, 'pr': coords},
+                                     a2mfrac, 2006)
+            for var in ['tas', 'pr']:
+                factors = load_monthly_factors(a2mfrac, var, coords)
+                monthly = downscale.downscale(annual_np[var], factors, var)
+                np.testing.assert_allclose(monthly, rslt[var], rtol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Test the expansion of ensemble sweeps and the sharing of capabilities between
+ensemble members.
+"""
+
+from cassandra.ensemble import read_sweep, expand_sweep, create_members
+from cassandra.components import DummyComponent
+from cassandra import checkpoint
+from configobj import ConfigObj
+import os
+import tempfile
+import time
+import unittest
+
+
+BASE = '''[Global]
+ModelInterface = /dev/null
+DBXMLlib = /dev/null
+
+[DummyComponent.source]
+name = Source
+finish_delay = 100
+
+[DummyComponent.member]
+name = Member
+capability_reqs = Source,
+request_delays = 0,
+finish_delay = 100
+outdir = out-{member}
+'''
+
+SWEEP = '''[Ensemble]
+mode = {mode}
+shared = DummyComponent.source
+{extra}
+  [[DummyComponent.member]]
+  finish_delay = 100, 200
+  seed = 1, 2
+'''
+
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config = ConfigObj(BASE.splitlines())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def sweep(self, mode='product', extra=''):
+        filename = os.path.join(self.tmpdir.name, 'sweep.cfg')
+        with open(filename, 'w') as f:
+            f.write(SWEEP.format(mode=mode, extra=extra))
+        return read_sweep(filename)
+
+    def testExpand(self):
+        """Test product and zip expansion."""
+        shared, members = expand_sweep(self.config, self.sweep())
+        self.assertEqual(list(shared.keys()), ['Global', 'DummyComponent.source'])
+        self.assertEqual(len(members), 4)
+        self.assertEqual([m['DummyComponent.member']['outdir'] for m in members],
+                         ['out-0', 'out-1', 'out-2', 'out-3'])
+
+        shared, members = expand_sweep(self.config, self.sweep('zip'))
+        self.assertEqual([(m['DummyComponent.member']['finish_delay'], m['DummyComponent.member']['seed'])
+                          for m in members], [('100', '1'), ('200', '2')])
+
+    def testRun(self):
+        """Test that members run with their own capability tables and a shared source."""
+        sweepinfo = self.sweep('zip', 'max_concurrent = 1')
+        shared, members = expand_sweep(self.config, sweepinfo)
+        comps = create_members(shared, members, {}, sweepinfo['max_concurrent'])
+
+        # Global, the shared source, and one component for each member
+        self.assertEqual(len(comps), 4)
+        source = comps[1]
+        m0, m1 = comps[2:]
+        self.assertIsNot(m0.cap_tbl, m1.cap_tbl)
+        self.assertIs(m0.cap_tbl['Source'], source)
+        self.assertIs(m1.cap_tbl['Source'], source)
+
+        t0 = time.time()
+        threads = [c.run() for c in comps]
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - t0
+
+        for c in comps:
+            self.assertEqual(c.status, 1)
+        self.assertEqual(m0.fetch('Member')[0][1], 'Start Member')
+        # With max_concurrent = 1, the members have to run one after the other
+        self.assertGreaterEqual(elapsed, 0.4)
+
+    def testCheckpoint(self):
+        """Test that members with restored components give back their slots."""
+        self.config['Global']['checkpoint_dir'] = os.path.join(self.tmpdir.name, 'checkpoints')
+        self.config['DummyComponent.helper'] = {'name': 'Helper', 'finish_delay': '100'}
+        sweepinfo = self.sweep('zip', 'max_concurrent = 1')
+        try:
+            for run in range(2):
+                # On the second run, the helpers rerun and everything else is restored
+                self.config['DummyComponent.helper']['finish_delay'] = str(100 + run)
+                shared, members = expand_sweep(self.config, sweepinfo)
+                comps = create_members(shared, members, {}, sweepinfo['max_concurrent'])
+                threads = [c.run() for c in comps]
+                for thread in threads:
+                    thread.join(5)
+                    self.assertFalse(thread.is_alive())
+                for c in comps:
+                    self.assertEqual(c.status, 1)
+            self.assertEqual([c.restored for c in comps[1:]],
+                             [True, True, False, True, False])
+        finally:
+            checkpoint.configure({})
+
+
+if __name__ == '__main__':
+    unittest.main()
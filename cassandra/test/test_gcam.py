@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Test the GcamComponent's run/skip logic using a stand-in for the GCAM
+executable.
+"""
+
+from cassandra.components import GcamComponent
+from cassandra.supervise import ProcessSupervisor
+from cassandra import util
+from cassandra import checkpoint
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+CONFIG = '''<?xml version="1.0" encoding="UTF-8"?>
+<Configuration>
+    <Files>
+        <Value name="xmlInputFileName">input/modeltime.xml</Value>
+        <Value name="xmldb-location">output/database</Value>
+    </Files>
+    <ScenarioComponents>
+        <Value name="socio">input/socio.xml</Value>
+    </ScenarioComponents>
+    <Strings>
+        <Value name="scenarioName">Reference</Value>
+    </Strings>
+    <Bools>
+        <Value name="write-xml-db">1</Value>
+    </Bools>
+</Configuration>
+'''
+
+# Stand-in for gcam.exe.  It appends a line to the output database and to a
+# run counter so that the test can tell whether it was run.
+EXE = '''#!/bin/sh
+mkdir -p output
+echo run >> output/database
+echo run >> runs
+echo "Period 1: 2005"
+echo "Period 2: 2010"
+sleep $SLEEP
+'''
+
+
+class TestGcam(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        d = self.tmpdir.name
+        os.makedirs(os.path.join(d, 'input'))
+        self.files = {}
+        for name, content in [('config.xml', CONFIG), ('log_conf.xml', '<log/>'),
+                              ('gcam.exe', EXE), ('input/modeltime.xml', '<a/>'),
+                              ('input/socio.xml', '<b/>')]:
+            self.files[name] = os.path.join(d, name)
+            with open(self.files[name], 'w') as f:
+                f.write(content)
+        os.chmod(self.files['gcam.exe'], 0o755)
+
+        os.environ['SLEEP'] = '0'
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def runGcam(self, status=1, **params):
+        """Run a fresh GcamComponent and return the number of times GCAM has run."""
+        gcam = GcamComponent({})
+        self.gcam = gcam
+        gcam.addparam('exe', self.files['gcam.exe'])
+        gcam.addparam('config', self.files['config.xml'])
+        gcam.addparam('logconfig', self.files['log_conf.xml'])
+        for key, val in params.items():
+            gcam.addparam(key, val)
+        gcam.finalize_parsing()
+        gcam.run().join()
+        self.assertEqual(gcam.status, status)
+        if status == 1:
+            self.rslt = gcam.fetch('gcam-core')
+        with open(os.path.join(self.tmpdir.name, 'runs')) as f:
+            return len(f.readlines())
+
+    def testSkipUnchanged(self):
+        """Test that GCAM is skipped when the inputs are unchanged and rerun when they change."""
+        self.assertEqual(self.runGcam(), 1)
+        self.assertEqual(self.rslt['changed'], 1)
+        self.assertEqual(self.runGcam(), 1)
+        self.assertEqual(self.rslt['changed'], 0)
+
+        # Touching a file without changing it is not a change
+        os.utime(self.files['input/socio.xml'])
+        self.assertEqual(self.runGcam(), 1)
+
+        with open(self.files['input/socio.xml'], 'w') as f:
+            f.write('<c/>')
+        self.assertEqual(self.runGcam(), 2)
+        self.assertEqual(self.rslt['changed'], 1)
+
+    def testForce(self):
+        """Test that force reruns GCAM even if nothing changed."""
+        self.assertEqual(self.runGcam(), 1)
+        self.assertEqual(self.runGcam(force='True'), 2)
+
+    def testReadConfig(self):
+        """Test that the config reader finds all the settings and caches the result."""
+        # Put the Bools section ahead of the Files section
+        cfg = CONFIG.replace('<Files>', '<Bools><Value name="write-xml-db">0</Value></Bools><Files>')
+        cfg = cfg.replace('<Bools>\n        <Value name="write-xml-db">1</Value>\n    </Bools>', '')
+        with open(self.files['config.xml'], 'w') as f:
+            f.write(cfg)
+
+        meta = util.read_gcam_config(self.files['config.xml'])
+        d = self.tmpdir.name
+        self.assertEqual(meta['dbxml'], os.path.join(d, 'output/database'))
+        self.assertIs(meta['write-xml-db'], False)
+        self.assertEqual(meta['scenario'], 'Reference')
+        self.assertEqual(meta['stop-period'], -1)
+        self.assertEqual(meta['inputs'], [os.path.join(d, 'input/modeltime.xml'),
+                                          os.path.join(d, 'input/socio.xml')])
+
+        # The second read comes from the cache, but callers get their own copy.
+        meta['inputs'].append('extra.xml')
+        with mock.patch('xml.etree.ElementTree.iterparse') as iterparse:
+            meta2 = util.read_gcam_config(self.files['config.xml'])
+        iterparse.assert_not_called()
+        self.assertEqual(len(meta2['inputs']), 2)
+
+        gcam = GcamComponent({})
+        gcam.addparam('exe', self.files['gcam.exe'])
+        gcam.addparam('config', self.files['config.xml'])
+        gcam.addparam('logconfig', self.files['log_conf.xml'])
+        gcam.finalize_parsing()
+        self.assertRaises(RuntimeError, gcam.run_component)
+
+    def testProgress(self):
+        """Test that progress lines and resource usage are recorded."""
+        self.runGcam(logfile=os.path.join(self.tmpdir.name, 'gcam.log'))
+        progress = self.gcam.fetch('gcam-progress')
+        self.assertTrue(progress.done)
+        self.assertEqual([(p, y) for (t, p, y) in progress.events], [(1, 2005), (2, 2010)])
+        self.assertTrue(progress.wait_for(2))
+        self.assertFalse(progress.wait_for(3))
+        self.assertIn('peak_rss', self.rslt['resources'])
+        with open(os.path.join(self.tmpdir.name, 'gcam.log')) as f:
+            self.assertEqual(f.read(), 'Period 1: 2005\nPeriod 2: 2010\n')
+
+    def testTimeout(self):
+        """Test that a GCAM run that exceeds its time limit is killed."""
+        os.environ['SLEEP'] = '10'
+        with self.assertLogs(level='ERROR'):
+            self.runGcam(status=2, timeout='0.5', logfile=os.devnull)
+
+    def testBadOutput(self):
+        """Test that undecodable output is logged and an unwritable log fails the run promptly."""
+        sup = ProcessSupervisor(['sh', '-c', r'printf "\377\376\n"; echo "Period 3: 2015"'],
+                                logfile=os.path.join(self.tmpdir.name, 'bad.log'),
+                                progress_pattern=r'Period\s+(\d+)\s*:\s*(\d+)', timeout=10)
+        self.assertEqual(sup.run(), 0)
+        self.assertEqual(sup.progress.period, 3)
+
+        sup = ProcessSupervisor([self.files['gcam.exe']], cwd=self.tmpdir.name,
+                                logfile=os.path.join(self.tmpdir.name, 'nodir', 'gcam.log'))
+        self.assertRaises(OSError, sup.run)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'runs')))
+
+    def testCheckpoint(self):
+        """Test that GCAM checks its inputs even when checkpointing is on."""
+        checkpoint.configure({'checkpoint_dir': os.path.join(self.tmpdir.name, 'checkpoints')})
+        try:
+            self.assertEqual(self.runGcam(), 1)
+            with open(self.files['input/socio.xml'], 'w') as f:
+                f.write('<c/>')
+            self.assertEqual(self.runGcam(), 2)
+            self.assertFalse(self.gcam.restored)
+        finally:
+            checkpoint.configure({})
+
+    def testNoClobber(self):
+        """Test that existing outputs are kept when clobber is off."""
+        self.assertEqual(self.runGcam(), 1)
+        with open(self.files['input/socio.xml'], 'w') as f:
+            f.write('<c/>')
+        self.assertEqual(self.runGcam(clobber='False'), 1)
+
+    def testDbOffKeepsResults(self):
+        """Test that a config with the database output off fails without removing existing results."""
+        self.assertEqual(self.runGcam(), 1)
+        with open(self.files['config.xml'], 'w') as f:
+            f.write(CONFIG.replace('"write-xml-db">1', '"write-xml-db">0'))
+        with self.assertLogs(level='ERROR'):
+            self.runGcam(status=2)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, 'output/database')))
+
+
+if __name__ == '__main__':
+    unittest.main()
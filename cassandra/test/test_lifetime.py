@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Test that results are released once all of their declared consumers have
+fetched them, and that capability usage is reported.
+"""
+
+from cassandra.components import DummyComponent, track_consumers, capability_report
+import unittest
+
+
+class TestLifetime(unittest.TestCase):
+    def setUp(self):
+        capability_table = {}
+        self.components = []
+        for name, reqs in [('Alice', 'Carol'), ('Bob', 'Carol'), ('Carol', '')]:
+            comp = DummyComponent(capability_table)
+            comp.addparam('name', name)
+            comp.addparam('capability_reqs', reqs)
+            comp.addparam('request_delays', '0' if reqs else '')
+            comp.addparam('finish_delay', '10')
+            self.components.append(comp)
+        (self.alice, self.bob, self.carol) = self.components
+
+    def run_all(self):
+        for comp in self.components:
+            comp.finalize_parsing()
+        track_consumers(self.components)
+        threads = [comp.run() for comp in self.components]
+        for thread in threads:
+            thread.join()
+        for comp in self.components:
+            self.assertEqual(comp.status, 1)
+
+    def testRelease(self):
+        """Test that a result is released after all declared consumers fetch it."""
+        self.alice.addparam('consumes', 'Carol')
+        self.bob.addparam('consumes', 'Carol')
+        self.run_all()
+
+        self.assertNotIn('Carol', self.carol.results)
+        self.assertIn('Alice', self.alice.results)
+        self.assertRaises(RuntimeError, self.alice.fetch, 'Carol')
+
+        report = {r['capability']: r for r in capability_report(self.components)}
+        self.assertEqual(report['Carol']['fetches'], 2)
+        self.assertTrue(report['Carol']['released'])
+        self.assertFalse(report['Alice']['released'])
+
+    def testNoDeclaration(self):
+        """Test that results without declared consumers are kept."""
+        self.run_all()
+        self.assertIn('Carol', self.carol.results)
+        self.assertEqual(self.alice.fetch('Carol'), self.carol.results['Carol'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Test the live status monitor."""
+
+from cassandra.components import DummyComponent
+from cassandra.monitor import Monitor
+import json
+import os
+import tempfile
+import time
+import unittest
+import urllib.request
+
+
+class TestMonitor(unittest.TestCase):
+    def setUp(self):
+        capability_table = {}
+        self.alice = DummyComponent(capability_table)
+        self.alice.addparam('name', 'Alice')
+        self.alice.addparam('finish_delay', '500')
+        self.bob = DummyComponent(capability_table)
+        self.bob.addparam('name', 'Bob')
+        self.bob.addparam('capability_reqs', 'Alice')
+        self.bob.addparam('request_delays', '0')
+        self.bob.addparam('finish_delay', '0')
+        self.components = [self.alice, self.bob]
+        for comp in self.components:
+            comp.finalize_parsing()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testMonitor(self):
+        """Test the status file and the HTTP server while components are running."""
+        filename = os.path.join(self.tmpdir.name, 'status.json')
+        monitor = Monitor.from_params(self.components, {'monitor_file': filename,
+                                                        'monitor_port': '0',
+                                                        'monitor_interval': '0.05'})
+        self.assertIsNone(Monitor.from_params(self.components, {}))
+
+        monitor.start()
+        threads = [comp.run() for comp in self.components]
+        time.sleep(0.2)
+
+        # The server was started on an ephemeral port (port 0)
+        url = f'http://127.0.0.1:{monitor.server.server_port}/'
+        with urllib.request.urlopen(url) as response:
+            status = json.load(response)
+        self.assertEqual([c['status'] for c in status['components']], [0, 0])
+        self.assertEqual(status['running'], 2)
+        self.assertEqual(status['blocked'], 1)
+        bob = status['components'][1]
+        self.assertEqual(bob['waiting_on'], 'Alice')
+        self.assertGreater(bob['waiting_for'], 0.1)
+        self.assertGreater(status['rss'], 0)
+
+        for thread in threads:
+            thread.join()
+        monitor.stop()
+
+        with open(filename) as f:
+            final = json.load(f)
+        self.assertEqual([c['status'] for c in final['components']], [1, 1])
+        self.assertEqual(final['blocked'], 0)
+        self.assertNotIn('rab', final)
+
+
+if __name__ == '__main__':
+    unittest.main()
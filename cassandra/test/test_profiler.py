@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Test the sampling profiler."""
+
+from cassandra.components import DummyComponent
+from cassandra.profiler import SamplingProfiler
+import os
+import tempfile
+import unittest
+
+
+class TestProfiler(unittest.TestCase):
+    def testProfile(self):
+        """Test that samples are attributed to the components' threads."""
+        capability_table = {}
+        alice = DummyComponent(capability_table)
+        alice.addparam('name', 'Alice')
+        alice.addparam('finish_delay', '300')
+        bob = DummyComponent(capability_table)
+        bob.addparam('name', 'Bob')
+        bob.addparam('capability_reqs', 'Alice')
+        bob.addparam('request_delays', '0')
+        bob.addparam('finish_delay', '0')
+        alice.label = 'DummyComponent.Alice'
+        bob.label = 'DummyComponent.Bob'
+        components = [alice, bob]
+        for comp in components:
+            comp.finalize_parsing()
+
+        profiler = SamplingProfiler(components, interval=5)
+        profiler.start()
+        threads = [comp.run() for comp in components]
+        for thread in threads:
+            thread.join()
+        profiler.stop()
+
+        self.assertGreater(profiler.nsample, 10)
+        self.assertEqual(set(profiler.stacks), {'DummyComponent.Alice', 'DummyComponent.Bob'})
+        # Alice is sleeping in run_component; Bob is waiting in fetch.
+        alice_top = profiler.stacks['DummyComponent.Alice'].most_common(1)[0][0]
+        bob_top = profiler.stacks['DummyComponent.Bob'].most_common(1)[0][0]
+        self.assertIn('run_component_wrapper', alice_top)
+        self.assertTrue(alice_top.split(';')[-1].startswith('run_component'))
+        self.assertIn(';fetch (components.py', bob_top)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filenames = profiler.write(tmpdir)
+            self.assertEqual(sorted(os.path.basename(f) for f in filenames),
+                             ['profile-DummyComponent.Alice.folded', 'profile-DummyComponent.Bob.folded'])
+            with open(filenames[0]) as f:
+                stack, count = f.readline().rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
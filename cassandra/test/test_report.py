@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Test the end-of-run resource report."""
+
+from cassandra.cassandra_main import main
+import json
+import os
+import tempfile
+import unittest
+
+CONFIG = """
+[Global]
+ModelInterface = ModelInterface.jar
+DBXMLlib = lib
+rgnconfig = rgn32
+
+[DummyComponent.1]
+name = Alice
+finish_delay = 200
+
+[DummyComponent.2]
+name = Bob
+capability_reqs = Alice
+request_delays = 0
+finish_delay = 10
+"""
+
+
+class TestReport(unittest.TestCase):
+    def testReport(self):
+        """Test that the resource report is written to the log directory."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cfgfile = os.path.join(tmpdir, 'test.cfg')
+            with open(cfgfile, 'w') as f:
+                f.write(CONFIG)
+            args = {'ctlfile': cfgfile, 'mp': False, 'logdir': tmpdir,
+                    'verbose': False, 'quiet': True}
+            self.assertEqual(main(args), 0)
+
+            with open(os.path.join(tmpdir, 'resources.json')) as f:
+                report = json.load(f)
+
+        components = {c['component']: c for c in report['components']}
+        self.assertEqual(set(components), {'Global', 'DummyComponent.1', 'DummyComponent.2'})
+        alice = components['DummyComponent.1']
+        bob = components['DummyComponent.2']
+
+        for entry in components.values():
+            self.assertEqual(entry['status'], 1)
+            self.assertGreaterEqual(entry['cpu_time'], 0)
+        self.assertGreater(alice['wall_time'], 0.15)
+        self.assertEqual(alice['blocked_time'], 0)
+        # Bob waits for Alice to finish before he can fetch her results.
+        self.assertGreater(bob['blocked_time'], 0.1)
+        self.assertLess(bob['cpu_time'], bob['wall_time'])
+        self.assertEqual(bob['bytes_fetched_remote'], 0)
+
+        self.assertIn('Alice', [c['capability'] for c in report['capabilities']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Test the R session utilities.  These tests don't require R.
+"""
+
+from cassandra.components import FldgenComponent
+from cassandra.rutil import RSession, r_matrices_to_array, split_task, merge_results, \
+    read_emulator_metadata, write_emulator_metadata
+import numpy as np
+import os
+import tempfile
+import threading
+import unittest
+
+
+class TestRSession(unittest.TestCase):
+    def testSingleThread(self):
+        """Test that all calls run on the same dedicated thread."""
+        session = RSession.get()
+        self.assertIs(RSession.get(), session)
+
+        names = set()
+        threads = [threading.Thread(target=lambda: names.add(session.call(lambda: threading.current_thread().name)))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(names), 1)
+        self.assertNotEqual(names.pop(), threading.current_thread().name)
+
+    def testException(self):
+        """Test that exceptions raised on the R thread reach the caller."""
+        def fail():
+            raise ValueError('R error')
+        self.assertRaises(ValueError, RSession.get().call, fail)
+
+
+class TestConversion(unittest.TestCase):
+    def testStack(self):
+        """Test stacking and transposing matrices stored in R's column-major order."""
+        # Stand-ins for R matrices: (time x grid cell), column-major
+        mats = [np.asfortranarray(np.random.rand(12, 5)) for i in range(3)]
+        out = r_matrices_to_array(mats)
+
+        self.assertEqual(out.shape, (3, 5, 12))
+        self.assertEqual(out.dtype, np.float32)
+        self.assertTrue(out.flags['C_CONTIGUOUS'])
+        for i, mat in enumerate(mats):
+            np.testing.assert_array_equal(out[i], mat.T.astype(np.float32))
+
+    def testMismatch(self):
+        """Test that matrices of different shapes are rejected."""
+        mats = [np.zeros((12, 5)), np.zeros((12, 4))]
+        self.assertRaises(ValueError, r_matrices_to_array, mats)
+
+
+class TestChunks(unittest.TestCase):
+    def testSplit(self):
+        """Test that chunks cover the realizations and get reproducible, distinct seeds."""
+        task = {'ngrids': 10, 'RNGseed': 8675309, 'emulator': 'emu.rds'}
+        chunks = split_task(task, 4)
+        self.assertEqual([c['ngrids'] for c in chunks], [4, 4, 2])
+        seeds = [c['RNGseed'] for c in chunks]
+        self.assertEqual(len(set(seeds)), 3)
+        self.assertEqual(seeds, [c['RNGseed'] for c in split_task(task, 4)])
+        self.assertTrue(all(0 <= s < 2**31 for s in seeds))
+        self.assertEqual(task['ngrids'], 10)
+
+        # A task that fits in one chunk is unchanged
+        self.assertEqual(split_task(task, 10), [task])
+
+    def testBadChunksize(self):
+        """Test that the fldgen component rejects chunk sizes less than 1."""
+        fldgen = FldgenComponent({})
+        for key, val in [('loadpkgs', 'False'), ('ngrids', '4'), ('startyr', '2006'), ('chunksize', '0')]:
+            fldgen.addparam(key, val)
+        self.assertRaises(RuntimeError, fldgen.finalize_parsing)
+
+    def testMerge(self):
+        """Test that chunk results are merged in realization order."""
+        results = [{'tas': np.full((n, 3, 2), float(i)), 'pr': np.full((n, 3, 2), -float(i)),
+                    'coords': i} for i, n in enumerate([2, 2, 1])]
+        merged = merge_results(results)
+        self.assertEqual(merged['tas'].shape, (5, 3, 2))
+        self.assertEqual(list(merged['tas'][:, 0, 0]), [0, 0, 1, 1, 2])
+        self.assertEqual(list(merged['pr'][:, 0, 0]), [0, 0, -1, -1, -2])
+        self.assertEqual(merged['coords'], 0)
+
+
+class TestEmulatorMetadata(unittest.TestCase):
+    def testSidecar(self):
+        """Test writing and reading emulator metadata, and invalidation when the emulator changes."""
+        coords = np.array([[-45.0, 10.0], [45.0, 10.0], [45.0, 20.0]])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            emufile = os.path.join(tmpdir, 'emu.rds')
+            with open(emufile, 'wb') as emu:
+                emu.write(b'not really an emulator')
+            self.assertIsNone(read_emulator_metadata(emufile))
+
+            grid = {var: {'ncell': 3, 'nlat': None, 'nlon': None} for var in ['tas', 'pr']}
+            write_emulator_metadata(emufile, {'nyear': 95, 'grid': grid,
+                                              'coords': {'tas': coords, 'pr': coords}})
+            meta = read_emulator_metadata(emufile)
+            self.assertEqual(meta['nyear'], 95)
+            self.assertEqual(meta['grid'], grid)
+            np.testing.assert_array_equal(meta['coords']['pr'], coords)
+
+            with open(emufile, 'wb') as emu:
+                emu.write(b'a different emulator')
+            os.utime(emufile, ns=(0, 0))
+            self.assertIsNone(read_emulator_metadata(emufile))
+
+
+if __name__ == '__main__':
+    unittest.main()
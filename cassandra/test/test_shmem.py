@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Tests for publishing arrays in shared memory.  These tests don't require MPI."""
+
+from cassandra import shmem
+import multiprocessing as mp
+import numpy as np
+import os
+import pickle
+import tempfile
+import unittest
+import weakref
+
+
+def checksum_in_child(handle):
+    """Attach to a published array in another process and sum it."""
+    return float(shmem.attach(handle).sum())
+
+
+class TestShmem(unittest.TestCase):
+    def setUp(self):
+        self.publisher = shmem.SharedArrayPublisher()
+
+    def tearDown(self):
+        self.publisher.close()
+
+    def testShareable(self):
+        self.assertTrue(shmem.shareable(np.zeros(100), 800))
+        self.assertFalse(shmem.shareable(np.zeros(10), 800))
+        self.assertFalse(shmem.shareable(np.empty(1000, dtype=object), 800))
+        self.assertFalse(shmem.shareable([0.0] * 1000, 800))
+
+    def testPublish(self):
+        """Test that a published array can be mapped in another process."""
+        data = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+        handle = self.publisher.publish('cap', data)
+        self.assertEqual(handle.kind, 'shm')
+        self.assertIs(self.publisher.publish('cap', data), handle)
+
+        handle = pickle.loads(pickle.dumps(handle))
+        mapped = shmem.attach(handle)
+        np.testing.assert_array_equal(mapped, data)
+        self.assertFalse(mapped.flags.writeable)
+
+        with mp.get_context('spawn').Pool(1) as pool:
+            self.assertEqual(pool.apply(checksum_in_child, (handle,)), float(data.sum()))
+
+        # The segment is unlinked once both handles given out are reported
+        # mapped, and the maps remain valid after that.
+        self.publisher.done(handle.name)
+        shmem.attach(handle)
+        self.publisher.done(handle.name)
+        self.assertRaises(FileNotFoundError, shmem.attach, handle)
+        np.testing.assert_array_equal(mapped, data)
+
+    def testRelease(self):
+        """Test that the publisher doesn't keep published arrays alive."""
+        data = np.arange(100.0)
+        ref = weakref.ref(data)
+        handle = self.publisher.publish('cap', data)
+        del data
+        self.assertIsNone(ref())
+        # Publishing a new array under the same key gets a new segment, and
+        # the old one remains until its consumer reports it mapped.
+        handle2 = self.publisher.publish('cap', np.arange(100.0))
+        self.assertNotEqual(handle.name, handle2.name)
+        np.testing.assert_array_equal(shmem.attach(handle), np.arange(100.0))
+        self.publisher.done(handle.name)
+        self.assertRaises(FileNotFoundError, shmem.attach, handle)
+
+    def testMemmap(self):
+        """Test that memory-mapped arrays are published by file name."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'cap.npy')
+            np.save(filename, np.arange(10.0))
+            data = np.load(filename, mmap_mode='r')
+            handle = self.publisher.publish('cap', data)
+            self.assertEqual(handle.kind, 'file')
+
+            # The published file survives the removal of the original (e.g.,
+            # when the result store releases the result) until it's mapped.
+            os.remove(filename)
+            np.testing.assert_array_equal(shmem.attach(handle), data)
+            self.publisher.done(handle.name)
+            self.assertFalse(os.path.exists(handle.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Tests for the result stores."""
+
+from cassandra import store
+from cassandra.components import DummyComponent
+import numpy as np
+import os
+import tempfile
+import unittest
+
+
+class TestMemmapStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = store.MemmapStore(self.tmpdir.name, threshold=1000)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testSpill(self):
+        """Test that large arrays are spilled and small ones are not."""
+        big = np.arange(1000, dtype=np.float64)
+        small = np.arange(10, dtype=np.float64)
+        self.store['big'] = big
+        self.store['small'] = small
+        self.store['other'] = 'not an array'
+
+        self.assertIsInstance(self.store['big'], np.memmap)
+        self.assertFalse(self.store['big'].flags.writeable)
+        np.testing.assert_array_equal(self.store['big'], big)
+        self.assertIs(self.store['small'], small)
+        self.assertEqual(self.store.nbytes('big'), 0)
+        self.assertEqual(self.store.nbytes('small'), small.nbytes)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 1)
+
+    def testRelease(self):
+        """Test that spill files are removed when results are replaced or released."""
+        self.store['a/b'] = np.zeros(1000)
+        self.store['a/b'] = np.ones(1000)
+        self.assertEqual(len(os.listdir(self.tmpdir.name)), 1)
+        mapped = self.store['a/b']
+        self.store.release('a/b')
+        self.assertNotIn('a/b', self.store)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+        # Maps already handed out are still valid
+        self.assertEqual(mapped.sum(), 1000)
+
+    def testConfigure(self):
+        """Test that components pick up the configured store type."""
+        try:
+            store.configure({'result_store': 'memmap', 'spill_threshold': '1e3',
+                             'scratchdir': self.tmpdir.name})
+            comp = DummyComponent({})
+            self.assertIsInstance(comp.results, store.MemmapStore)
+            self.assertEqual(comp.results.threshold, 1000)
+            self.assertRaises(RuntimeError, store.configure, {'result_store': 'nosuchstore'})
+        finally:
+            store.configure({})
+        self.assertIsInstance(DummyComponent({}).results, store.ResultStore)
+
+
+class TestLazyResult(unittest.TestCase):
+    def testMaterialize(self):
+        """Test that lazy results are computed once, on first fetch."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return np.arange(5)
+
+        comp = DummyComponent({})
+        comp.addparam('name', 'Alice')
+        comp.addparam('finish_delay', '0')
+        comp.finalize_parsing()
+        other = DummyComponent(comp.cap_tbl)
+
+        comp.addresults('Alice', store.LazyResult(compute), early=True)
+        self.assertEqual(calls, [])
+        self.assertIsInstance(comp.results['Alice'], store.LazyResult)
+
+        np.testing.assert_array_equal(other.fetch('Alice'), np.arange(5))
+        np.testing.assert_array_equal(other.fetch('Alice', np.s_[1:3]), [1, 2])
+        self.assertEqual(calls, [1])
+        self.assertIsInstance(comp.results['Alice'], np.ndarray)
+        self.assertEqual(comp.peak_bytes['Alice'], np.arange(5).nbytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Test the timing trace of a run."""
+
+from cassandra import tracing
+from cassandra.cassandra_main import main
+import json
+import os
+import tempfile
+import unittest
+
+CONFIG = """
+[Global]
+ModelInterface = ModelInterface.jar
+DBXMLlib = lib
+rgnconfig = rgn32
+
+[DummyComponent.1]
+name = Alice
+finish_delay = 100
+
+[DummyComponent.2]
+name = Bob
+capability_reqs = Alice
+request_delays = 0
+finish_delay = 10
+"""
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        tracing.clear()
+
+    def tearDown(self):
+        tracing.enable(False)
+        tracing.clear()
+        self.tmpdir.cleanup()
+
+    def run_main(self, trace):
+        cfgfile = os.path.join(self.tmpdir.name, 'test.cfg')
+        with open(cfgfile, 'w') as f:
+            f.write(CONFIG)
+        args = {'ctlfile': cfgfile, 'mp': False, 'logdir': self.tmpdir.name,
+                'verbose': False, 'quiet': True, 'trace': trace}
+        self.assertEqual(main(args), 0)
+
+    def testTrace(self):
+        """Test that components, fetches, and startup are traced."""
+        tracefile = os.path.join(self.tmpdir.name, 'trace.json')
+        self.run_main(tracefile)
+
+        with open(tracefile) as f:
+            events = json.load(f)['traceEvents']
+        spans = {e['name']: e for e in events if e['ph'] == 'X'}
+        threads = {e['tid']: e['args']['name'] for e in events if e['name'] == 'thread_name'}
+
+        for name in ['bootstrap', 'parse config', 'create components', 'Global',
+                     'DummyComponent.1', 'DummyComponent.2', 'fetch Alice']:
+            self.assertIn(name, spans)
+        self.assertEqual(spans['DummyComponent.1']['args']['status'], 1)
+        self.assertEqual(threads[spans['DummyComponent.1']['tid']], 'DummyComponent.1')
+
+        # Bob is blocked until Alice finishes, in Bob's thread
+        fetch = spans['fetch Alice']
+        self.assertEqual(fetch['tid'], spans['DummyComponent.2']['tid'])
+        self.assertGreater(fetch['dur'], 50e3)
+        self.assertGreaterEqual(fetch['ts'] + fetch['dur'],
+                                spans['DummyComponent.1']['ts'] + spans['DummyComponent.1']['dur'])
+
+    def testDisabled(self):
+        """Test that nothing is recorded unless tracing is requested."""
+        self.run_main(None)
+        self.assertFalse(tracing.enabled())
+        self.assertEqual([e for e in tracing.trace_events() if e['ph'] != 'M'], [])
+
+    def testMerge(self):
+        """Test merging the traces from several ranks."""
+        tracing.enable()
+        filenames = []
+        for rank in range(2):
+            tracing.clear()
+            tracing.set_process(rank)
+            with tracing.span('work', 'test', rank=rank) as info:
+                info['bytes'] = 10
+            filenames.append(tracing.rank_filename(os.path.join(self.tmpdir.name, 'trace.json'), rank))
+            tracing.write(filenames[-1])
+        tracing.set_process(0)
+        self.assertTrue(filenames[1].endswith('trace-1.json'))
+
+        merged = os.path.join(self.tmpdir.name, 'merged.json')
+        tracing.merge(merged, filenames)
+        with open(merged) as f:
+            events = json.load(f)['traceEvents']
+        work = [e for e in events if e['name'] == 'work']
+        self.assertEqual(sorted(e['pid'] for e in work), [0, 1])
+        self.assertEqual(work[0]['args']['bytes'], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
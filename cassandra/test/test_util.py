@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+Test the csv readers and other helpers in the util module.
+"""
+
+from cassandra import util
+import numpy as np
+import pandas as pd
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+
+GCAM_CSV = '''Primary Energy Consumption by region
+scenario,region,fuel,1990,2005,2010,Units,
+"Reference,date=2019-2-14T10:51:09-05:00",USA,a oil,1.5,2.5,3.5,EJ,
+"Reference,date=2019-2-14T10:51:09-05:00",China,b coal,4,5,6,EJ,
+"Policy,date=2019-2-14T11:02:44-05:00",USA,a oil,1,2,3,EJ,
+'''
+
+RGN_CSV = '''region, val1, val2,
+USA, 1.0, 2,
+ China , 3, 4,
+'''
+
+
+class TestCsv(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.gcamfile = os.path.join(self.tmpdir.name, 'query.csv')
+        with open(self.gcamfile, 'w') as f:
+            f.write(GCAM_CSV)
+        self.rgnfile = os.path.join(self.tmpdir.name, 'rgn.csv')
+        with open(self.rgnfile, 'w') as f:
+            f.write(RGN_CSV)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testReadGcamCsv(self):
+        """Test that the quoted scenario column and trailing commas are handled."""
+        df = util.read_gcam_csv(self.gcamfile)
+        self.assertEqual(list(df.columns),
+                         ['scenario', 'region', 'fuel', '1990', '2005', '2010', 'Units'])
+        self.assertEqual(list(df['scenario']), ['Reference', 'Reference', 'Policy'])
+        self.assertEqual(df['2005'].dtype, np.float64)
+        self.assertEqual(list(df['2010']), [3.5, 6.0, 3.0])
+
+        df = util.read_gcam_csv(self.gcamfile, scenario_name=False)
+        self.assertEqual(df['scenario'][0], 'Reference,date=2019-2-14T10:51:09-05:00')
+
+    def testIterGcamCsv(self):
+        """Test that the chunked reader returns the same table as the full reader."""
+        chunks = list(util.iter_gcam_csv(self.gcamfile, chunksize=2))
+        self.assertEqual([len(c) for c in chunks], [2, 1])
+        full = util.read_gcam_csv(self.gcamfile)
+        for chunk in chunks:
+            self.assertEqual(list(chunk.dtypes), list(full.dtypes))
+        self.assertEqual(list(chunks[1]['region']), ['USA'])
+
+    def testRdRgnTable(self):
+        """Test reading a region table with and without float conversion."""
+        table, order = util.rd_rgn_table(self.rgnfile)
+        self.assertEqual(order, ['USA', 'China'])
+        self.assertEqual(table['China'], [3.0, 4.0])
+
+        table, order = util.rd_rgn_table(self.rgnfile, fltconv=False)
+        self.assertEqual(table['USA'], ['1.0', '2'])
+
+
+class TestBackgroundWriter(unittest.TestCase):
+    def testWrite(self):
+        """Test that background writes complete in order and survive errors."""
+        data = np.arange(12, dtype=np.float32).reshape(3, 4)
+        order = []
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = util.BackgroundWriter.get()
+            writer.submit(util.save_array, os.path.join(tmpdir, 'plain'), data)
+            writer.submit(util.save_array, os.path.join(tmpdir, 'nodir', 'bad'), data)
+            writer.submit(util.save_array, os.path.join(tmpdir, 'packed'), data, True)
+            for i in range(5):
+                writer.submit(order.append, i)
+            writer.flush()
+
+            np.testing.assert_array_equal(np.load(os.path.join(tmpdir, 'plain.npy')), data)
+            with np.load(os.path.join(tmpdir, 'packed.npz')) as npz:
+                np.testing.assert_array_equal(npz['data'], data)
+            self.assertEqual(order, list(range(5)))
+            self.assertEqual(sorted(os.listdir(tmpdir)), ['packed.npz', 'plain.npy'])
+
+
+class TestSelect(unittest.TestCase):
+    def testSelect(self):
+        """Test selecting parts of capability data."""
+        arr = np.arange(24).reshape(2, 3, 4)
+        self.assertIs(util.select(arr, None), arr)
+        np.testing.assert_array_equal(util.select(arr, np.s_[1, :, 0:2]), arr[1, :, 0:2])
+        np.testing.assert_array_equal(util.select(arr, [1, 0]), arr[[1, 0]])
+        self.assertEqual(util.select(arr, np.sum), arr.sum())
+
+        grids = {'Domestic': arr, 'Irrigation': arr + 1}
+        self.assertIs(util.select(grids, 'Domestic'), arr)
+        np.testing.assert_array_equal(util.select(grids, ('Irrigation', np.s_[0])), arr[0] + 1)
+
+        lst = ['a', 'b', 'c']
+        self.assertEqual(util.select(lst, [2, 0]), ['c', 'a'])
+        self.assertEqual(util.select(lst, slice(1, None)), ['b', 'c'])
+
+        df = pd.DataFrame({'year': [2000, 2001, 2002], 'value': [1.0, 2.0, 3.0]})
+        self.assertEqual(list(util.select(df, df['year'] > 2000)['value']), [2.0, 3.0])
+
+
+class TestConfigCache(unittest.TestCase):
+    def testReadIni(self):
+        """Test that INI files are parsed once and reparsed when they change."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'model.ini')
+            with open(filename, 'w') as ini:
+                ini.write('[Project]\nRootDir = a\n')
+            cfg = util.read_ini(filename)
+            self.assertEqual(cfg['Project']['RootDir'], 'a')
+            self.assertIs(util.read_ini(filename), cfg)
+
+            with open(filename, 'w') as ini:
+                ini.write('[Project]\nRootDir = bb\n')
+            self.assertEqual(util.read_ini(filename)['Project']['RootDir'], 'bb')
+
+    def testPrefetch(self):
+        """Test that prefetches with the same key share one load."""
+        calls = []
+
+        def load(x):
+            calls.append(x)
+            return 2 * x
+
+        f1 = util.prefetch(('test-prefetch', 1), load, 21)
+        f2 = util.prefetch(('test-prefetch', 1), load, 21)
+        self.assertIs(f1, f2)
+        self.assertEqual(f1.result(), 42)
+        self.assertEqual(calls, [21])
+
+
+class TestReferenceCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.oldcache = os.environ.get('CASSANDRA_CACHE')
+        os.environ['CASSANDRA_CACHE'] = os.path.join(self.tmpdir.name, 'cache')
+        util.configure_reference_cache({'reference_cache': 'True'})
+        self.filename = os.path.join(self.tmpdir.name, 'coordinates.csv')
+        with open(self.filename, 'w') as csv:
+            csv.write('1,-179.75,89.75,1,1\n2,-179.25,89.75,2,1\n')
+
+    def tearDown(self):
+        util.configure_reference_cache({})
+        if self.oldcache is None:
+            del os.environ['CASSANDRA_CACHE']
+        else:
+            os.environ['CASSANDRA_CACHE'] = self.oldcache
+        self.tmpdir.cleanup()
+
+    def testCache(self):
+        """Test that reference tables are cached in memory and on disk, keyed by content."""
+        names = ['cell_id', 'lon', 'lat', 'lon_idx', 'lat_idx']
+        tbl = util.read_reference_table(self.filename, names=names)
+        self.assertEqual(list(tbl['lat']), [89.75, 89.75])
+        self.assertIs(util.read_reference_table(self.filename, names=names), tbl)
+
+        # A fresh process (simulated by clearing the in-memory cache) reads the disk cache
+        util._ref_cache.clear()
+        with unittest.mock.patch.object(util.pd, 'read_csv', side_effect=AssertionError):
+            cached = util.read_reference_table(self.filename, names=names)
+        pd.testing.assert_frame_equal(cached, tbl)
+
+        # Changing the file changes the key
+        with open(self.filename, 'w') as csv:
+            csv.write('1,0.25,0.25,1,1\n')
+        self.assertEqual(list(util.read_reference_table(self.filename, names=names)['lon']), [0.25])
+
+    def testCacheTypes(self):
+        """Test that string columns and non-string labels survive the disk cache."""
+        with open(self.filename, 'w') as csv:
+            csv.write('1,USA,Missouri\n2,Canada,\n')
+        for kwargs in [{'header': None}, {'names': ['id', 'region', 'basin']}]:
+            tbl = util.read_reference_table(self.filename, **kwargs)
+            util._ref_cache.clear()
+            with unittest.mock.patch.object(util.pd, 'read_csv', side_effect=AssertionError):
+                cached = util.read_reference_table(self.filename, **kwargs)
+            pd.testing.assert_frame_equal(cached, tbl)
+
+    def testNoDiskCache(self):
+        """Test that nothing is written to the cache directory unless the disk cache is on."""
+        util.configure_reference_cache({'reference_cache': 'False'})
+        self.assertIsNone(util.reference_cache_dir())
+        names = ['cell_id', 'lon', 'lat', 'lon_idx', 'lat_idx']
+        tbl = util.read_reference_table(self.filename, names=names)
+        self.assertIs(util.read_reference_table(self.filename, names=names), tbl)
+        npyfile = util.reference_npy(self.filename, delimiter=',')
+        self.assertTrue(os.path.exists(npyfile))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'cache')))
+
+        cachedir = os.path.join(self.tmpdir.name, 'elsewhere')
+        util.configure_reference_cache({'reference_cache': cachedir})
+        self.assertEqual(util.reference_cache_dir(), cachedir)
+
+        util.configure_reference_cache({'reference_cache': 'yes'})
+        self.assertEqual(util.reference_cache_dir(), os.path.join(self.tmpdir.name, 'cache', 'reference'))
+
+    def testNpy(self):
+        """Test that text grids are converted to .npy once and reconverted when they change."""
+        npyfile = util.reference_npy(self.filename, delimiter=',', skip_header=1)
+        self.assertEqual(os.path.dirname(npyfile), util.reference_cache_dir())
+        np.testing.assert_array_equal(np.load(npyfile), [2, -179.25, 89.75, 2, 1])
+
+        util._ref_cache.clear()
+        with unittest.mock.patch.object(util.np, 'genfromtxt', side_effect=AssertionError):
+            self.assertEqual(util.reference_npy(self.filename, delimiter=',', skip_header=1), npyfile)
+        self.assertNotEqual(util.reference_npy(self.filename, delimiter=','), npyfile)
+
+        with open(self.filename, 'w') as csv:
+            csv.write('1,0.25,0.25,1,1\n')
+        self.assertNotEqual(util.reference_npy(self.filename, delimiter=','), npyfile)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,9 @@ domain of the Xanthos package, not cassandra.
 """
 
 from cassandra.components import DummyComponent, XanthosComponent
+from cassandra import util
+import os
+import tempfile
 import unittest
 import numpy as np
 
@@ -23,6 +26,11 @@ class TestXanthos(unittest.TestCase):
         """Defines the XanthosComponent."""
         self.xanthos_root = 'cassandra/test/data/xanthos/'
 
+        # Run with the reference grids cached on disk, but keep the cache out
+        # of the user's home directory.
+        self.tmpdir = tempfile.TemporaryDirectory()
+        util.configure_reference_cache({'reference_cache': os.path.join(self.tmpdir.name, 'reference')})
+
         capability_table = {}
 
         self.Xanthos = XanthosComponent(capability_table)
@@ -38,6 +46,10 @@ class TestXanthos(unittest.TestCase):
         self.dummy.addcapability('gridded_pr_coord')
         self.dummy.addcapability('gridded_tas_coord')
 
+    def tearDown(self):
+        util.configure_reference_cache({})
+        self.tmpdir.cleanup()
+
     def testRun(self):
         """Test that Xanthos runs with input from a capability."""
         self.Xanthos.finalize_parsing()
@@ -57,6 +69,15 @@ class TestXanthos(unittest.TestCase):
 
         self.assertEqual(results.shape, (67420, 36))
 
+    def testReferenceGrids(self):
+        """Test that the reference grids are converted into the disk cache."""
+        self.Xanthos.finalize_parsing()
+        grids = self.Xanthos.reference_future.result()
+        self.assertEqual(set(grids), {'Area', 'Coord', 'BasinIDs', 'GCAMRegionIDs', 'CountryIDs'})
+        for npyfile in grids.values():
+            self.assertEqual(os.path.dirname(npyfile), util.reference_cache_dir())
+        self.assertEqual(np.load(grids['Coord']).shape, (67420, 5))
+
     def simulateClimateGen(self):
         """Simulate a climate data generating component.
 
@@ -0,0 +1,234 @@
+"""Timing instrumentation for the framework.
+
+Tracing records where a run spends its time: when each component runs, how
+long components spend blocked in fetch() waiting on each capability, how long
+the RAB spends queueing, serving, and sending requests (and how many bytes it
+sends), and how long the startup phases take.  It is off by default and turned
+on with the --trace option to cassandra_main.py, which names the file to write
+the trace to.  When tracing is off, the instrumentation costs a single test of
+a module variable per call.
+
+The trace is written in the Chrome trace event format, which can be viewed in
+Perfetto (https://ui.perfetto.dev) or chrome://tracing.  Each component's
+events appear on its own thread track, labeled with the component's section
+name from the configuration file.  In MP calculations each rank writes its
+own file, with the rank inserted before the extension (e.g., trace-3.json).
+Timestamps are taken from the wall clock, so the files from the ranks of a
+run can be combined with
+
+    python -m cassandra.tracing merged.json trace-*.json
+
+Each rank appears as a separate process in the merged trace.
+
+Functions:
+
+enable      - Turn on tracing.
+
+enabled     - Test whether tracing is on.
+
+set_process - Set the process id (the MPI rank) recorded in the trace.
+
+name_thread - Label the calling thread in the trace.
+
+span        - Context manager recording the time spent in a block of code.
+
+complete    - Record an event that has already finished.
+
+counter     - Record the value of a counter.
+
+write       - Write the trace to a file.
+
+merge       - Combine the traces from several ranks.
+
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+# Events are stored as tuples and converted to the trace format when they are
+# written.  list.append is atomic, so recording an event doesn't need a lock.
+_events = []
+_thread_names = {}
+_enabled = False
+_process = {'pid': 0, 'name': 'cassandra'}
+
+# Offset from the performance counter to the wall clock, so that timestamps
+# from different processes can be compared.
+_clock_offset = time.time() - time.perf_counter()
+
+
+def now():
+    """Current time in microseconds, as used in trace timestamps."""
+    return (time.perf_counter() + _clock_offset) * 1e6
+
+
+def enable(on=True):
+    """Turn tracing on (or off).
+
+    Events recorded before tracing is turned off are kept, so that they can
+    still be written.
+
+    """
+    global _enabled
+    _enabled = on
+
+
+def enabled():
+    """Test whether tracing is on."""
+    return _enabled
+
+
+def set_process(pid, name=None):
+    """Set the process id and name recorded in the trace.
+
+    :param pid: Process id.  In MP calculations this should be the MPI rank, so
+                that the traces from different ranks can be merged.
+    :param name: Label for the process (default: 'rank <pid>')
+
+    """
+    _process['pid'] = pid
+    _process['name'] = name if name is not None else f'rank {pid}'
+
+
+def name_thread(name):
+    """Label the calling thread in the trace."""
+    if _enabled:
+        _thread_names[threading.get_ident()] = name
+
+
+def complete(name, cat, start, args=None):
+    """Record an event that started at start and has just finished.
+
+    :param name: Name of the event
+    :param cat: Category of the event (e.g. 'component', 'fetch', 'rab')
+    :param start: Start time, as returned by now()
+    :param args: Optional dictionary of additional information about the
+                 event, shown when the event is selected in the viewer.
+
+    """
+    if _enabled:
+        _events.append(('X', name, cat, start, now() - start, threading.get_ident(), args))
+
+
+@contextlib.contextmanager
+def _span(name, cat, args):
+    start = now()
+    try:
+        yield args
+    finally:
+        complete(name, cat, start, args)
+
+
+class _NullSpan(object):
+    """Stand-in for a span when tracing is off."""
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def span(name, cat, **args):
+    """Record the time spent in a with block.
+
+    The value of the with statement is the event's args dictionary, which the
+    block can add to (e.g., with the number of bytes transferred).  When
+    tracing is off this does nothing.
+
+    Example:
+        with tracing.span('fetch', 'fetch', capability=capability) as info:
+            rslt = provider.fetch(capability)
+            info['bytes'] = rslt.nbytes
+
+    """
+    if not _enabled:
+        return _null_span
+    return _span(name, cat, args)
+
+
+def counter(name, values):
+    """Record the values of a counter (shown as a graph in the viewer).
+
+    :param name: Name of the counter
+    :param values: Dictionary of series name to value
+
+    """
+    if _enabled:
+        _events.append(('C', name, 'counter', now(), None, threading.get_ident(), values))
+
+
+def trace_events():
+    """Convert the recorded events to a list of trace event dictionaries."""
+    pid = _process['pid']
+    events = [{'ph': 'M', 'name': 'process_name', 'pid': pid, 'tid': 0,
+               'args': {'name': _process['name']}},
+              {'ph': 'M', 'name': 'process_sort_index', 'pid': pid, 'tid': 0,
+               'args': {'sort_index': pid}}]
+    for tid, name in list(_thread_names.items()):
+        events.append({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': tid,
+                       'args': {'name': name}})
+
+    for (ph, name, cat, ts, dur, tid, args) in list(_events):
+        event = {'ph': ph, 'name': name, 'cat': cat, 'ts': ts, 'pid': pid, 'tid': tid}
+        if dur is not None:
+            event['dur'] = dur
+        if args:
+            event['args'] = args
+        events.append(event)
+    return events
+
+
+def rank_filename(filename, rank):
+    """Insert a rank number before a file's extension (trace.json -> trace-3.json)."""
+    root, ext = os.path.splitext(filename)
+    return f'{root}-{rank}{ext}'
+
+
+def write(filename):
+    """Write the trace to a file.
+
+    :param filename: Name of the file to write.  Directories are created as
+                     needed.
+
+    """
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    with open(filename, 'w') as outfile:
+        json.dump({'traceEvents': trace_events(), 'displayTimeUnit': 'ms'}, outfile,
+                  default=str)
+
+
+def merge(outfilename, infilenames):
+    """Combine the traces from several ranks into a single trace.
+
+    :param outfilename: Name of the merged trace file
+    :param infilenames: Names of the trace files to merge
+
+    """
+    events = []
+    for filename in infilenames:
+        with open(filename, 'r') as infile:
+            events += json.load(infile)['traceEvents']
+    with open(outfilename, 'w') as outfile:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, outfile)
+
+
+def clear():
+    """Discard the recorded events."""
+    del _events[:]
+    _thread_names.clear()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit('usage: python -m cassandra.tracing <merged-file> <tracefile> [<tracefile> ...]')
+    merge(sys.argv[1], sys.argv[2:])
@@ -3,11 +3,17 @@
 import os
 import os.path
 import re
-import string
+import csv
+import copy
 import subprocess
 import tempfile
 import random
+import threading
+import queue
+import atexit
 import logging
+import numpy as np
+import pandas as pd
 
 # utility functions used in other gcam python code
 
@@ -21,11 +27,25 @@ global_params = None
 # Often we will have to parse values from a config file that are
 # meant to indicate a boolean value.  We list here the strings that
 # are considered false; everything else is considered true.
+_falsevals = ["False", "false", "FALSE", "F", "f", "No", "NO", "N",
+              "no", "0"]
+_truevals = ["True", "true", "TRUE", "T", "t", "Yes", "YES", "Y",
+             "yes", "1"]
+
+
 def parseTFstring(val):
     """Parse synonyms for "True" and "False" retrieved from the config file."""
-    falsevals = ["False", "false", "FALSE", "F", "f", "No", "NO", "N",
-                 "no", "0"]
-    return val.lstrip().rstrip() not in falsevals
+    return val.lstrip().rstrip() not in _falsevals
+
+
+def isTFstring(val):
+    """Test whether a value from the config file is one of the synonyms for "True" or "False".
+
+    This is for parameters that take either a flag or some other value (e.g.,
+    a directory name).
+
+    """
+    return val.strip() in _falsevals + _truevals
 
 
 def rd_rgn_table(filename, skip=1, fltconv=True):
@@ -49,30 +69,121 @@ def rd_rgn_table(filename, skip=1, fltconv=True):
 
     """
 
-    table = {}
-    order = []
-    with open(filename, "r") as file:
+    df = pd.read_csv(filename, skiprows=skip, header=None, dtype=str,
+                     skipinitialspace=True, keep_default_na=False)
+    df = _drop_trailing_empty(df)
+
+    order = [rgn.strip() for rgn in df.iloc[:, 0]]
+    if fltconv:
+        data = df.iloc[:, 1:].to_numpy(dtype=float)
+    else:
+        data = df.iloc[:, 1:].apply(lambda col: col.str.strip()).to_numpy()
+
+    if data.shape[1] == 1:
+        # grab the lone value from each row
+        values = data[:, 0].tolist()
+    else:
+        values = data.tolist()
+
+    table = dict(zip(order, values))
+    return (table, order)
+
+
+def _drop_trailing_empty(df):
+    """Drop trailing columns that are entirely empty.
+
+    GCAM and ModelInterface outputs frequently end every line with a comma,
+    which shows up as an extra column with no data in it.
+
+    """
+    while df.shape[1] > 1:
+        last = df.iloc[:, -1]
+        if last.isna().all() or (last.astype(str).str.strip() == '').all():
+            df = df.iloc[:, :-1]
+        else:
+            break
+    return df
+
+
+# Column names in ModelInterface output that are years (private, used in
+# read_gcam_csv)
+_yearcol = re.compile(r'^\s*\d{4}\s*$')
+# Trailing date stamp that ModelInterface appends to scenario names
+_scendate = re.compile(r',\s*date=.*$')
+
+
+def _gcam_csv_args(filename, skip):
+    """Work out the read_csv arguments for a ModelInterface csv file.
+
+    We read just the header line so that we can assign dtypes to all of the
+    columns up front, which lets pandas parse the whole file in a single pass.
+
+    """
+    with open(filename, 'r', newline='') as file:
         for sk in range(skip):
             file.readline()
+        header = next(csv.reader([file.readline()], skipinitialspace=True))
 
-        for line in file:
-            line = rm_trailing_comma(line)
-            toks = line.split(',')
-            rgn = string.lstrip(string.rstrip(toks[0]))
-            data = toks[1:]
-            if fltconv:
-                data = map(float, data)
-            else:
-                # Remove leading and trailing whitespace
-                data = map(string.lstrip, data)
-                data = map(string.rstrip, data)
-            if len(data) == 1:
-                data = data[0]  # grab the lone value from the list.
+    # Strip the empty trailing column(s) created by trailing commas.
+    while header and header[-1].strip() == '':
+        header.pop()
+    header = [h.strip() for h in header]
 
-            order.append(rgn)
-            table[rgn] = data
+    dtypes = {h: (np.float64 if _yearcol.match(h) else str) for h in header}
 
-    return (table, order)
+    return dict(skiprows=skip+1, header=None, names=header,
+                usecols=range(len(header)), dtype=dtypes,
+                skipinitialspace=True, quotechar='"')
+
+
+def _clean_gcam_chunk(df, scenario_name):
+    """Post-process a chunk of ModelInterface output (private)."""
+    if scenario_name and 'scenario' in df.columns:
+        df['scenario'] = df['scenario'].str.replace(_scendate, '', regex=True)
+    return df
+
+
+def read_gcam_csv(filename, skip=1, scenario_name=True):
+    """Read a csv table produced by a GCAM ModelInterface query.
+
+    ModelInterface output starts with a title line, followed by a header
+    line, followed by the data.  The first data column is usually the
+    scenario name, which contains a quoted comma (e.g.,
+    "Reference,date=2019-2-14T10:51:09-05:00"), and every line typically ends
+    with a trailing comma.  Both are handled by the csv parser directly, so
+    unlike scenariofix() and rm_trailing_comma() there is no per-line regex
+    pass.
+
+    Arguments:
+         filename - name of the file to read
+             skip - number of lines preceding the header line (default = 1,
+                    the query title line)
+    scenario_name - flag: True = strip the date stamp from the scenario
+                    column, leaving just the scenario name (DEFAULT);
+                    False = leave the scenario column as-is
+
+    Return value: pandas DataFrame.  Columns whose names are years are
+                  float64; all other columns are strings.
+
+    """
+    args = _gcam_csv_args(filename, skip)
+    df = pd.read_csv(filename, **args)
+    return _clean_gcam_chunk(df, scenario_name)
+
+
+def iter_gcam_csv(filename, chunksize=100000, skip=1, scenario_name=True):
+    """Iterate over a ModelInterface csv table in chunks.
+
+    This is the same as read_gcam_csv(), except that the table is returned
+    as a sequence of DataFrames of (at most) chunksize rows each, so that very
+    large query outputs can be processed without holding the whole table in
+    memory.  Every chunk has the same columns and dtypes.
+
+    """
+    args = _gcam_csv_args(filename, skip)
+    with pd.read_csv(filename, chunksize=chunksize, **args) as reader:
+        for chunk in reader:
+            yield _clean_gcam_chunk(chunk, scenario_name)
 
 
 # Regular expression for detecting a scenario name (private, used in scenariofix)
@@ -343,3 +454,711 @@ def mkdir_if_noexist(dirname):
             pass
         else:
             raise
+
+
+def file_fingerprint(filename, prev=None):
+    """Compute a fingerprint for a file.
+
+    The fingerprint is a dictionary with the file's size, modification time
+    (in ns), and sha256 hash.  Hashing large files is expensive, so if a
+    previous fingerprint for the same file is supplied and its size and
+    modification time match the file's current values, the previous hash is
+    reused instead of reading the file again.
+
+    Arguments:
+      filename - name of the file to fingerprint
+          prev - fingerprint from a previous call (OPTIONAL)
+
+    Return value: fingerprint dictionary, or None if the file does not exist.
+
+    """
+    import hashlib
+
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+
+    fp = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+    if prev is not None and prev.get('size') == fp['size'] and prev.get('mtime') == fp['mtime']:
+        fp['sha256'] = prev['sha256']
+        return fp
+
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha.update(block)
+    fp['sha256'] = sha.hexdigest()
+    return fp
+
+
+def fingerprint_files(files, prev=None):
+    """Fingerprint a collection of files.
+
+    Arguments:
+      files - list of file names
+       prev - dictionary of fingerprints from a previous call, indexed by
+              absolute file name (OPTIONAL).  Used for the mtime shortcut
+              described in file_fingerprint().
+
+    Return value: dictionary of fingerprints indexed by absolute file name.
+                  Files that don't exist have a fingerprint of None.
+
+    """
+    if prev is None:
+        prev = {}
+    manifest = {}
+    for filename in files:
+        filename = os.path.abspath(filename)
+        manifest[filename] = file_fingerprint(filename, prev.get(filename))
+    return manifest
+
+
+def fingerprints_match(old, new):
+    """Test whether two sets of fingerprints describe the same file contents.
+
+    Modification times are ignored, so touching a file without changing it
+    doesn't count as a change.
+
+    """
+    if old is None or new is None or set(old) != set(new):
+        return False
+    for filename, fp in new.items():
+        oldfp = old[filename]
+        if fp is None or oldfp is None:
+            if fp is not oldfp:
+                return False
+        elif fp['sha256'] != oldfp['sha256']:
+            return False
+    return True
+
+
+def read_manifest(filename):
+    """Read a fingerprint manifest written by write_manifest().
+
+    Return value: The manifest dictionary, or None if the manifest doesn't
+                  exist or can't be parsed.
+    """
+    import json
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(filename, manifest):
+    """Write a fingerprint manifest.
+
+    The manifest is written to a temporary file and then moved into place, so
+    an interrupted write can't leave a corrupt manifest behind.  The temporary
+    name is unique to the writing thread, so concurrent writers (in this
+    process or others) can't corrupt each other's files; the last one to
+    finish wins.
+
+    """
+    import json
+    tmpname = _tmpname(filename)
+    with open(tmpname, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(tmpname, filename)
+
+
+def _tmpname(filename):
+    """Temporary name for writing a file, unique to this process and thread (private)."""
+    return f'{filename}.tmp{os.getpid()}-{threading.get_ident()}'
+
+
+# Cache of parsed GCAM configuration files (private, used in read_gcam_config).
+# Entries are indexed by (config file, working directory) and hold the file's
+# (mtime, size) alongside the parsed metadata so that we can tell when the
+# config has been edited.
+_gcam_config_cache = {}
+_gcam_config_lock = threading.Lock()
+
+
+def read_gcam_config(cfg, workdir=None):
+    """Read run metadata from a GCAM configuration file.
+
+    The config file is parsed in a single streaming pass with iterparse, and
+    the result is cached, so repeated calls for the same (unchanged) file don't
+    parse it again.  Each call returns its own copy of the cached dictionary,
+    so callers are free to modify it.
+
+    Arguments:
+          cfg - name of the GCAM configuration file
+      workdir - directory that relative paths in the config are relative to.
+                (OPTIONAL - default is the directory containing the config
+                file.  For the GcamComponent this is the directory containing
+                the GCAM executable.)
+
+    Return value: dictionary with the following entries:
+             config - absolute path to the config file
+              dbxml - location of the output database (None if not set)
+       write-xml-db - flag: True if the database output is turned on
+                      (None if not set)
+           scenario - scenario name (None if not set)
+        stop-period - last model period to run (-1 = all periods)
+     restart-period - period to restart from (-1 = no restart)
+             inputs - list of input files: the xmlInputFileName from the
+                      Files section, followed by all the ScenarioComponents
+             values - dictionary of all the Value entries in the file,
+                      indexed by section (e.g. 'Files', 'Strings', 'Ints')
+                      and then by name
+
+    """
+    import xml.etree.ElementTree as ET
+
+    cfg = os.path.abspath(cfg)
+    if workdir is None:
+        workdir = os.path.dirname(cfg)
+    key = (cfg, os.path.abspath(workdir))
+    st = os.stat(cfg)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    with _gcam_config_lock:
+        cached = _gcam_config_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return copy.deepcopy(cached[1])
+
+    values = {}
+    section = None
+    depth = 0
+    for event, elem in ET.iterparse(cfg, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2:
+                section = elem.tag
+                values.setdefault(section, {})
+            continue
+
+        depth -= 1
+        if elem.tag == 'Value' and section is not None:
+            name = elem.get('name')
+            text = elem.text.strip() if elem.text is not None else ''
+            if section == 'ScenarioComponents':
+                # Scenario component names aren't required to be unique, so
+                # keep them in order in a list.
+                values[section].setdefault(name, []).append(text)
+            else:
+                values[section][name] = text
+        if depth <= 1:
+            # Done with a whole section; release its elements.
+            elem.clear()
+
+    def getval(sec, name, conv=str):
+        val = values.get(sec, {}).get(name)
+        return None if val is None else conv(val)
+
+    def resolve(filename):
+        return os.path.normpath(os.path.join(workdir, filename))
+
+    inputs = [getval('Files', 'xmlInputFileName')]
+    for files in values.get('ScenarioComponents', {}).values():
+        inputs += files
+    inputs = [resolve(f) for f in inputs if f]
+
+    dbxml = getval('Files', 'xmldb-location')
+    meta = {
+        'config': cfg,
+        'dbxml': None if dbxml is None else os.path.join(workdir, dbxml),
+        'write-xml-db': getval('Bools', 'write-xml-db', lambda v: v == '1'),
+        'scenario': getval('Strings', 'scenarioName'),
+        'stop-period': getval('Ints', 'stop-period', int),
+        'restart-period': getval('Ints', 'restart-period', int),
+        'inputs': inputs,
+        'values': values,
+    }
+    if meta['stop-period'] is None:
+        meta['stop-period'] = -1
+    if meta['restart-period'] is None:
+        meta['restart-period'] = -1
+
+    with _gcam_config_lock:
+        _gcam_config_cache[key] = (stamp, meta)
+
+    return copy.deepcopy(meta)
+
+
+class BackgroundWriter(object):
+    """Write output files on a background thread.
+
+    Use BackgroundWriter.get() to get the process-wide writer, then
+    submit(fn, ...) to have fn(...) called on the writer thread.  Writes are
+    done in the order they are submitted.  submit() returns immediately, so
+    components can hand off output that nothing downstream depends on (e.g.,
+    debug dumps) and publish their results without waiting for the disk.
+
+    Errors in the writes are logged, not raised.  flush() waits for all pending
+    writes to finish; it is called at the end of cassandra_main.main() and at
+    interpreter exit, so output isn't lost when the program ends.
+
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls):
+        """Get the process-wide writer, creating it if necessary."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                atexit.register(cls._instance.flush)
+            return cls._instance
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='background-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) to run on the writer thread."""
+        self.queue.put((fn, args, kwargs))
+
+    def flush(self):
+        """Wait for all of the writes submitted so far to finish."""
+        self.queue.join()
+
+    def _run(self):
+        """Run queued writes (thread target)."""
+        while True:
+            (fn, args, kwargs) = self.queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as err:
+                logging.error(f'Background write {getattr(fn, "__name__", fn)} failed: {err!r}')
+            finally:
+                self.queue.task_done()
+
+
+def save_array(filestem, data, compress=False):
+    """Save an array in numpy's binary format.
+
+    :param filestem: Name of the output file, without extension
+    :param data: Array to save
+    :param compress: If True, save to filestem.npz (compressed, with the array
+                     under the key 'data'); otherwise save to filestem.npy
+    :return: Name of the file written
+
+    The file is written under a temporary name and then moved into place, so a
+    partially written file is never seen under the final name.
+
+    """
+    filename = filestem + ('.npz' if compress else '.npy')
+    tmpname = _tmpname(filename)
+    with open(tmpname, 'wb') as outfile:
+        if compress:
+            np.savez_compressed(outfile, data=data)
+        else:
+            np.save(outfile, data)
+    os.replace(tmpname, filename)
+    return filename
+
+
+def select(value, selector):
+    """Select part of a capability's data.
+
+    This is used by ComponentBase.fetch() to apply the selector argument.
+
+    Arguments:
+         value - the data for a capability
+      selector - what to select:
+                   None: the whole value
+                   callable: selector(value)
+                   for dictionaries: a key, or a (key, selector) tuple to
+                     apply selector to the value for key
+                   for lists and tuples: an int or slice, a list of ints, or an
+                     (index, selector) tuple to apply selector to the item
+                   for pandas objects: anything accepted by .loc[]
+                   for everything else (e.g., numpy arrays): anything accepted
+                     by value[selector]
+
+    Return value: the selected data.  Selections from numpy arrays are views
+                  where numpy allows; pickling a view (e.g., to send it to
+                  another process) copies only the selected part.
+
+    """
+    if selector is None:
+        return value
+    if callable(selector):
+        return selector(value)
+
+    if isinstance(value, dict):
+        if isinstance(selector, tuple) and len(selector) == 2 and selector[0] in value:
+            return select(value[selector[0]], selector[1])
+        return value[selector]
+
+    if isinstance(value, (list, tuple)):
+        if isinstance(selector, list):
+            return type(value)(value[i] for i in selector)
+        if isinstance(selector, tuple) and len(selector) == 2:
+            return select(value[selector[0]], selector[1])
+        return value[selector]
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.loc[selector]
+
+    return value[selector]
+
+
+def peak_rss():
+    """Peak resident set size of this process so far, in bytes.
+
+    Returns None where the resource module isn't available (e.g., Windows).
+
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes; macOS reports bytes.
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def current_rss():
+    """Current resident set size of this process, in bytes.
+
+    This is read from /proc where it is available (Linux); elsewhere the peak
+    RSS is returned instead (see peak_rss()).
+
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+# Cache of parsed INI files (private, used in read_ini).  Entries are indexed by
+# absolute file name and hold the file's (mtime, size) alongside the ConfigObj.
+_ini_cache = {}
+_ini_lock = threading.Lock()
+
+
+def read_ini(filename):
+    """Read an INI configuration file with ConfigObj (cached).
+
+    Components read their models' configuration files while the driver's
+    configuration is being parsed, and several components (e.g., in an
+    ensemble) often share a file.  This caches the driver's own parse, so
+    each file is parsed once for all of the components that read it; later
+    calls return the same ConfigObj as long as the file hasn't changed.
+
+    This does not avoid the models' own parse.  The models are still given
+    the file name, since their APIs take a path, and they parse the file
+    again when they run.
+
+    Arguments:
+      filename - name of the file
+
+    Return value: ConfigObj for the file.  It is shared, so callers must not
+                  modify it.  ConfigObj(cfg) makes a private copy without
+                  reparsing the file.
+
+    """
+    from configobj import ConfigObj
+
+    filename = os.path.abspath(filename)
+    st = os.stat(filename)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _ini_lock:
+        cached = _ini_cache.get(filename)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    config = ConfigObj(filename)
+    with _ini_lock:
+        _ini_cache[filename] = (stamp, config)
+    return config
+
+
+# Process-wide pool for prefetching input data (private, used in prefetch).
+_prefetch_executor = None
+_prefetch_futures = {}
+_prefetch_lock = threading.Lock()
+
+
+def prefetch(key, fn, *args, **kwargs):
+    """Start loading data in the background.
+
+    Components can call this while their parameters are being parsed, so that
+    reading their input data overlaps with the startup of the other components.
+
+    Arguments:
+       key - hashable key identifying the data.  Requests with the same key
+             share a single load.
+        fn - function to call (with the remaining arguments) to load the data
+
+    Return value: concurrent.futures.Future for the data.  Call result() on it
+                  when the data is needed; any exception raised by fn is
+                  raised there.
+
+    """
+    import concurrent.futures as ft
+    global _prefetch_executor
+
+    with _prefetch_lock:
+        if key not in _prefetch_futures:
+            if _prefetch_executor is None:
+                _prefetch_executor = ft.ThreadPoolExecutor(max_workers=4,
+                                                           thread_name_prefix='prefetch')
+            _prefetch_futures[key] = _prefetch_executor.submit(fn, *args, **kwargs)
+        return _prefetch_futures[key]
+
+
+# In-memory cache of reference data, indexed by content key (private, used
+# in read_reference_table and reference_npy).
+_ref_cache = {}
+_ref_lock = threading.Lock()
+
+# Reference cache settings (private; see configure_reference_cache).  'dir' is
+# the on-disk cache directory, or None if the disk cache is off.  'scratchdir'
+# holds the arrays converted by reference_npy while the disk cache is off.
+_ref_config = {'dir': None, 'scratchdir': None}
+
+# Version of the on-disk format of the reference cache.  It is part of the
+# cache key, so entries in older formats are ignored.
+_REF_CACHE_FORMAT = 2
+
+
+def configure_reference_cache(params):
+    """Turn the on-disk reference data cache on or off.
+
+    Arguments:
+      params - dictionary of parameters (usually the [Global] section).  The
+               reference_cache parameter is False (the default) to cache
+               reference data in memory only, True to also cache it on disk in
+               $CASSANDRA_CACHE/reference (~/.cache/cassandra/reference if
+               CASSANDRA_CACHE isn't set), or the name of the directory to
+               cache it in.
+
+    """
+    setting = str(params.get('reference_cache', 'False')).strip()
+    if not parseTFstring(setting):
+        cachedir = None
+    elif isTFstring(setting):
+        base = os.environ.get('CASSANDRA_CACHE',
+                              os.path.join(os.path.expanduser('~'), '.cache', 'cassandra'))
+        cachedir = os.path.join(base, 'reference')
+    else:
+        cachedir = os.path.abspath(setting)
+
+    with _ref_lock:
+        _ref_config['dir'] = cachedir
+    logging.debug(f'reference cache directory: {cachedir}')
+
+
+def reference_cache_dir():
+    """Directory for the on-disk reference cache, or None if it is off."""
+    with _ref_lock:
+        return _ref_config['dir']
+
+
+def _reference_key(filename, kind, kwargs):
+    """Compute the cache key for reading a reference file (private).
+
+    The key depends on the file's contents, the kind of read, and the arguments
+    used for it.  When the disk cache is on, the file fingerprints are kept in
+    an index in the cache directory, so that files that haven't been touched
+    aren't hashed again.  The index is only a hint, so concurrent runs that
+    update it at the same time can lose each other's updates without harm.
+
+    """
+    import hashlib
+    import json
+
+    cachedir = reference_cache_dir()
+    indexfile = None if cachedir is None else os.path.join(cachedir, 'index.json')
+    prev = None
+    if indexfile is not None:
+        with _ref_lock:
+            prev = (read_manifest(indexfile) or {}).get(filename)
+
+    fp = file_fingerprint(filename, prev)
+    if fp is None:
+        raise FileNotFoundError(filename)
+
+    if indexfile is not None and prev != fp:
+        with _ref_lock:
+            # Reread the index to pick up entries added since we read it.
+            index = read_manifest(indexfile) or {}
+            index[filename] = fp
+            try:
+                os.makedirs(cachedir, exist_ok=True)
+                write_manifest(indexfile, index)
+            except OSError:
+                pass
+
+    keysrc = json.dumps({'sha256': fp['sha256'], 'kind': kind, 'args': kwargs,
+                         'format': _REF_CACHE_FORMAT}, sort_keys=True, default=str)
+    return hashlib.sha256(keysrc.encode()).hexdigest()
+
+
+def read_reference_table(filename, **kwargs):
+    """Read a CSV reference table through a content-keyed cache.
+
+    Reference tables (grid coordinates, basin and region maps, and so on) are
+    read by every model instance in every run, but they rarely change.  Within
+    a process, all readers of the same table share one DataFrame.  If the disk
+    cache is on (see configure_reference_cache), the first time a table is
+    read its columns are saved as .npy files in the cache directory, and later
+    runs load the columns from there instead of parsing the CSV.
+
+    Arguments:
+      filename - name of the CSV file
+        kwargs - additional arguments for pandas.read_csv
+
+    Return value: DataFrame with the table.  It is shared, so callers must not
+                  modify it.
+
+    """
+    filename = os.path.abspath(filename)
+    key = _reference_key(filename, 'table', kwargs)
+
+    with _ref_lock:
+        if key in _ref_cache:
+            return _ref_cache[key]
+
+    cachedir = reference_cache_dir()
+    tbldir = None if cachedir is None else os.path.join(cachedir, key)
+    table = None if tbldir is None else _load_cached_table(tbldir)
+    if table is None:
+        logging.debug(f'reading reference table {filename}')
+        table = pd.read_csv(filename, **kwargs)
+        if tbldir is not None:
+            _save_cached_table(table, tbldir)
+    else:
+        logging.debug(f'loaded reference table {filename} from cache')
+
+    with _ref_lock:
+        _ref_cache[key] = table
+    return table
+
+
+def reference_npy(filename, **kwargs):
+    """Get a copy of a text reference grid as a .npy file.
+
+    Some models (e.g., Xanthos) take the names of their reference grids in
+    their configuration and parse the text files with np.genfromtxt every time
+    they run.  Giving them the .npy file returned by this function instead
+    lets them load the grid without parsing it.  The grid is converted once
+    per process, or, if the disk cache is on (see configure_reference_cache),
+    once for all runs.  Otherwise the .npy file is kept in a temporary
+    directory that is removed at exit.
+
+    Arguments:
+      filename - name of the text file
+        kwargs - arguments for np.genfromtxt.  These must match the ones the
+                 model would use to read the file.
+
+    Return value: name of the .npy file.  Files that are already .npy are
+                  returned unchanged.
+
+    """
+    import shutil
+
+    filename = os.path.abspath(filename)
+    if filename.endswith('.npy'):
+        return filename
+    key = _reference_key(filename, 'npy', kwargs)
+
+    # The converted file depends on where the cache is, so that is part of the
+    # in-memory key.
+    with _ref_lock:
+        cachedir = _ref_config['dir']
+        memkey = (cachedir, key)
+        if memkey in _ref_cache:
+            return _ref_cache[memkey]
+        if cachedir is None:
+            if _ref_config['scratchdir'] is None:
+                _ref_config['scratchdir'] = tempfile.mkdtemp(prefix='cassandra-ref-')
+                atexit.register(shutil.rmtree, _ref_config['scratchdir'], True)
+            cachedir = _ref_config['scratchdir']
+
+    npyfile = os.path.join(cachedir, f'{key}.npy')
+    if os.path.exists(npyfile):
+        logging.debug(f'found reference grid {filename} in cache')
+    else:
+        logging.debug(f'converting reference grid {filename}')
+        data = np.genfromtxt(filename, **kwargs)
+        os.makedirs(cachedir, exist_ok=True)
+        tmpname = _tmpname(npyfile)
+        with open(tmpname, 'wb') as npy:
+            np.save(npy, data)
+        os.replace(tmpname, npyfile)
+
+    with _ref_lock:
+        _ref_cache[memkey] = npyfile
+    return npyfile
+
+
+def _load_cached_table(tbldir):
+    """Load a reference table from the cache, or return None if it isn't there (private).
+
+    Numeric columns are memory mapped.  String columns are stored as fixed
+    width unicode and converted back to object columns, as read_csv would
+    return them.  Any other object columns are pickled and can't be mapped.
+
+    """
+    import json
+    try:
+        with open(os.path.join(tbldir, 'table.json'), 'r') as tblfile:
+            meta = json.load(tblfile)
+        data = {}
+        for i, fmt in enumerate(meta['formats']):
+            colfile = os.path.join(tbldir, f'{i}.npy')
+            if fmt == 'pickle':
+                data[i] = np.load(colfile, allow_pickle=True)
+            else:
+                data[i] = np.load(colfile, mmap_mode='r')
+                if fmt == 'str':
+                    data[i] = data[i].astype(object)
+        table = pd.DataFrame(data)
+        table.columns = pd.Index(meta['columns'], dtype=meta['columns_dtype'])
+        return table
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_cached_table(table, tbldir):
+    """Save a reference table's columns to the cache (private).
+
+    The columns are written to a temporary directory that is then renamed into
+    place, so readers never see a partial entry.  Failure to write the cache
+    is not an error.  The column labels must be representable in JSON.
+
+    """
+    import json
+    import shutil
+    tmpdir = None
+    try:
+        os.makedirs(os.path.dirname(tbldir), exist_ok=True)
+        tmpdir = tempfile.mkdtemp(dir=os.path.dirname(tbldir))
+        formats = []
+        for i in range(table.shape[1]):
+            col = table.iloc[:, i].to_numpy()
+            if col.dtype.hasobject:
+                if all(isinstance(v, str) for v in col):
+                    col = col.astype(str)
+                    formats.append('str')
+                else:
+                    formats.append('pickle')
+            else:
+                formats.append('npy')
+            np.save(os.path.join(tmpdir, f'{i}.npy'), col, allow_pickle=(formats[-1] == 'pickle'))
+        meta = {'columns': table.columns.tolist(), 'columns_dtype': str(table.columns.dtype),
+                'formats': formats}
+        with open(os.path.join(tmpdir, 'table.json'), 'w') as tblfile:
+            json.dump(meta, tblfile)
+        try:
+            os.rename(tmpdir, tbldir)
+        except OSError:
+            # Another process cached it first.
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    except (OSError, TypeError, ValueError) as err:
+        logging.warning(f'Unable to cache reference table in {tbldir}: {err}')
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Benchmark the ModelInterface csv readers.
+
+  usage:  bench_csv.py [nrow]
+
+Compare util.read_gcam_csv (and the chunked iter_gcam_csv) against the old
+line-by-line approach of running scenariofix() and rm_trailing_comma() on each
+line and converting each token with float().  The input is a synthetic query
+output with nrow rows (default 200000) and the usual GCAM period columns.
+
+"""
+
+import sys
+import os
+import tempfile
+import time
+from cassandra import util
+
+
+def write_table(filename, nrow):
+    """Write a synthetic ModelInterface query output."""
+    years = list(range(1975, 2105, 5))
+    with open(filename, 'w') as f:
+        f.write('Synthetic query\n')
+        f.write('scenario,region,sector,' + ','.join(str(y) for y in years) + ',Units,\n')
+        vals = ','.join(f'{0.1*i:.4f}' for i in range(len(years)))
+        for i in range(nrow):
+            f.write(f'"Reference,date=2019-2-14T10:51:09-05:00",rgn{i%32},sector{i%50},{vals},EJ,\n')
+
+
+def read_lines(filename):
+    """The line-by-line reader that read_gcam_csv replaces."""
+    rows = []
+    with open(filename, 'r') as f:
+        f.readline()
+        header = util.rm_trailing_comma(f.readline()).split(',')
+        nyear = len(header) - 5
+        for line in f:
+            line = util.rm_trailing_comma(util.scenariofix(line))
+            toks = line.split(',')
+            rows.append(toks[:3] + [float(x) for x in toks[3:3+nyear]] + toks[3+nyear:])
+    return rows
+
+
+def timeit(label, fn):
+    t0 = time.perf_counter()
+    fn()
+    t1 = time.perf_counter()
+    print(f'{label:>24}: {t1-t0:8.3f} s')
+
+
+if __name__ == '__main__':
+    nrow = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, 'query.csv')
+        write_table(filename, nrow)
+        print(f'{nrow} rows, {os.path.getsize(filename)/2**20:.1f} MB')
+
+        timeit('line-by-line', lambda: read_lines(filename))
+        timeit('read_gcam_csv', lambda: util.read_gcam_csv(filename))
+        timeit('iter_gcam_csv (50k)', lambda: sum(len(c) for c in util.iter_gcam_csv(filename, 50000)))
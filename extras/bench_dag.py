@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Measure how the framework scales with the size of the component graph.
+
+  usage:  bench_dag.py [--shapes SHAPES] [--sizes SIZES] [--np N] [--json FILE]
+
+For each shape (default: chain,fanin,fanout,layered) and number of components
+(default: 100,1000,5000), generate a configuration of DummyComponents with no
+delays (see gen_dag.py) and run it with cassandra_main, in a fresh process
+each time.  Report:
+
+  bootstrap - time to parse the config and create the components (including
+              distributing them and exchanging capability tables in MP mode)
+  run       - time from starting the components until they have all finished
+  per edge  - run time divided by the number of capability fetches in the graph
+  threads   - peak number of threads in a process
+  rss       - peak resident set size of a process
+
+With --np N (N > 1), each case is also run in MP mode with mpirun -n N on this
+host; for MP runs, the times are the maximum over the ranks, and the thread
+counts and memory are the maximum for a single rank.  Set the MPIRUN environment
+variable to use something other than mpirun.
+
+Configurations that are too big for the framework will show up as failures or
+as runs that time out (--timeout, default 600 s).
+
+"""
+
+import sys
+import os
+import json
+import time
+import shlex
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from gen_dag import generate, SHAPES
+
+
+def run_child(cfgfile, mp, outfile):
+    """Run a configuration and write this process's measurements to outfile.
+
+    This runs in the child process (one per rank in MP mode).
+    """
+    import io
+    import resource
+    import contextlib
+    from cassandra import tracing
+    from cassandra.cassandra_main import main
+
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def sample_threads():
+        while not done.wait(0.01):
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    sampler = threading.Thread(target=sample_threads, daemon=True)
+    sampler.start()
+
+    logdir = os.path.dirname(outfile)
+    args = {'ctlfile': cfgfile, 'mp': mp, 'logdir': logdir, 'verbose': False, 'quiet': True,
+            'trace': os.path.join(logdir, 'trace.json')}
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main(args)
+    total = time.perf_counter() - t0
+    done.set()
+
+    bootstrap = [e['dur'] * 1e-6 for e in tracing.trace_events() if e['name'] == 'bootstrap']
+    rank = 0
+    if mp:
+        from mpi4py import MPI
+        rank = MPI.COMM_WORLD.Get_rank()
+        outfile = f'{os.path.splitext(outfile)[0]}-{rank}.json'
+    with open(outfile, 'w') as f:
+        json.dump({'rank': rank, 'total': total, 'bootstrap': bootstrap[0],
+                   'run': total - bootstrap[0], 'threads': peak_threads[0],
+                   'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}, f)
+
+
+def run_case(shape, ncomp, nproc, timeout, tmpdir):
+    """Run one case in a separate process (or processes).
+
+    :return: Dictionary of measurements, or None if the run failed.
+    """
+    text, nedge = generate(shape, ncomp)
+    casedir = os.path.join(tmpdir, f'{shape}-{ncomp}-{nproc}')
+    os.makedirs(casedir)
+    cfgfile = os.path.join(casedir, 'dag.cfg')
+    with open(cfgfile, 'w') as f:
+        f.write(text)
+
+    outfile = os.path.join(casedir, 'result.json')
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', cfgfile, outfile]
+    if nproc > 1:
+        cmd = shlex.split(os.environ.get('MPIRUN', 'mpirun')) + ['-n', str(nproc)] + cmd + ['--mp']
+    try:
+        subprocess.run(cmd, check=True, timeout=timeout, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.PIPE)
+    except subprocess.TimeoutExpired:
+        print(f'{shape} {ncomp} (np={nproc}): timed out after {timeout} s')
+        return None
+    except subprocess.CalledProcessError as err:
+        print(f'{shape} {ncomp} (np={nproc}): failed\n{err.stderr.decode()[-2000:]}')
+        return None
+
+    ranks = []
+    for filename in os.listdir(casedir):
+        if filename.startswith('result'):
+            with open(os.path.join(casedir, filename)) as f:
+                ranks.append(json.load(f))
+
+    result = {'shape': shape, 'ncomp': ncomp, 'nproc': nproc, 'nedge': nedge}
+    for key in ['total', 'bootstrap', 'run', 'threads', 'rss']:
+        result[key] = max(r[key] for r in ranks)
+    result['per_edge'] = result['run'] / max(nedge, 1)
+    return result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], '--mp' in sys.argv[4:], sys.argv[3])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description='Scaling benchmark for large component graphs.')
+    parser.add_argument('--shapes', default=','.join(SHAPES), help='Comma separated list of shapes.')
+    parser.add_argument('--sizes', default='100,1000,5000',
+                        help='Comma separated list of numbers of components.')
+    parser.add_argument('--np', dest='nproc', type=int, default=1,
+                        help='Also run in MP mode with this many ranks.')
+    parser.add_argument('--timeout', type=float, default=600, help='Timeout for each run (s).')
+    parser.add_argument('--json', metavar='FILE', help='Write the results to FILE.')
+    opts = parser.parse_args()
+
+    nprocs = [1] + ([opts.nproc] if opts.nproc > 1 else [])
+    results = []
+    print(f'{"shape":>8} {"ncomp":>6} {"np":>3} {"edges":>6} {"bootstrap":>10} {"run":>9} '
+          f'{"per edge":>10} {"threads":>8} {"rss":>9}')
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for shape in opts.shapes.split(','):
+            for ncomp in [int(n) for n in opts.sizes.split(',')]:
+                for nproc in nprocs:
+                    r = run_case(shape, ncomp, nproc, opts.timeout, tmpdir)
+                    if r is None:
+                        continue
+                    results.append(r)
+                    print(f"{shape:>8} {ncomp:>6} {nproc:>3} {r['nedge']:>6} {r['bootstrap']:>9.3f}s "
+                          f"{r['run']:>8.3f}s {r['per_edge']*1e6:>8.1f}us {r['threads']:>8} "
+                          f"{r['rss']/2**20:>6.0f}MiB")
+
+    if opts.json:
+        with open(opts.json, 'w') as f:
+            json.dump(results, f, indent=1)
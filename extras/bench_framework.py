@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Benchmark the overhead of the coupling framework itself.
+
+  usage:  bench_framework.py [--quick] [--json FILE] [case ...]
+          mpirun -n 2 bench_framework.py --mp [--quick] [--json FILE]
+
+The cases measure the framework rather than the models, using DummyComponents
+and synthetic numpy payloads:
+
+  fetch     - latency of fetch() from a component in the same process, by
+              payload size (local fetches hand over a reference, so this
+              should not depend on the size)
+  scaling   - time to create, and to run, chains and fan-ins of 10 to 1000
+              DummyComponents with no delays, and the overhead per edge
+  bootstrap - time for bootstrap_sp() to parse a config with 10 to 1000
+              sections and create the components
+  hector    - HectorStubComponent load time for the four RCP scenarios
+  xanthos   - XanthosComponent.prep_for_xanthos() time for a full grid of
+              synthetic monthly data
+
+With no cases given, all of them are run.  With --mp, the RAB cases are run
+instead: rank 0 serves the payloads and the other ranks fetch them through
+their RABs, once through shared memory and once by message passing.  Run that
+with mpirun on a single host (e.g., mpirun -n 2); with more ranks, each of the
+fetching ranks reports its own results.
+
+--quick uses smaller sizes and fewer repetitions.  --json writes the results
+(seconds per operation, keyed by benchmark name) to FILE, so that runs from
+different versions of the code can be compared.
+
+"""
+
+import sys
+import os
+import io
+import contextlib
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import concurrent.futures as ft
+import numpy as np
+
+# Run from a checkout without installing the package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cassandra.components import ComponentBase, DummyComponent, HectorStubComponent, \
+    XanthosComponent
+
+PAYLOAD_SIZES = [8, 2**10, 2**16, 2**20, 2**24, 2**26]      # bytes
+QUICK_PAYLOAD_SIZES = [8, 2**10, 2**16, 2**20]
+COMPONENT_COUNTS = [10, 100, 1000]
+QUICK_COMPONENT_COUNTS = [10, 100]
+
+results = {}
+
+
+def timeit(label, fn, repeat=5, number=1):
+    """Time fn, report the median time per call, and record it in results."""
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for j in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    t = statistics.median(times)
+    results[label] = t
+    print(f'{label:>36}: {fmt_time(t)}')
+    return t
+
+
+def fmt_time(t):
+    if t < 1e-3:
+        return f'{t*1e6:9.1f} us'
+    if t < 1:
+        return f'{t*1e3:9.2f} ms'
+    return f'{t:9.3f} s'
+
+
+def fmt_size(nbytes):
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if nbytes < 1024:
+            return f'{nbytes:g} {unit}'
+        nbytes /= 1024
+    return f'{nbytes:g} TiB'
+
+
+class PayloadComponent(ComponentBase):
+    """Publish synthetic arrays of the given sizes (in bytes) as payload-<size>."""
+
+    def __init__(self, cap_tbl, sizes):
+        super(PayloadComponent, self).__init__(cap_tbl)
+        self.sizes = sizes
+        for size in sizes:
+            self.addcapability(f'payload-{size}')
+
+    def run_component(self):
+        for size in self.sizes:
+            self.addresults(f'payload-{size}', np.ones(max(size // 8, 1)))
+        return 0
+
+
+def bench_fetch(opts):
+    cap_tbl = {}
+    provider = PayloadComponent(cap_tbl, opts.sizes)
+    provider.run().join()
+    consumer = DummyComponent(cap_tbl)
+    for size in opts.sizes:
+        timeit(f'local fetch {fmt_size(size)}', lambda: consumer.fetch(f'payload-{size}'),
+               number=1000)
+
+
+def make_components(n, shape):
+    """Create n DummyComponents, finalized and ready to run.
+
+    shape is 'chain' (each component fetches the next) or 'fanin' (the first
+    component fetches all of the others).
+    """
+    cap_tbl = {}
+    comps = []
+    for i in range(n):
+        comp = DummyComponent(cap_tbl)
+        comp.addparam('name', f'c{i}')
+        comp.addparam('finish_delay', '0')
+        if shape == 'chain':
+            reqs = [f'c{i+1}'] if i < n-1 else []
+        else:
+            reqs = [f'c{j}' for j in range(1, n)] if i == 0 else []
+        comp.addparam('capability_reqs', reqs if reqs else '')
+        comp.addparam('request_delays', ['0'] * len(reqs) if reqs else '')
+        comps.append(comp)
+    for comp in comps:
+        comp.finalize_parsing()
+    return comps
+
+
+def run_components(comps):
+    threads = [comp.run() for comp in comps]
+    for thread in threads:
+        thread.join()
+    assert all(comp.status == 1 for comp in comps)
+
+
+def bench_scaling(opts):
+    for shape in ['chain', 'fanin']:
+        for n in opts.counts:
+            timeit(f'create {n} ({shape})', lambda: make_components(n, shape), repeat=3)
+            runs = []
+            for i in range(3):
+                comps = make_components(n, shape)
+                t0 = time.perf_counter()
+                run_components(comps)
+                runs.append(time.perf_counter() - t0)
+            t = statistics.median(runs)
+            results[f'run {n} ({shape})'] = t
+            results[f'per edge {n} ({shape})'] = t / (n-1)
+            print(f'{f"run {n} ({shape})":>36}: {fmt_time(t)}  ({fmt_time(t/(n-1)).strip()} per edge)')
+
+
+def bench_bootstrap(opts):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in opts.counts:
+            cfgfile = os.path.join(tmpdir, f'bench-{n}.cfg')
+            with open(cfgfile, 'w') as f:
+                f.write('[Global]\n')
+                for i in range(n):
+                    f.write(f'[DummyComponent.{i}]\nname = c{i}\nfinish_delay = 0\n')
+                    if i > 0:
+                        f.write(f'capability_reqs = c{i-1}\nrequest_delays = 0\n')
+            args = {'ctlfile': cfgfile, 'logdir': tmpdir, 'loglvl': 'WARNING'}
+            timeit(f'bootstrap_sp {n}', lambda: quiet_bootstrap(args), repeat=3)
+
+
+def quiet_bootstrap(args):
+    from cassandra.cassandra_main import bootstrap_sp
+    # bootstrap_sp prints the location of the log file
+    with contextlib.redirect_stdout(io.StringIO()):
+        return bootstrap_sp(args)
+
+
+def bench_hector(opts):
+    comp = HectorStubComponent({})
+    comp.addparam('scenarios', ['rcp26', 'rcp45', 'rcp60', 'rcp85'])
+    comp.addparam('T0', '287.0')
+    comp.finalize_parsing()
+    timeit('hector stub load', comp.run_component)
+
+
+def bench_xanthos(opts):
+    # Half-degree grid cells, in Xanthos order and in a shuffled order for the
+    # input data.
+    ncell = 67420
+    nmonth = 120 if opts.quick else 1140
+    lat, lon = np.meshgrid(np.arange(89.75, -90, -0.5), np.arange(-179.75, 180, 0.5), indexing='ij')
+    coords = np.column_stack([lat.ravel(), lon.ravel()])[:ncell]
+    import pandas as pd
+    cell_map = pd.DataFrame({'cell_id': np.arange(1, ncell+1), 'lon': coords[:, 1],
+                             'lat': coords[:, 0]})
+    perm = np.random.default_rng(0).permutation(ncell)
+    data = np.random.default_rng(1).random((ncell, nmonth), dtype=np.float32)
+
+    comp = XanthosComponent({})
+    comp.cell_map_future = ft.Future()
+    comp.cell_map_future.set_result(cell_map)
+    timeit(f'prep_for_xanthos {nmonth} months', lambda: comp.prep_for_xanthos(data, coords[perm]))
+
+
+def bench_rab(opts):
+    from mpi4py import MPI
+    from cassandra.rab import RAB, DEFAULT_SHM_THRESHOLD
+
+    world = MPI.COMM_WORLD
+    rank = world.Get_rank()
+    if world.Get_size() < 2:
+        sys.exit('The RAB benchmarks need at least 2 ranks.')
+
+    for label, threshold in [('shm', DEFAULT_SHM_THRESHOLD), ('mpi', None)]:
+        cap_tbl = {}
+        rab = RAB(cap_tbl, world, threshold)
+        if rank == 0:
+            PayloadComponent(cap_tbl, opts.sizes).run().join()
+        capabilities = [cap for cap in cap_tbl if cap.startswith('payload-')]
+        for i, remote in enumerate(world.allgather(capabilities)):
+            if i != rank:
+                rab.addremote(i, remote)
+        thread = rab.run()
+
+        if rank != 0:
+            consumer = DummyComponent(cap_tbl)
+            for size in opts.sizes:
+                number = 20 if size < 2**20 else 3
+                t = timeit(f'rank {rank} RAB fetch {fmt_size(size)} ({label})',
+                           lambda: consumer.fetch(f'payload-{size}'), repeat=3, number=number)
+                results[f'rank {rank} RAB throughput {fmt_size(size)} ({label})'] = size / t
+
+        world.barrier()
+        rab.shutdown()
+        thread.join()
+
+
+CASES = {'fetch': bench_fetch, 'scaling': bench_scaling, 'bootstrap': bench_bootstrap,
+         'hector': bench_hector, 'xanthos': bench_xanthos}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the coupling framework.')
+    parser.add_argument('--quick', action='store_true', help='Smaller sizes, fewer repetitions.')
+    parser.add_argument('--mp', action='store_true', help='Run the RAB benchmarks (under mpirun).')
+    parser.add_argument('--json', metavar='FILE', help='Write the results to FILE.')
+    parser.add_argument('cases', nargs='*', metavar='case',
+                        help=f'Cases to run: {", ".join(CASES)} (default: all).')
+    opts = parser.parse_args()
+    for case in opts.cases:
+        if case not in CASES:
+            parser.error(f'unknown case {case}')
+    opts.sizes = QUICK_PAYLOAD_SIZES if opts.quick else PAYLOAD_SIZES
+    opts.counts = QUICK_COMPONENT_COUNTS if opts.quick else COMPONENT_COUNTS
+
+    if opts.mp:
+        bench_rab(opts)
+    else:
+        for case in opts.cases or list(CASES):
+            CASES[case](opts)
+
+    if opts.json:
+        filename = opts.json
+        if opts.mp:
+            from mpi4py import MPI
+            root, ext = os.path.splitext(filename)
+            filename = f'{root}-{MPI.COMM_WORLD.Get_rank()}{ext}'
+        with open(filename, 'w') as f:
+            json.dump(results, f, indent=1)
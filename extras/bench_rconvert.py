@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark conversion of fldgen output from R to numpy.
+
+  usage:  bench_rconvert.py [ngrids [ntime [ncell]]]
+
+Compare the old conversion of fldgen fields,
+    [np.transpose(np.asarray(x, dtype=np.float32)) for x in fields]
+with rutil.r_matrices_to_array, which reads the R memory in place and writes
+a single stacked, C-contiguous float32 array.  The defaults are ngrids = 50
+fields of 95 years x 12 months by 10000 grid cells.
+
+If rpy2 is available, the fields are real R matrices, and the old method
+converts them with numpy2ri, as FldgenComponent did.  Otherwise they are
+column-major numpy arrays, which have the same memory layout, and the old
+method makes the float64 copy that the numpy2ri conversion makes before the
+cast to float32.
+
+Each method is run in a fresh child process so that its peak RSS can be
+measured separately.  The old method is followed by np.ascontiguousarray on each
+field, since that is the copy that consumers of the non-contiguous transposes
+end up making.  (It is a no-op if the transposes happen to be contiguous.)
+
+"""
+
+import sys
+import time
+import resource
+import multiprocessing
+
+
+def make_fields(ngrids, ntime, ncell):
+    import numpy as np
+    try:
+        import rpy2.robjects as robjects
+        matrix = robjects.r['matrix']
+        runif = robjects.r['runif']
+        return [matrix(runif(ntime*ncell), nrow=ntime, ncol=ncell) for i in range(ngrids)], 'R'
+    except ImportError:
+        return [np.asfortranarray(np.random.rand(ntime, ncell)) for i in range(ngrids)], 'numpy'
+
+
+def old_method(fields):
+    import numpy as np
+    try:
+        from rpy2.robjects import numpy2ri
+        from rpy2.robjects.conversion import localconverter
+        import rpy2.robjects as robjects
+        with localconverter(robjects.default_converter + numpy2ri.converter) as cv:
+            fields = [cv.rpy2py(x) for x in fields]
+    except ImportError:
+        fields = [np.array(x) for x in fields]
+    out = [np.transpose(np.asarray(x, dtype=np.float32)) for x in fields]
+    return [np.ascontiguousarray(x) for x in out]
+
+
+def new_method(fields):
+    from cassandra.rutil import r_matrices_to_array
+    return r_matrices_to_array(fields)
+
+
+def run(method, ngrids, ntime, ncell, queue):
+    fields, kind = make_fields(ngrids, ntime, ncell)
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    out = method(fields)
+    t1 = time.perf_counter()
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((kind, t1-t0, (rss1-rss0)/1024.0))
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    ngrids, ntime, ncell = (args + [50, 95*12, 10000][len(args):])[:3]
+    print(f'ngrids = {ngrids}, ntime = {ntime}, ncell = {ncell}  '
+          f'(input {ngrids*ntime*ncell*8/2**20:.0f} MB as float64)')
+
+    ctx = multiprocessing.get_context('spawn')
+    for label, method in [('old', old_method), ('r_matrices_to_array', new_method)]:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run, args=(method, ngrids, ntime, ncell, queue))
+        proc.start()
+        kind, dt, drss = queue.get()
+        proc.join()
+        print(f'{label:>20} ({kind}): {dt:8.3f} s   peak RSS increase {drss:8.1f} MB')
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Generate configurations with large graphs of DummyComponents.
+
+  usage:  gen_dag.py [-o FILE] [--seed SEED] [--width W] [--degree D]
+                     [--delay MS] shape ncomp
+
+Write a configuration file with ncomp DummyComponent sections (plus [Global])
+wired together in one of these shapes:
+
+  chain   - each component fetches the next one; the last fetches nothing
+  fanin   - the first component fetches all of the others
+  fanout  - all of the other components fetch the first one
+  layered - components are arranged in layers of W (default 10); each
+            component in a layer fetches D (default 3) randomly chosen
+            components from the layer below.  The same seed always gives the
+            same graph.
+
+Components are named c0, c1, ....  The request and finish delays are all
+MS milliseconds (default 0), so with the default the run time is all
+framework overhead.  The configuration is written to stdout unless -o is
+given.
+
+Used by bench_dag.py; the generate() function can also be imported.
+
+"""
+
+import sys
+import random
+import argparse
+
+SHAPES = ['chain', 'fanin', 'fanout', 'layered']
+
+# GlobalParamsComponent requires these, though DummyComponents don't use them.
+GLOBAL = """[Global]
+ModelInterface = ModelInterface.jar
+DBXMLlib = lib
+rgnconfig = rgn32
+"""
+
+
+def dependencies(shape, ncomp, seed=0, width=10, degree=3):
+    """Get the capabilities each component fetches.
+
+    :return: List of lists; entry i is the list of component indices that
+             component i fetches.
+    """
+    if shape == 'chain':
+        return [[i+1] if i < ncomp-1 else [] for i in range(ncomp)]
+    if shape == 'fanin':
+        return [list(range(1, ncomp))] + [[] for i in range(1, ncomp)]
+    if shape == 'fanout':
+        return [[]] + [[0] for i in range(1, ncomp)]
+    if shape == 'layered':
+        rng = random.Random(seed)
+        deps = []
+        for i in range(ncomp):
+            layer = i // width
+            below = range((layer-1)*width, layer*width) if layer > 0 else range(0)
+            deps.append(sorted(rng.sample(below, min(degree, len(below)))))
+        return deps
+    raise ValueError(f'Unknown shape {shape}')
+
+
+def generate(shape, ncomp, seed=0, width=10, degree=3, delay=0):
+    """Generate the text of a configuration file.
+
+    :return: (configuration text, number of edges)
+    """
+    deps = dependencies(shape, ncomp, seed, width, degree)
+    sections = [GLOBAL]
+    for i, reqs in enumerate(deps):
+        lines = [f'[DummyComponent.{i}]', f'name = c{i}', f'finish_delay = {delay}']
+        if reqs:
+            lines.append('capability_reqs = ' + ', '.join(f'c{j}' for j in reqs))
+            lines.append('request_delays = ' + ', '.join(str(delay) for j in reqs))
+        sections.append('\n'.join(lines) + '\n')
+    return '\n'.join(sections), sum(len(reqs) for reqs in deps)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate large DummyComponent configurations.')
+    parser.add_argument('shape', choices=SHAPES)
+    parser.add_argument('ncomp', type=int, help='Number of components.')
+    parser.add_argument('-o', dest='outfile', help='Output file (default: stdout).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (layered only).')
+    parser.add_argument('--width', type=int, default=10, help='Layer width (layered only).')
+    parser.add_argument('--degree', type=int, default=3,
+                        help='Capabilities fetched per component (layered only).')
+    parser.add_argument('--delay', type=int, default=0, help='Request and finish delays (ms).')
+    opts = parser.parse_args()
+
+    text, nedge = generate(opts.shape, opts.ncomp, opts.seed, opts.width, opts.degree, opts.delay)
+    if opts.outfile is None:
+        sys.stdout.write(text)
+    else:
+        with open(opts.outfile, 'w') as f:
+            f.write(text)
+    print(f'{opts.ncomp} components, {nedge} edges', file=sys.stderr)
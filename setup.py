@@ -24,7 +24,7 @@ setup(
     packages=find_packages(),
     package_data={'cassandra':['data/*.dat']},
     include_package_data=True,
-    python_requires='>=3.6',
+    python_requires='>=3.8',
     long_description=readme(),
     install_requires=get_requirements(),
     extras_require={
@@ -33,7 +33,8 @@ setup(
         'tethys': ["tethys>=1.2.0"],
     },
     classifiers=[
-        "Programming Language :: Python :: 3.6"
-        "Programming Language :: Python :: 3.7"
+        "Programming Language :: Python :: 3.8",
+        "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
     ]
 )